@@ -24,10 +24,30 @@ class Settings(BaseSettings):
             return v
         raise ValueError(v)
 
+    # Video analysis
+    VIDEO_SAMPLE_FPS: float = 1.0          # Analyzed frames per second of video
+    VIDEO_SEGMENT_SECONDS: float = 5.0     # Length of a scored timeline segment
+    VIDEO_BATCH_SIZE: int = 16             # Face crops per model forward pass
+    VIDEO_EMA_ALPHA: float = 0.5           # Weight of the newest segment in the smoothed score
+    VIDEO_FAKE_THRESHOLD: float = 0.5      # Smoothed fake probability that marks a segment fake
+    VIDEO_MAX_UPLOAD_MB: int = 2000
+
+    # Live guard WebSocket
+    LIVE_EMA_ALPHA: float = 0.3            # Weight of the newest frame in a track's smoothed score
+    LIVE_ALARM_ON: float = 0.7             # Smoothed score that raises a track's alarm
+    LIVE_ALARM_OFF: float = 0.4            # Smoothed score the alarm must fall below to clear
+    LIVE_BATCH_SIZE: int = 16              # Frames scored together across all sessions
+    LIVE_BATCH_WAIT_MS: float = 20         # Longest wait for a batch to fill
+    LIVE_MAX_PENDING: int = 8              # Unscored frames per session before new ones are dropped
+
     # Inbox / Mail
     INBOX_CACHE: Path = BASE_DIR / "app" / "inbox_cache.jsonl"
     TMP_DIR: Path = BASE_DIR / "tmp"
     MAIL_LOGS_PATH: Path = BASE_DIR / "mail_logs.txt"
+    # Gönderim logu N kayıtta ya da T ms'de bir toplu yazılır, boyut aşılınca gzip'lenir
+    MAIL_LOG_FLUSH_ENTRIES: int = 100
+    MAIL_LOG_FLUSH_MS: int = 500
+    MAIL_LOG_MAX_BYTES: int = 50 * 1024 * 1024
     REDIS_URL: str = "redis://redis:6379/0" # Docker friendly default
     
     # SMTP
@@ -35,6 +55,21 @@ class Settings(BaseSettings):
     SMTP_PORT: int = 587
     SMTP_USER: str = ""
     SMTP_PASS: str = ""
+    SMTP_START_TLS: bool = True
+    # Kampanya başına açık tutulan bağlantı sayısı ve bağlantı başına en fazla mail
+    SMTP_POOL_SIZE: int = 4
+    SMTP_MAX_MESSAGES_PER_CONNECTION: int = 100
+    # Hesap başına tüm worker'lar genelinde saniyelik gönderim sınırı (0 = sınırsız)
+    SMTP_RATE_PER_SECOND: float = 0
+
+    # Campaign queue
+    # Kampanya deposu: redis, sqlite ya da auto (Redis yoksa SQLite)
+    CAMPAIGN_BACKEND: str = "auto"
+    CAMPAIGN_DB: Path = BASE_DIR / "app" / "campaigns.sqlite3"
+    # Süreç başına aynı anda yürütülen kampanya sayısı
+    CAMPAIGN_CONCURRENCY: int = 2
+    # Kira bu sürede yenilenmezse kampanyayı başka bir worker devralır
+    CAMPAIGN_LEASE_SECONDS: float = 30
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,7 @@
+# -- coding: utf-8 --
+from .smtp_pool import SMTPPool
+from .compiler import CompiledCampaign, compile_campaign
+from .queue import RedisCampaignStore, SQLiteCampaignStore, open_campaign_store
+from .progress import ProgressBroker, ProgressTracker
+from .runner import CampaignRunner
+from .delivery_log import DeliveryLog
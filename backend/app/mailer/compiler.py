@@ -0,0 +1,126 @@
+# -- coding: utf-8 --
+import base64
+import os
+import re
+import uuid
+from email.message import MIMEPart
+from email.policy import SMTP
+from email.utils import formatdate, make_msgid
+
+import jinja2
+
+PLAIN_FALLBACK = "Bu mail HTML desteklemeyen istemciler için."
+CID_RE = re.compile(r"cid:([\w\-.@]+)")
+CRLF = b"\r\n"
+
+
+def image_subtype(image_name: str) -> str:
+    ext = os.path.splitext(image_name)[1].lower().lstrip(".")
+    if ext in ("jpg", "jpeg"):
+        return "jpeg"
+    if ext == "gif":
+        return "gif"
+    return "png"
+
+
+def _header(name: str, value: str) -> bytes:
+    # SMTP politikası ASCII dışı değerleri RFC 2047 ile kodlar ve CRLF ile katlar
+    return SMTP.fold_binary(name, SMTP.header_factory(name, value))
+
+
+def _part_bytes(part: MIMEPart) -> bytes:
+    return part.as_bytes(policy=SMTP)
+
+
+class CompiledCampaign:
+    """
+    Kampanya başına bir kez hazırlanan MIME iskeleti.
+    Alıcı başına sadece adres başlıkları ve kişiselleştirilmiş HTML parçası üretilir;
+    görsel, düz metin parçası ve sınırlar önceden bayt olarak hazırdır.
+
+    multipart/mixed
+      multipart/alternative
+        text/plain
+        multipart/related
+          text/html        <- alıcıya özel
+          image (cid)
+      image (attachment)
+    """
+
+    def __init__(self, subject: str, html_body: str, image_path: str, sender: str):
+        self.sender = sender
+        self.template = jinja2.Environment(autoescape=False).from_string(html_body)
+        # Görsel bağlamı şablon kaynağından bir kez bulunur; render edilen HTML'de regex çalıştırılmaz
+        cid_match = CID_RE.search(html_body)
+        self.cid = cid_match.group(1) if cid_match else "mailimage"
+        self.msgid_domain = sender.rsplit("@", 1)[-1] if "@" in sender else "localhost"
+
+        with open(image_path, "rb") as f:
+            img_data = f.read()
+        img_name = os.path.basename(image_path)
+        subtype = image_subtype(img_name)
+
+        inline = MIMEPart(policy=SMTP)
+        inline.set_content(img_data, maintype="image", subtype=subtype, cid=f"<{self.cid}>")
+        # base64 kodlaması bir kez yapılır, ek parçası aynı gövdeyi kullanır
+        attachment = MIMEPart(policy=SMTP)
+        attachment["Content-Type"] = f"image/{subtype}"
+        attachment["Content-Transfer-Encoding"] = "base64"
+        attachment["Content-Disposition"] = f'attachment; filename="{img_name}"'
+        attachment.set_payload(inline.get_payload())
+
+        plain = MIMEPart(policy=SMTP)
+        plain.set_content(PLAIN_FALLBACK)
+
+        token = uuid.uuid4().hex
+        mixed, alternative, related = (f"===============mixed_{token}", f"===============alt_{token}",
+                                       f"===============rel_{token}")
+        self.static_headers = b"".join([
+            _header("From", sender),
+            _header("Subject", subject),
+            b"MIME-Version: 1.0\r\n",
+            f'Content-Type: multipart/mixed; boundary="{mixed}"\r\n'.encode("ascii"),
+        ])
+        self.body_prefix = b"".join([
+            CRLF,
+            f"--{mixed}\r\n".encode("ascii"),
+            f'Content-Type: multipart/alternative; boundary="{alternative}"\r\n\r\n'.encode("ascii"),
+            f"--{alternative}\r\n".encode("ascii"),
+            _part_bytes(plain),
+            f"\r\n--{alternative}\r\n".encode("ascii"),
+            f'Content-Type: multipart/related; boundary="{related}"\r\n\r\n'.encode("ascii"),
+            f"--{related}\r\n".encode("ascii"),
+            b'Content-Type: text/html; charset="utf-8"\r\n',
+            b"Content-Transfer-Encoding: base64\r\n\r\n",
+        ])
+        self.body_suffix = b"".join([
+            f"\r\n--{related}\r\n".encode("ascii"),
+            _part_bytes(inline),
+            f"\r\n--{related}--\r\n".encode("ascii"),
+            f"\r\n--{alternative}--\r\n".encode("ascii"),
+            f"\r\n--{mixed}\r\n".encode("ascii"),
+            _part_bytes(attachment),
+            f"\r\n--{mixed}--\r\n".encode("ascii"),
+        ])
+
+    def render_html(self, target: str, context: dict = None) -> str:
+        context = context or {"first_name": "Kullanıcı", "last_name": "", "email": target}
+        return self.template.render(**context)
+
+    def render(self, target: str, context: dict = None) -> bytes:
+        """Tek alıcı için SMTP'ye hazır ham mail baytları."""
+        html = self.render_html(target, context)
+        encoded_html = base64.encodebytes(html.encode("utf-8")).replace(b"\n", CRLF)
+        return b"".join([
+            self.static_headers,
+            _header("To", target),
+            _header("Date", formatdate(localtime=True)),
+            _header("Message-ID", make_msgid(domain=self.msgid_domain)),
+            self.body_prefix,
+            encoded_html,
+            self.body_suffix,
+        ])
+
+
+def compile_campaign(subject: str, html_body: str, image_path: str, sender: str) -> CompiledCampaign:
+    return CompiledCampaign(subject, html_body, image_path, sender)
@@ -0,0 +1,155 @@
+# -- coding: utf-8 --
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+import sqlite3
+from typing import Any, Dict, List, Optional
+
+from services.inbox_cache_cleaner import inbox_lock
+
+
+class DeliveryLog:
+    """
+    Kampanya gönderim kayıtları için tamponlu JSONL yazıcı.
+    Kayıtlar bellekte birikir; `flush_entries` kayıtta ya da `flush_interval_ms` sürede bir,
+    event loop dışında (thread'de) tek seferde yazılır. Aktif dosya `max_bytes`'ı aşınca
+    `<path>.<n>.gz` olarak sıkıştırılır. Her kayıt kampanya/alıcı/durum indeksine de eklenir;
+    rapor sorguları log geçmişini taramaz.
+    """
+
+    def __init__(self, path, max_bytes: int = 50 * 1024 * 1024, flush_entries: int = 100,
+                 flush_interval_ms: int = 500, index_path: Optional[str] = None):
+        self.path = str(path)
+        self.index_path = index_path or f"{self.path}.index.sqlite3"
+        self.max_bytes = max_bytes
+        self.flush_entries = flush_entries
+        self.flush_interval = flush_interval_ms / 1000
+        self._buffer: List[Dict[str, Any]] = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._task: Optional[asyncio.Task] = None
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS deliveries (
+                task_id TEXT NOT NULL,
+                target TEXT NOT NULL,
+                status TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                segment TEXT NOT NULL,
+                offset INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS deliveries_task_status ON deliveries (task_id, status);
+            CREATE INDEX IF NOT EXISTS deliveries_target ON deliveries (target);
+        """)
+        conn.close()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.index_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+
+    def log(self, entry: Dict[str, Any]):
+        """Bloklamaz; kayıt bir sonraki flush'ta diske yazılır."""
+        self._buffer.append(entry)
+        if len(self._buffer) >= self.flush_entries and self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[DELIVERY LOG] flush error: {e}")
+
+    async def flush(self):
+        if not self._buffer:
+            return
+        batch, self._buffer = self._buffer, []
+        if self._flush_lock is None:
+            await asyncio.to_thread(self._write_batch, batch)
+            return
+        async with self._flush_lock:
+            await asyncio.to_thread(self._write_batch, batch)
+
+    def _write_batch(self, batch: List[Dict[str, Any]]):
+        rows = []
+        # Aynı log dosyasına yazan uvicorn worker'ları ekleme ve rotasyonu sırayla yapar
+        with inbox_lock(self.path):
+            with open(self.path, "a", encoding="utf-8") as f:
+                for entry in batch:
+                    offset = f.tell()
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+                    rows.append((entry.get("task_id") or "", entry["target"], entry["status"], entry["timestamp"], "", offset))
+                f.flush()
+                size = f.tell()
+            conn = self._connect()
+            try:
+                with conn:
+                    conn.execute("BEGIN")
+                    conn.executemany("INSERT INTO deliveries VALUES (?, ?, ?, ?, ?, ?)", rows)
+                if size >= self.max_bytes:
+                    self._rotate(conn)
+            finally:
+                conn.close()
+
+    def _next_segment(self) -> int:
+        directory = os.path.dirname(self.path) or "."
+        pattern = re.compile(re.escape(os.path.basename(self.path)) + r"\.(\d+)\.gz$")
+        numbers = [int(m.group(1)) for m in (pattern.match(e.name) for e in os.scandir(directory)) if m]
+        return max(numbers, default=0) + 1
+
+    def _rotate(self, conn):
+        """Aktif dosyayı numaralı bir segmente taşıyıp gzip'ler; indeksteki aktif kayıtlar segmente bağlanır."""
+        segment = f"{os.path.basename(self.path)}.{self._next_segment()}.gz"
+        raw_path = os.path.join(os.path.dirname(self.path), segment[:-3])
+        os.replace(self.path, raw_path)
+        conn.execute("UPDATE deliveries SET segment = ? WHERE segment = ''", (segment,))
+        gz_path = os.path.join(os.path.dirname(self.path), segment)
+        with open(raw_path, "rb") as src, gzip.open(f"{gz_path}.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f"{gz_path}.tmp", gz_path)
+        os.remove(raw_path)
+
+    def report(self, task_id: str, status: Optional[str] = None, limit: int = 1000) -> Dict[str, Any]:
+        """Kampanya için durum sayıları ve alıcı listesi; sadece indeks okunur."""
+        conn = self._connect()
+        try:
+            counts = dict(conn.execute(
+                "SELECT status, COUNT(*) FROM deliveries WHERE task_id = ? GROUP BY status", (task_id,)
+            ).fetchall())
+            query = "SELECT target, status, timestamp FROM deliveries WHERE task_id = ?"
+            params: list = [task_id]
+            if status:
+                query += " AND status = ?"
+                params.append(status)
+            query += " ORDER BY timestamp LIMIT ?"
+            params.append(limit)
+            recipients = [
+                {"target": target, "status": status_, "timestamp": timestamp}
+                for target, status_, timestamp in conn.execute(query, params)
+            ]
+        finally:
+            conn.close()
+        return {"task_id": task_id, "counts": counts, "recipients": recipients}
@@ -0,0 +1,171 @@
+# -- coding: utf-8 --
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from app.mailer.queue import DONE, ERROR, RUNNING, progress_percent
+
+FINAL_STATUSES = (DONE, ERROR)
+CHANNEL_PREFIX = "campaign:progress:"
+# Biten kampanyanın son durumu geç bağlanan istemciler için bir süre bellekte kalır
+FINISHED_RETENTION_SECONDS = 300
+
+
+class ProgressTracker:
+    """Tek bir kampanya koşusu için alıcı sayaçları ve gözlenen hızdan tahmini bitiş süresi."""
+
+    def __init__(self, task_id: str, state: Dict[str, Any]):
+        self.task_id = task_id
+        self.total = state["total"]
+        self.sent = state["sent"]
+        self.success = state["success"]
+        self.fail = state["fail"]
+        # Devralınan kampanyada hız sadece bu koşuda gönderilenlerden hesaplanır
+        self._started = time.monotonic()
+        self._started_sent = self.sent
+
+    def record(self, status: str):
+        self.sent += 1
+        if status == "success":
+            self.success += 1
+        else:
+            self.fail += 1
+
+    def snapshot(self, status: str = RUNNING, error: Optional[str] = None) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self._started
+        done_here = self.sent - self._started_sent
+        rate = done_here / elapsed if elapsed > 0 and done_here else 0.0
+        remaining = self.total - self.sent
+        return {
+            "task_id": self.task_id,
+            "progress": 100 if status == DONE else progress_percent(self.sent, self.total),
+            "total": self.total,
+            "sent": self.sent,
+            "success": self.success,
+            "fail": self.fail,
+            "status": status,
+            "error": error,
+            "rate": round(rate, 2),
+            "eta_seconds": round(remaining / rate, 1) if rate and remaining else (0.0 if not remaining else None),
+            "elapsed_seconds": round(elapsed, 1),
+        }
+
+
+class ProgressBroker:
+    """
+    Kampanya ilerleme olaylarını dağıtır. Aynı süreçteki dinleyiciler bir asyncio.Condition üzerinde
+    bekler ve sadece durum değişince uyanır. Redis varsa olaylar pub/sub ile tüm worker'lara iletilir;
+    her süreçte tek bir pattern aboneliği gelen olayları yerel Condition'lara aktarır.
+    """
+
+    def __init__(self, redis_conn=None):
+        self.redis = redis_conn
+        self._latest: Dict[str, Dict[str, Any]] = {}
+        self._conditions: Dict[str, asyncio.Condition] = {}
+        self._relay: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.redis is not None and self._relay is None:
+            self._relay = asyncio.create_task(self._relay_from_redis())
+
+    async def stop(self):
+        if self._relay is not None:
+            self._relay.cancel()
+            await asyncio.gather(self._relay, return_exceptions=True)
+            self._relay = None
+
+    def _condition(self, task_id: str) -> asyncio.Condition:
+        cond = self._conditions.get(task_id)
+        if cond is None:
+            cond = self._conditions[task_id] = asyncio.Condition()
+        return cond
+
+    async def _set_local(self, task_id: str, snapshot: Dict[str, Any], relayed: bool = False):
+        latest = self._latest.get(task_id)
+        if relayed and latest is not None and (latest["sent"], latest["status"]) == (snapshot["sent"], snapshot["status"]):
+            # Bu süreçte yayınlanan olayın Redis'ten geri gelen kopyası
+            return
+        cond = self._condition(task_id)
+        async with cond:
+            self._latest[task_id] = snapshot
+            cond.notify_all()
+        if snapshot["status"] in FINAL_STATUSES:
+            asyncio.get_running_loop().call_later(FINISHED_RETENTION_SECONDS, self._forget, task_id)
+
+    def _forget(self, task_id: str):
+        self._latest.pop(task_id, None)
+        self._conditions.pop(task_id, None)
+
+    async def publish(self, task_id: str, snapshot: Dict[str, Any]):
+        await self._set_local(task_id, snapshot)
+        if self.redis is not None:
+            try:
+                await self.redis.publish(CHANNEL_PREFIX + task_id, json.dumps(snapshot))
+            except Exception as e:
+                print(f"[CAMPAIGN PROGRESS] publish error: {e}")
+
+    async def _relay_from_redis(self):
+        pubsub = self.redis.pubsub()
+        await pubsub.psubscribe(CHANNEL_PREFIX + "*")
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=30.0)
+                if not message or message["type"] != "pmessage":
+                    continue
+                channel = message["channel"]
+                channel = channel.decode() if isinstance(channel, bytes) else channel
+                await self._set_local(channel[len(CHANNEL_PREFIX):], json.loads(message["data"]), relayed=True)
+        finally:
+            await pubsub.punsubscribe()
+            await pubsub.close()
+
+    async def subscribe(
+        self,
+        task_id: str,
+        initial: Optional[Dict[str, Any]] = None,
+        refresh: Optional[Callable[[], Awaitable[Optional[Dict[str, Any]]]]] = None,
+        refresh_interval: Optional[float] = None,
+    ):
+        """
+        Durum her değiştiğinde bir snapshot üretir, son durumda (done/error) biter.
+        Redis yoksa başka süreçlerin olayları gelmez; `refresh_interval` verilirse bekleme o kadar
+        sürede zaman aşımına uğrar ve `refresh()` ile paylaşılan store'dan güncel durum okunur.
+        """
+        cond = self._condition(task_id)
+        last_key = None
+        snapshot = self._latest.get(task_id) or initial
+        while True:
+            if snapshot is not None:
+                key = (snapshot["sent"], snapshot["status"])
+                if key != last_key:
+                    last_key = key
+                    yield snapshot
+                if snapshot["status"] in FINAL_STATUSES:
+                    return
+            seen = self._latest.get(task_id)
+            async with cond:
+                try:
+                    await asyncio.wait_for(
+                        cond.wait_for(lambda: self._latest.get(task_id) is not seen),
+                        timeout=refresh_interval,
+                    )
+                    snapshot = self._latest[task_id]
+                    continue
+                except asyncio.TimeoutError:
+                    pass
+            fresh = await refresh() if refresh else None
+            if fresh is not None:
+                snapshot = fresh
+
+
+def summary_event(snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "task_id": snapshot.get("task_id"),
+        "status": snapshot["status"],
+        "total": snapshot["total"],
+        "success": snapshot["success"],
+        "fail": snapshot["fail"],
+        "error": snapshot.get("error"),
+        "elapsed_seconds": snapshot.get("elapsed_seconds"),
+    }
@@ -0,0 +1,335 @@
+# -- coding: utf-8 --
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Optional
+
+import redis.asyncio as aioredis
+
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+ERROR = "error"
+
+
+def progress_percent(sent: int, total: int) -> int:
+    return int(sent / total * 100) if total else 100
+
+
+class SQLiteCampaignStore:
+    """
+    Redis yokken kullanılan kalıcı kampanya kuyruğu.
+    Aynı veritabanı dosyasını paylaşan tüm uvicorn worker'ları aynı kuyruğu görür;
+    sahiplik kira (lease) ile belirlenir, süresi dolan kampanyayı başka bir worker devralır.
+    sqlite3 çağrıları (BEGIN IMMEDIATE kilit beklemesi dahil) event loop'u bloklamasın diye
+    bağlantının sahibi olan tek bir thread'de çalışır.
+    """
+
+    backend = "sqlite"
+
+    def __init__(self, path):
+        path = str(path)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="campaign-sqlite")
+        self.conn = self._executor.submit(self._open, path).result()
+
+    def _open(self, path):
+        conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS campaigns (
+                id TEXT PRIMARY KEY,
+                spec TEXT NOT NULL,
+                status TEXT NOT NULL,
+                total INTEGER NOT NULL,
+                sent INTEGER NOT NULL DEFAULT 0,
+                success INTEGER NOT NULL DEFAULT 0,
+                fail INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                worker TEXT,
+                lease_until REAL NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS recipients (
+                campaign_id TEXT NOT NULL,
+                idx INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                PRIMARY KEY (campaign_id, idx)
+            );
+            CREATE TABLE IF NOT EXISTS rate_windows (
+                account TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (account, window)
+            );
+        """)
+        return conn
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def close(self):
+        await self._run(self.conn.close)
+        self._executor.shutdown(wait=False)
+
+    async def create(self, spec: Dict[str, Any]) -> str:
+        return await self._run(self._create, spec)
+
+    def _create(self, spec: Dict[str, Any]) -> str:
+        task_id = str(uuid.uuid4())
+        now = time.time()
+        self.conn.execute(
+            "INSERT INTO campaigns (id, spec, status, total, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (task_id, json.dumps(spec, ensure_ascii=False), PENDING, len(spec["targets"]), now, now),
+        )
+        return task_id
+
+    async def lease(self, worker_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        """Bekleyen ya da kirası dolmuş en eski kampanyayı bu worker'a kiralar."""
+        return await self._run(self._lease, worker_id, ttl)
+
+    def _lease(self, worker_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(
+                "SELECT id, spec FROM campaigns WHERE status IN (?, ?) AND lease_until <= ? "
+                "ORDER BY created_at LIMIT 1",
+                (PENDING, RUNNING, now),
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE campaigns SET status = ?, worker = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                (RUNNING, worker_id, now + ttl, now, row[0]),
+            )
+        done = self.conn.execute("SELECT idx FROM recipients WHERE campaign_id = ?", (row[0],)).fetchall()
+        return {"id": row[0], "spec": json.loads(row[1]), "done": {idx for (idx,) in done}}
+
+    async def renew(self, task_id: str, worker_id: str, ttl: float) -> bool:
+        return await self._run(self._renew, task_id, worker_id, ttl)
+
+    def _renew(self, task_id: str, worker_id: str, ttl: float) -> bool:
+        cur = self.conn.execute(
+            "UPDATE campaigns SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + ttl, task_id, worker_id, RUNNING),
+        )
+        return cur.rowcount == 1
+
+    async def record(self, task_id: str, index: int, status: str) -> bool:
+        """Alıcı sonucunu yazar; aynı alıcı ikinci kez sayılmaz. Yeni kayıtsa True."""
+        return await self._run(self._record, task_id, index, status)
+
+    def _record(self, task_id: str, index: int, status: str) -> bool:
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO recipients (campaign_id, idx, status) VALUES (?, ?, ?)",
+                (task_id, index, status),
+            )
+            if cur.rowcount == 0:
+                return False
+            column = "success" if status == "success" else "fail"
+            self.conn.execute(
+                f"UPDATE campaigns SET sent = sent + 1, {column} = {column} + 1, updated_at = ? WHERE id = ?",
+                (time.time(), task_id),
+            )
+        return True
+
+    async def finish(self, task_id: str, worker_id: str, status: str, error: Optional[str] = None):
+        return await self._run(self._finish, task_id, worker_id, status, error)
+
+    def _finish(self, task_id: str, worker_id: str, status: str, error: Optional[str] = None):
+        self.conn.execute(
+            "UPDATE campaigns SET status = ?, error = ?, lease_until = 0, updated_at = ? WHERE id = ? AND worker = ?",
+            (status, error, time.time(), task_id, worker_id),
+        )
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        return await self._run(self._get, task_id)
+
+    def _get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT status, total, sent, success, fail, error FROM campaigns WHERE id = ?", (task_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, total, sent, success, fail, error = row
+        return {
+            "progress": 100 if status == DONE else progress_percent(sent, total),
+            "total": total,
+            "sent": sent,
+            "success": success,
+            "fail": fail,
+            "status": status,
+            "error": error,
+        }
+
+    async def throttle(self, account: str, rate: float) -> float:
+        """
+        Hesap başına saniyelik gönderim penceresi. İzin varsa 0, yoksa bir sonraki
+        pencereye kadar beklenecek süre döner. Tüm süreçler aynı sayacı paylaşır.
+        """
+        return await self._run(self._throttle, account, rate)
+
+    def _throttle(self, account: str, rate: float) -> float:
+        now = time.time()
+        window = int(now)
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM rate_windows WHERE account = ? AND window < ?", (account, window))
+            row = self.conn.execute(
+                "SELECT count FROM rate_windows WHERE account = ? AND window = ?", (account, window)
+            ).fetchone()
+            count = row[0] if row else 0
+            if count >= rate:
+                return window + 1 - now
+            self.conn.execute(
+                "INSERT OR REPLACE INTO rate_windows (account, window, count) VALUES (?, ?, ?)",
+                (account, window, count + 1),
+            )
+        return 0.0
+
+
+_LEASE_SCRIPT = """
+local ids = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, 1)
+if #ids == 0 then return false end
+redis.call('ZADD', KEYS[1], ARGV[2], ids[1])
+redis.call('HSET', ARGV[4] .. ids[1], 'worker', ARGV[3], 'status', 'running')
+return ids[1]
+"""
+
+_RENEW_SCRIPT = """
+if redis.call('HGET', KEYS[2], 'worker') ~= ARGV[1] then return 0 end
+if redis.call('HGET', KEYS[2], 'status') ~= 'running' then return 0 end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+return 1
+"""
+
+_FINISH_SCRIPT = """
+if redis.call('HGET', KEYS[2], 'worker') ~= ARGV[1] then return 0 end
+redis.call('ZREM', KEYS[1], ARGV[2])
+redis.call('HSET', KEYS[2], 'status', ARGV[3], 'error', ARGV[4])
+return 1
+"""
+
+_RECORD_SCRIPT = """
+if redis.call('HSETNX', KEYS[2], ARGV[1], ARGV[2]) == 0 then return 0 end
+redis.call('HINCRBY', KEYS[1], 'sent', 1)
+redis.call('HINCRBY', KEYS[1], ARGV[3], 1)
+return 1
+"""
+
+
+class RedisCampaignStore:
+    """
+    Redis üzerinde kampanya kuyruğu. Kira süreleri bir sorted set'te tutulur (skor = kira bitişi);
+    kiralama, yenileme ve sonuç yazma Lua script'leriyle atomiktir.
+    """
+
+    backend = "redis"
+    LEASES = "campaigns:leases"
+    PREFIX = "campaign:"
+
+    def __init__(self, redis_conn):
+        self.redis = redis_conn
+
+    def _key(self, task_id):
+        return f"{self.PREFIX}{task_id}"
+
+    async def close(self):
+        await self.redis.close()
+
+    async def create(self, spec: Dict[str, Any]) -> str:
+        task_id = str(uuid.uuid4())
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(task_id), mapping={
+                "spec": json.dumps(spec, ensure_ascii=False),
+                "status": PENDING,
+                "total": len(spec["targets"]),
+                "sent": 0,
+                "success": 0,
+                "fail": 0,
+                "error": "",
+                "worker": "",
+            })
+            pipe.zadd(self.LEASES, {task_id: 0})
+            await pipe.execute()
+        return task_id
+
+    async def lease(self, worker_id: str, ttl: float) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        task_id = await self.redis.eval(_LEASE_SCRIPT, 1, self.LEASES, now, now + ttl, worker_id, self.PREFIX)
+        if not task_id:
+            return None
+        task_id = task_id.decode() if isinstance(task_id, bytes) else task_id
+        spec = await self.redis.hget(self._key(task_id), "spec")
+        done = await self.redis.hkeys(f"{self._key(task_id)}:results")
+        return {"id": task_id, "spec": json.loads(spec), "done": {int(idx) for idx in done}}
+
+    async def renew(self, task_id: str, worker_id: str, ttl: float) -> bool:
+        ok = await self.redis.eval(
+            _RENEW_SCRIPT, 2, self.LEASES, self._key(task_id), worker_id, time.time() + ttl, task_id
+        )
+        return bool(ok)
+
+    async def record(self, task_id: str, index: int, status: str) -> bool:
+        column = "success" if status == "success" else "fail"
+        ok = await self.redis.eval(
+            _RECORD_SCRIPT, 2, self._key(task_id), f"{self._key(task_id)}:results", index, status, column
+        )
+        return bool(ok)
+
+    async def finish(self, task_id: str, worker_id: str, status: str, error: Optional[str] = None):
+        await self.redis.eval(
+            _FINISH_SCRIPT, 2, self.LEASES, self._key(task_id), worker_id, task_id, status, error or ""
+        )
+
+    async def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        data = await self.redis.hmget(self._key(task_id), "status", "total", "sent", "success", "fail", "error")
+        if data[0] is None:
+            return None
+        status, total, sent, success, fail, error = [v.decode() if isinstance(v, bytes) else v for v in data]
+        total, sent = int(total), int(sent)
+        return {
+            "progress": 100 if status == DONE else progress_percent(sent, total),
+            "total": total,
+            "sent": sent,
+            "success": int(success),
+            "fail": int(fail),
+            "status": status,
+            "error": error or None,
+        }
+
+    async def throttle(self, account: str, rate: float) -> float:
+        now = time.time()
+        window = int(now)
+        key = f"smtp_rate:{account}:{window}"
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.incr(key)
+            pipe.expire(key, 2)
+            count, _ = await pipe.execute()
+        if count > rate:
+            return window + 1 - now
+        return 0.0
+
+
+async def open_campaign_store(backend: str, redis_url: str, sqlite_path) -> Any:
+    """backend: "redis", "sqlite" ya da "auto" (Redis'e ulaşılamazsa SQLite)."""
+    if backend in ("redis", "auto"):
+        redis_conn = aioredis.from_url(redis_url)
+        try:
+            await redis_conn.ping()
+            return RedisCampaignStore(redis_conn)
+        except Exception as e:
+            await redis_conn.close()
+            if backend == "redis":
+                raise
+            print(f"[CAMPAIGN QUEUE] Redis unavailable ({e}), falling back to SQLite: {sqlite_path}")
+    return SQLiteCampaignStore(sqlite_path)
@@ -0,0 +1,159 @@
+# -- coding: utf-8 --
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Optional
+
+from app.core.config import settings
+from app.mailer.compiler import compile_campaign
+from app.mailer.progress import ProgressTracker
+from app.mailer.queue import DONE, ERROR, RUNNING
+from app.mailer.smtp_pool import SMTPPool
+
+logger = logging.getLogger(__name__)
+
+
+def smtp_account() -> str:
+    """Hız sınırının paylaşıldığı SMTP hesabı anahtarı."""
+    return f"{settings.SMTP_USER}@{settings.SMTP_HOST}:{settings.SMTP_PORT}"
+
+
+class LeaseLost(Exception):
+    pass
+
+
+class CampaignRunner:
+    """
+    Kuyruktan kampanya kiralayıp gönderen döngüler. Süreç başına `concurrency` kampanya aynı anda çalışır.
+    Kira periyodik olarak yenilenir; süreç çökerse kira dolunca başka bir worker kampanyayı devralır
+    ve sonucu kaydedilmiş alıcıları atlayarak kaldığı yerden devam eder.
+    """
+
+    def __init__(self, store, broker=None, worker_id: Optional[str] = None, concurrency: Optional[int] = None,
+                 lease_ttl: Optional[float] = None, poll_interval: float = 1.0, rate_per_second: Optional[float] = None,
+                 delivery_log=None):
+        self.store = store
+        self.broker = broker
+        self.delivery_log = delivery_log
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.concurrency = concurrency or settings.CAMPAIGN_CONCURRENCY
+        self.lease_ttl = lease_ttl or settings.CAMPAIGN_LEASE_SECONDS
+        self.poll_interval = poll_interval
+        self.rate_per_second = settings.SMTP_RATE_PER_SECOND if rate_per_second is None else rate_per_second
+        self._tasks = []
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._loop()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _loop(self):
+        while True:
+            try:
+                campaign = await self.store.lease(self.worker_id, self.lease_ttl)
+            except Exception as e:
+                print(f"[CAMPAIGN QUEUE] lease error: {e}")
+                campaign = None
+            if campaign is None:
+                await asyncio.sleep(self.poll_interval)
+                continue
+            await self.run_campaign(campaign)
+
+    async def _heartbeat(self, task_id):
+        while True:
+            await asyncio.sleep(self.lease_ttl / 3)
+            if not await self.store.renew(task_id, self.worker_id, self.lease_ttl):
+                raise LeaseLost(task_id)
+
+    async def _wait_for_rate(self, account):
+        if not self.rate_per_second:
+            return
+        while True:
+            delay = await self.store.throttle(account, self.rate_per_second)
+            if delay <= 0:
+                return
+            await asyncio.sleep(delay)
+
+    async def _publish(self, tracker, status=None, error=None):
+        if self.broker is not None:
+            await self.broker.publish(tracker.task_id, tracker.snapshot(status or RUNNING, error))
+
+    async def run_campaign(self, campaign):
+        task_id = campaign["id"]
+        tracker = ProgressTracker(task_id, await self.store.get(task_id))
+        heartbeat = asyncio.create_task(self._heartbeat(task_id))
+        sending = asyncio.create_task(self._send(task_id, campaign["spec"], campaign["done"], tracker))
+        try:
+            done, _ = await asyncio.wait({heartbeat, sending}, return_when=asyncio.FIRST_COMPLETED)
+            if sending in done:
+                sending.result()
+                await self.store.finish(task_id, self.worker_id, DONE)
+                await self._publish(tracker, DONE)
+            else:
+                # Kira kaybedildi: kampanyayı artık başka bir worker yürütüyor
+                sending.cancel()
+                await asyncio.gather(sending, return_exceptions=True)
+                print(f"[CAMPAIGN QUEUE] lease lost for {task_id}")
+        except Exception as e:
+            await self.store.finish(task_id, self.worker_id, ERROR, str(e))
+            await self._publish(tracker, ERROR, str(e))
+        finally:
+            heartbeat.cancel()
+            await asyncio.gather(heartbeat, return_exceptions=True)
+
+    async def _send(self, task_id, spec, done, tracker):
+        # Şablon, görsel ve MIME iskeleti kampanya başına bir kez hazırlanır
+        campaign = compile_campaign(spec["subject"], spec["html_body"], spec["image_path"], settings.SMTP_USER)
+        account = smtp_account()
+        pool = SMTPPool(
+            settings.SMTP_HOST,
+            settings.SMTP_PORT,
+            username=settings.SMTP_USER,
+            password=settings.SMTP_PASS,
+            start_tls=settings.SMTP_START_TLS,
+            size=settings.SMTP_POOL_SIZE,
+            max_messages_per_connection=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+        )
+
+        # Aynı anda en fazla SMTP_POOL_SIZE alıcı işlenir; render edilmiş mesajlar (base64 görsel
+        # dahil) hız sınırı ve bağlantı beklenirken hedef sayısı kadar bellekte birikmez
+        slots = asyncio.Semaphore(settings.SMTP_POOL_SIZE)
+
+        async def deliver(index, target):
+            async with slots:
+                try:
+                    await self._wait_for_rate(account)
+                    message = campaign.render(target)
+                    await pool.send(message, sender=settings.SMTP_USER, recipients=[target])
+                    status_ = "success"
+                except Exception as e:
+                    logger.warning("Campaign %s: delivery to %s failed: %s", task_id, target, e)
+                    status_ = "fail"
+            if not await self.store.record(task_id, index, status_):
+                return
+            tracker.record(status_)
+            await self._publish(tracker)
+            if self.delivery_log is None:
+                return
+            self.delivery_log.log({
+                "task_id": task_id,
+                "target": target,
+                "status": status_,
+                "timestamp": datetime.utcnow().isoformat(),
+                "template": spec["subject"],
+                "image_used": spec["image_name"]
+            })
+
+        async with pool:
+            await asyncio.gather(*(
+                deliver(index, target)
+                for index, target in enumerate(spec["targets"])
+                if index not in done
+            ))
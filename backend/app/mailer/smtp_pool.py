@@ -0,0 +1,160 @@
+# -- coding: utf-8 --
+import asyncio
+import time
+from typing import Optional
+
+import aiosmtplib
+
+
+class PooledConnection:
+    """Havuzdaki tek bir kimliği doğrulanmış SMTP bağlantısı ve kullanım sayaçları."""
+
+    def __init__(self, smtp: aiosmtplib.SMTP):
+        self.smtp = smtp
+        self.messages = 0
+        self.dirty = False  # Son işlem yarıda kaldı; tekrar kullanmadan önce RSET gerekir
+        self.last_used = time.monotonic()
+
+    @property
+    def is_connected(self):
+        return self.smtp.is_connected
+
+
+class SMTPPool:
+    """
+    Uzun ömürlü, kimliği doğrulanmış SMTP bağlantı havuzu.
+    Her bağlantı en fazla `max_messages_per_connection` mail taşır, sonra kapatılıp yeniden açılır;
+    eşzamanlı gönderim `size` ile sınırlıdır. Başarısız bir işlemden sonra bağlantı RSET ile
+    temizlenip tekrar kullanılır, bağlantı kopmuşsa mail yeni bir bağlantı üzerinden bir kez daha denenir.
+    """
+
+    def __init__(
+        self,
+        hostname: str,
+        port: int,
+        username: Optional[str] = None,
+        password: Optional[str] = None,
+        start_tls: Optional[bool] = True,
+        use_tls: bool = False,
+        size: int = 4,
+        max_messages_per_connection: int = 100,
+        idle_timeout: float = 60.0,
+        timeout: float = 30.0,
+    ):
+        self.hostname = hostname
+        self.port = port
+        self.username = username
+        self.password = password
+        self.start_tls = start_tls
+        self.use_tls = use_tls
+        self.size = size
+        self.max_messages_per_connection = max_messages_per_connection
+        self.idle_timeout = idle_timeout
+        self.timeout = timeout
+        self.connections_opened = 0
+        self._slots: asyncio.LifoQueue = asyncio.LifoQueue()
+        for _ in range(size):
+            self._slots.put_nowait(None)
+        self._closed = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _connect(self) -> PooledConnection:
+        smtp = aiosmtplib.SMTP(
+            hostname=self.hostname,
+            port=self.port,
+            username=self.username or None,
+            password=self.password or None,
+            start_tls=self.start_tls,
+            use_tls=self.use_tls,
+            timeout=self.timeout,
+        )
+        # connect() STARTTLS ve AUTH'u da yapar; el sıkışma bağlantı başına bir kez ödenir
+        await smtp.connect()
+        self.connections_opened += 1
+        return PooledConnection(smtp)
+
+    async def _discard(self, conn: Optional[PooledConnection]):
+        if conn is None:
+            return
+        try:
+            if conn.is_connected:
+                await conn.smtp.quit()
+        except Exception:
+            conn.smtp.close()
+
+    async def _prepare(self, conn: Optional[PooledConnection]) -> PooledConnection:
+        """Slot'taki bağlantıyı gönderime hazırlar: gerekirse yeniden bağlanır ya da RSET gönderir."""
+        if conn is not None and (
+            not conn.is_connected
+            or conn.messages >= self.max_messages_per_connection
+            or time.monotonic() - conn.last_used > self.idle_timeout
+        ):
+            await self._discard(conn)
+            conn = None
+        if conn is None:
+            return await self._connect()
+        if conn.dirty:
+            try:
+                await conn.smtp.rset()
+                conn.dirty = False
+            except aiosmtplib.SMTPException:
+                await self._discard(conn)
+                return await self._connect()
+        return conn
+
+    async def _send_on(self, conn: PooledConnection, message, sender, recipients):
+        if isinstance(message, (bytes, str)):
+            return await conn.smtp.sendmail(sender, recipients, message)
+        return await conn.smtp.send_message(message, sender=sender, recipients=recipients)
+
+    async def send(self, message, sender: Optional[str] = None, recipients=None):
+        """
+        EmailMessage ya da (sender, recipients ile birlikte) ham bayt gönderir.
+        Sunucu yanıt hatalarını (örn. alıcı reddi) çağırana iletir; bağlantı havuzda kalır.
+        """
+        if self._closed:
+            raise RuntimeError("SMTP pool is closed")
+        conn = await self._slots.get()
+        try:
+            for attempt in range(2):
+                try:
+                    conn = await self._prepare(conn)
+                    response = await self._send_on(conn, message, sender, recipients)
+                    conn.messages += 1
+                    conn.last_used = time.monotonic()
+                    return response
+                except aiosmtplib.SMTPServerDisconnected:
+                    # Sunucu boşta kalan bağlantıyı kapatmış olabilir; yeni bağlantıyla bir kez daha dene
+                    await self._discard(conn)
+                    conn = None
+                    if attempt:
+                        raise
+                except aiosmtplib.SMTPException:
+                    if conn is not None:
+                        conn.dirty = True
+                        conn.last_used = time.monotonic()
+                    raise
+        except asyncio.CancelledError:
+            # İşlemin ortasında iptal: protokol durumu belirsiz, bağlantı tekrar kullanılamaz
+            if conn is not None:
+                conn.smtp.close()
+            conn = None
+            raise
+        except Exception:
+            if conn is not None and not conn.is_connected:
+                conn = None
+            raise
+        finally:
+            self._slots.put_nowait(conn)
+
+    async def close(self):
+        self._closed = True
+        conns = []
+        while not self._slots.empty():
+            conns.append(self._slots.get_nowait())
+        await asyncio.gather(*(self._discard(c) for c in conns), return_exceptions=True)
@@ -1,6 +1,6 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 import torch
 import shutil
@@ -14,6 +14,9 @@ from PIL import Image
 from io import BytesIO
 import os
 import sys
+import uuid
+import asyncio
+from typing import List
 
 # Add parent directory to path to allow importing src if needed in future
 # and to be robust
@@ -25,6 +28,9 @@ sys.path.append(project_root)
 from app.core.config import settings
 from app.model.detector import load_trained_detector, LABELS, GradCAM, get_last_conv_layer, overlay_cam_on_image
 from app.routers import mail_sender_router, inbox_router
+from app.utils.video_analysis import analyze_video
+from app.utils.live_guard import GuardSession, InferenceBatcher, parse_frame
+from services.inbox_cache_cleaner import inbox_lock
 from torchvision import transforms
 
 app = FastAPI(title=settings.PROJECT_NAME)
@@ -160,19 +166,212 @@ async def analyze_image(file: UploadFile = File(...)):
         "gradcam_url": gradcam_url
     }
 
-def save_result_to_json(result_obj):
-    results = []
-    if settings.RESULTS_FILE.exists():
+# Face crops per request from the guardian agent
+MAX_BATCH_FILES = 16
+
+batch_preprocess = transforms.Compose([
+    transforms.Resize((380, 380)),
+    transforms.ToTensor(),
+    transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
+])
+
+@app.post("/analyze-batch")
+async def analyze_batch(files: List[UploadFile] = File(...)):
+    """
+    Batched inference for face crops sent by the guardian agent.
+    Crops are already face regions, so the face guard, Grad-CAM and result storage are skipped.
+    """
+    if len(files) > MAX_BATCH_FILES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_FILES} images per batch.")
+
+    images = []
+    for file in files:
         try:
-            with open(settings.RESULTS_FILE, "r", encoding="utf-8") as f:
-                results = json.load(f)
-        except Exception:
-            results = []
-    
-    results.insert(0, result_obj)
-    
-    with open(settings.RESULTS_FILE, "w", encoding="utf-8") as f:
-        json.dump(results, f, ensure_ascii=False, indent=2)
+            images.append(Image.open(BytesIO(await file.read())).convert("RGB"))
+        except Exception as e:
+            print(f"Analyze Batch Error: {e}")
+            raise HTTPException(status_code=400, detail=f"Could not process image {file.filename}.")
+
+    input_tensor = torch.stack([batch_preprocess(image) for image in images]).to(device)
+    with torch.no_grad():
+        outputs = model(input_tensor)
+        probs = torch.softmax(outputs, dim=1).cpu().numpy()
+        pred_idx = outputs.argmax(dim=1).cpu().numpy()
+
+    return {"results": [
+        {"file_name": file.filename, "result": LABELS[int(idx)], "score": round(float(p[int(idx)]) * 100, 2)}
+        for file, idx, p in zip(files, pred_idx, probs)
+    ]}
+
+FAKE_INDEX = next(idx for idx, name in LABELS.items() if name == "fake")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+def predict_fake_probabilities(crops):
+    """Fake-class probabilities for a batch of RGB face crops (numpy arrays)."""
+    input_tensor = torch.stack([batch_preprocess(Image.fromarray(crop)) for crop in crops]).to(device)
+    with torch.no_grad():
+        probs = torch.softmax(model(input_tensor), dim=1)[:, FAKE_INDEX]
+    return probs.cpu().numpy().tolist()
+
+@app.post("/analyze-video")
+async def analyze_video_file(
+    file: UploadFile = File(...),
+    sample_fps: float = settings.VIDEO_SAMPLE_FPS,
+    segment_seconds: float = settings.VIDEO_SEGMENT_SECONDS,
+):
+    """
+    Decodes the video server-side at `sample_fps`, scores the largest face of each sampled frame
+    in batches and streams NDJSON events: "meta", one "segment" per `segment_seconds` of video
+    (EMA-smoothed score) as soon as it is scored, and a closing "summary" with the timeline.
+    """
+    content_type = file.content_type or ""
+    if not (content_type.startswith("video/") or content_type == "application/octet-stream"):
+        raise HTTPException(status_code=400, detail="Only video files are allowed.")
+    if not (0 < sample_fps <= 30) or not (0 < segment_seconds <= 3600):
+        raise HTTPException(status_code=400, detail="Invalid sample_fps or segment_seconds.")
+
+    # OpenCV decodes from a path: the upload is spooled to TMP_DIR in chunks, never held in memory
+    os.makedirs(settings.TMP_DIR, exist_ok=True)
+    ext = os.path.splitext(file.filename or "")[-1] or ".mp4"
+    video_path = str(settings.TMP_DIR / f"video_{uuid.uuid4().hex}{ext}")
+    max_bytes = settings.VIDEO_MAX_UPLOAD_MB * 1024 * 1024
+    size = 0
+    try:
+        with open(video_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail="Video is too large.")
+                f.write(chunk)
+    except BaseException:
+        os.remove(video_path)
+        raise
+
+    face_cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+
+    def events():
+        # Sync generator: Starlette iterates it in the threadpool, decoding never blocks the event loop
+        try:
+            for event in analyze_video(
+                video_path,
+                predict_fake_probabilities,
+                face_cascade,
+                sample_fps=sample_fps,
+                segment_seconds=segment_seconds,
+                batch_size=settings.VIDEO_BATCH_SIZE,
+                alpha=settings.VIDEO_EMA_ALPHA,
+                threshold=settings.VIDEO_FAKE_THRESHOLD,
+            ):
+                yield json.dumps(event) + "\n"
+        except Exception as e:
+            print(f"Analyze Video Error: {e}")
+            yield json.dumps({"type": "error", "detail": str(e)}) + "\n"
+        finally:
+            os.remove(video_path)
+
+    return StreamingResponse(events(), media_type="application/x-ndjson")
+
+def predict_encoded_frames(payloads):
+    """Fake probabilities for JPEG/PNG face crops; None for payloads that don't decode."""
+    crops = []
+    for payload in payloads:
+        frame = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_COLOR)
+        crops.append(None if frame is None else cv2.cvtColor(frame, cv2.COLOR_BGR2RGB))
+    valid = [crop for crop in crops if crop is not None]
+    scores = iter(predict_fake_probabilities(valid) if valid else [])
+    return [None if crop is None else next(scores) for crop in crops]
+
+# Frames of all live sessions share model batches
+frame_batcher = InferenceBatcher(
+    predict_encoded_frames,
+    max_batch=settings.LIVE_BATCH_SIZE,
+    max_wait_ms=settings.LIVE_BATCH_WAIT_MS,
+)
+
+@app.on_event("startup")
+async def start_frame_batcher():
+    frame_batcher.start()
+
+@app.on_event("shutdown")
+async def stop_frame_batcher():
+    await frame_batcher.stop()
+
+@app.websocket("/ws/guardian")
+async def guardian_stream(websocket: WebSocket):
+    """
+    Live guardian session. The client sends binary frames (uint32 seq, uint16 track id, JPEG crop);
+    the server smooths each track's fake probability and sends a JSON verdict only when a track's
+    state changes. Stale or duplicate frames are skipped, and frames beyond LIVE_MAX_PENDING are dropped.
+    """
+    await websocket.accept()
+    session = GuardSession(settings.LIVE_EMA_ALPHA, settings.LIVE_ALARM_ON, settings.LIVE_ALARM_OFF)
+    send_lock = asyncio.Lock()
+    pending = set()
+
+    async def send(event):
+        async with send_lock:
+            await websocket.send_json(event)
+
+    async def score(seq, track, payload):
+        try:
+            probability = await frame_batcher.submit(payload)
+        except Exception as e:
+            await send({"type": "error", "seq": seq, "track": track, "detail": "Inference failed."})
+            return
+        if probability is None:
+            await send({"type": "error", "seq": seq, "track": track, "detail": "Could not decode frame."})
+            return
+        event = session.update(track, seq, probability)
+        if event:
+            await send(event)
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            data = message.get("bytes")
+            if data is None:
+                # Text frames are not part of the protocol; report and keep the session
+                await send({"type": "error", "detail": "Expected binary frames."})
+                continue
+            try:
+                seq, track, payload = parse_frame(data)
+            except ValueError as e:
+                await send({"type": "error", "detail": str(e)})
+                continue
+            if not session.accept(track, seq):
+                continue
+            if len(pending) >= settings.LIVE_MAX_PENDING:
+                session.dropped += 1
+                continue
+            task = asyncio.create_task(score(seq, track, payload))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(pending):
+            task.cancel()
+
+def save_result_to_json(result_obj):
+    # Same lock as the storage janitor's results.json reconciliation, so neither write is lost
+    with inbox_lock(settings.RESULTS_FILE):
+        results = []
+        if settings.RESULTS_FILE.exists():
+            try:
+                with open(settings.RESULTS_FILE, "r", encoding="utf-8") as f:
+                    results = json.load(f)
+            except Exception:
+                results = []
+
+        results.insert(0, result_obj)
+
+        with open(settings.RESULTS_FILE, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
 
 @app.get("/images/{image_id}")
 def get_image(image_id: str):
@@ -192,30 +391,32 @@ def get_gradcam_image(filename: str):
 def get_results():
     if not settings.RESULTS_FILE.exists():
         return []
-        
-    try:
-        with open(settings.RESULTS_FILE, "r", encoding="utf-8") as f:
-            results = json.load(f)
-    except Exception:
-        return []
-        
-    # Filter missing files
-    filtered = []
-    changed = False
-    for r in results:
-        image_id = r.get("image_id")
-        if not image_id: continue
-        
-        # Check if file exists
-        if (settings.UPLOAD_DIR / image_id).exists():
-            filtered.append(r)
-        else:
-            changed = True
-            
-    if changed:
-         with open(settings.RESULTS_FILE, "w", encoding="utf-8") as f:
-            json.dump(filtered, f, ensure_ascii=False, indent=2)
-            
+
+    # Read-filter-rewrite under the results.json lock shared with save_result_to_json and the janitor
+    with inbox_lock(settings.RESULTS_FILE):
+        try:
+            with open(settings.RESULTS_FILE, "r", encoding="utf-8") as f:
+                results = json.load(f)
+        except Exception:
+            return []
+
+        # Filter missing files
+        filtered = []
+        changed = False
+        for r in results:
+            image_id = r.get("image_id")
+            if not image_id: continue
+
+            # Check if file exists
+            if (settings.UPLOAD_DIR / image_id).exists():
+                filtered.append(r)
+            else:
+                changed = True
+
+        if changed:
+            with open(settings.RESULTS_FILE, "w", encoding="utf-8") as f:
+                json.dump(filtered, f, ensure_ascii=False, indent=2)
+
     return filtered
 
 @app.post("/upload-image")
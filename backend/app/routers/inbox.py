@@ -13,6 +13,7 @@ from slowapi import Limiter
 from slowapi.util import get_remote_address
 import os
 import json
+import asyncio
 import aiofiles
 import redis.asyncio as aioredis
 from typing import List, Optional
@@ -20,6 +21,7 @@ from uuid import UUID
 from datetime import datetime
 
 from app.core.config import settings
+from services.inbox_cache_cleaner import rewrite_jsonl
 
 router = APIRouter()
 
@@ -66,7 +68,8 @@ async def get_mails(request: Request, phishing: Optional[bool] = None, skip: int
             return datetime.fromisoformat(date_str)
         except Exception:
             return datetime.min
-    mails = sorted(mails, key=parse_date, reverse=False)
+    # En yeni mailler önce: inbox DAYS_KEEP gün tutuyor, ilk sayfa en güncel mailleri göstermeli
+    mails = sorted(mails, key=parse_date, reverse=True)
     return mails[skip:skip+limit]
 
 # SSE /mails/stream
@@ -120,16 +123,17 @@ async def get_attachment(mail_id: str, filename: str):
 # DELETE /mails/{id}
 @router.delete("/mails/{mail_id}")
 async def delete_mail(mail_id: str):
-    mails = await read_mails()
     found = False
-    for mail in mails:
-        if mail["id"] == mail_id:
-            mail["deleted"] = True
-            found = True
+
+    def mark_deleted(mail):
+        nonlocal found
+        if mail.get("id") != mail_id:
+            return True
+        found = True
+        return {**mail, "deleted": True}
+
+    # Yeniden yazma worker eklemeleri ve compactor ile aynı inbox_lock altında yapılır
+    await asyncio.to_thread(rewrite_jsonl, JSONL_PATH, mark_deleted)
     if not found:
         raise HTTPException(status_code=404, detail="Mail not found")
-    # Yeniden yaz
-    async with aiofiles.open(JSONL_PATH, mode="w", encoding="utf-8") as f:
-        for mail in mails:
-            await f.write(json.dumps(mail, ensure_ascii=False) + "\n")
-    return {"ok": True} 
\ No newline at end of file
+    return {"ok": True}
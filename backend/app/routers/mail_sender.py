@@ -1,27 +1,57 @@
 # -- coding: utf-8 --
-from fastapi import APIRouter, Depends, HTTPException, status, Request
+from fastapi import APIRouter, HTTPException, Request
 from sse_starlette.sse import EventSourceResponse
-from fastapi.responses import JSONResponse
 from pydantic import BaseModel, EmailStr
-from typing import List, Dict, Any
-import aiosmtplib
-import jinja2
+from typing import List
 import os
-from datetime import datetime
 import json
-import uuid
 import asyncio
-import email.message
-import re
 
 from app.core.config import settings
+from app.mailer import CampaignRunner, DeliveryLog, ProgressBroker, open_campaign_store
+from app.mailer.progress import FINAL_STATUSES, summary_event
 
 router = APIRouter()
 
 MAIL_LOGS_PATH = settings.MAIL_LOGS_PATH
 
-# Basit in-memory task store (production için Redis önerilir)
-tasks: Dict[str, Dict[str, Any]] = {}
+# Kalıcı kampanya kuyruğu (Redis, yoksa SQLite); tüm uvicorn worker'ları aynı durumu görür
+campaign_store = None
+campaign_runner = None
+# İlerleme olayları: süreç içinde asyncio.Condition, Redis varsa pub/sub ile tüm worker'lar
+progress_broker = None
+# Gönderim logu: toplu yazılır, kampanya/alıcı/durum indeksi rapor endpoint'ini besler
+delivery_log = None
+# Redis yokken başka süreçteki gönderimin ilerlemesini görmek için store bu aralıkla okunur
+PROGRESS_REFRESH_SECONDS = 2.0
+
+@router.on_event("startup")
+async def start_campaign_queue():
+    global campaign_store, campaign_runner, progress_broker, delivery_log
+    campaign_store = await open_campaign_store(settings.CAMPAIGN_BACKEND, settings.REDIS_URL, settings.CAMPAIGN_DB)
+    progress_broker = ProgressBroker(campaign_store.redis if campaign_store.backend == "redis" else None)
+    progress_broker.start()
+    delivery_log = DeliveryLog(
+        MAIL_LOGS_PATH,
+        max_bytes=settings.MAIL_LOG_MAX_BYTES,
+        flush_entries=settings.MAIL_LOG_FLUSH_ENTRIES,
+        flush_interval_ms=settings.MAIL_LOG_FLUSH_MS,
+    )
+    delivery_log.start()
+    campaign_runner = CampaignRunner(campaign_store, progress_broker, delivery_log=delivery_log)
+    campaign_runner.start()
+
+@router.on_event("shutdown")
+async def stop_campaign_queue():
+    if campaign_runner is not None:
+        await campaign_runner.stop()
+    if progress_broker is not None:
+        await progress_broker.stop()
+    if delivery_log is not None:
+        # Tamponda kalan kayıtlar kapanışta yazılır
+        await delivery_log.stop()
+    if campaign_store is not None:
+        await campaign_store.close()
 
 class SendPhishingRequest(BaseModel):
     subject: str
@@ -38,7 +68,6 @@ async def send_phishing(
         raise HTTPException(status_code=429, detail="En fazla 200 alıcıya izin verilir.")
     
     SMTP_HOST = settings.SMTP_HOST
-    SMTP_PORT = settings.SMTP_PORT
     SMTP_USER = settings.SMTP_USER
     SMTP_PASS = settings.SMTP_PASS
 
@@ -69,99 +98,44 @@ async def send_phishing(
     print("Görsel yolu:", image_path)
     if not os.path.exists(image_path):
         raise HTTPException(status_code=400, detail="Görsel bulunamadı.")
-    task_id = str(uuid.uuid4())
-    tasks[task_id] = {
-        "progress": 0,
-        "total": len(req.targets),
-        "sent": 0,
-        "status": "pending",
-        "error": None,
-    }
-    # Gönderim işlemini arka planda başlat
-    asyncio.create_task(_send_mails_background(task_id, req, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, image_path))
+    # Kampanya kuyruğa yazılır; kiralayan worker gönderir, çökme halinde başka bir worker devam eder
+    task_id = await campaign_store.create({
+        "subject": req.subject,
+        "html_body": req.html_body,
+        "image_name": req.image_name,
+        "image_path": image_path,
+        "targets": list(req.targets),
+    })
     return {"task_id": task_id}
 
-async def _send_mails_background(task_id, req, SMTP_HOST, SMTP_PORT, SMTP_USER, SMTP_PASS, image_path):
-    try:
-        template = jinja2.Template(req.html_body)
-        total = len(req.targets)
-        sent = 0
-        for target in req.targets:
-            context = {"first_name": "Kullanıcı", "last_name": "", "email": target}
-            html = template.render(**context)
-            try:
-                msg = email.message.EmailMessage()
-                msg["From"] = SMTP_USER
-                msg["To"] = target
-                msg["Subject"] = req.subject
-                msg.set_content("Bu mail HTML desteklemeyen istemciler için.")
-                msg.add_alternative(html, subtype="html")
-                # HTML içinden ilk cid:xxx ifadesini bul
-                cid_match = re.search(r'cid:([\\w\\-]+)', html)
-                cid = cid_match.group(1) if cid_match else "mailimage"
-                with open(image_path, "rb") as imgf:
-                    img_data = imgf.read()
-                    img_name = os.path.basename(image_path)
-                    maintype, subtype = "image", "png"
-                    if "." in img_name:
-                        ext = img_name.split(".")[-1].lower()
-                        if ext in ["jpg", "jpeg"]:
-                            subtype = "jpeg"
-                        elif ext == "gif":
-                            subtype = "gif"
-                    msg.get_payload()[1].add_related(
-                        img_data,
-                        maintype=maintype,
-                        subtype=subtype,
-                        cid=f"<{cid}>"
-                    )
-                    msg.add_attachment(img_data, maintype=maintype, subtype=subtype, filename=img_name)
-                await aiosmtplib.send(
-                    msg,
-                    hostname=SMTP_HOST,
-                    port=SMTP_PORT,
-                    username=SMTP_USER,
-                    password=SMTP_PASS,
-                    start_tls=True
-                )
-                status_ = "success"
-            except Exception as e:
-                status_ = "fail"
-            log_entry = {
-                "target": target,
-                "status": status_,
-                "timestamp": datetime.utcnow().isoformat(),
-                "template": req.subject,
-                "image_used": req.image_name
-            }
-            with open(MAIL_LOGS_PATH, "a", encoding="utf-8") as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + "\n")
-            sent += 1
-            percent = int(sent / total * 100)
-            tasks[task_id]["progress"] = percent
-            tasks[task_id]["sent"] = sent
-            await asyncio.sleep(0.1)  # Simülasyon için, gerçek gönderimde kaldırılabilir
-        tasks[task_id]["progress"] = 100
-        tasks[task_id]["status"] = "done"
-    except Exception as e:
-        tasks[task_id]["error"] = str(e)
-        tasks[task_id]["status"] = "error"
-
 @router.get("/send-phishing/{task_id}")
 async def phishing_progress(task_id: str):
-    if task_id not in tasks:
+    initial = await campaign_store.get(task_id)
+    if initial is None:
         raise HTTPException(status_code=404, detail="Task bulunamadı")
+    refresh_interval = None if progress_broker.redis is not None else PROGRESS_REFRESH_SECONDS
     async def event_stream():
+        # Varsayılan mesajın verisi yüzde olarak kalır (istemci onmessage ile okur);
+        # ayrıntılar "progress" ve kapanıştaki "summary" olaylarında gönderilir
         last_progress = -1
-        while True:
-            task = tasks.get(task_id)
-            if not task:
-                break
-            progress = task["progress"]
-            if progress != last_progress:
-                yield f"data: {progress}\n\n"
-                last_progress = progress
-            if progress >= 100 or task["status"] in ("done", "error"):
-                break
-            await asyncio.sleep(0.5)
-    return EventSourceResponse(event_stream()) 
\ No newline at end of file
+        async for snapshot in progress_broker.subscribe(
+            task_id, initial=initial, refresh=lambda: campaign_store.get(task_id), refresh_interval=refresh_interval
+        ):
+            if snapshot["progress"] != last_progress:
+                last_progress = snapshot["progress"]
+                yield {"data": snapshot["progress"]}
+            yield {"event": "progress", "data": json.dumps(snapshot, ensure_ascii=False)}
+            if snapshot["status"] in FINAL_STATUSES:
+                yield {"event": "summary", "data": json.dumps(summary_event(snapshot), ensure_ascii=False)}
+    return EventSourceResponse(event_stream())
+
+
+@router.get("/send-phishing/{task_id}/report")
+async def phishing_report(task_id: str, status: str = None, limit: int = 1000):
+    state = await campaign_store.get(task_id)
+    # Sadece indeks sorgulanır; log segmentleri okunmaz
+    report = await asyncio.to_thread(delivery_log.report, task_id, status, limit)
+    if state is None and not report["counts"]:
+        raise HTTPException(status_code=404, detail="Task bulunamadı")
+    report["campaign"] = state
+    return report
@@ -0,0 +1,128 @@
+import asyncio
+import struct
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# Binary frame: sequence number (uint32), track id (uint16), then the JPEG face crop
+FRAME_HEADER = struct.Struct(">IH")
+
+
+def parse_frame(data: bytes):
+    """(seq, track, payload) from a binary WebSocket message."""
+    if len(data) <= FRAME_HEADER.size:
+        raise ValueError("Frame is too short.")
+    seq, track = FRAME_HEADER.unpack_from(data)
+    return seq, track, data[FRAME_HEADER.size:]
+
+
+class TrackState:
+    def __init__(self):
+        self.ema: Optional[float] = None
+        self.alarm = False
+        self.last_received = -1
+        self.last_scored = -1
+
+
+class GuardSession:
+    """
+    Temporal state of one live guardian connection, per face track.
+    Fake probabilities are smoothed with an EMA; the alarm turns on above `alarm_on` and
+    only turns off again below `alarm_off`, so a score hovering around one threshold doesn't flap.
+    A verdict is produced only when a track's state changes (first score, alarm on, alarm off).
+    """
+
+    def __init__(self, alpha: float, alarm_on: float, alarm_off: float):
+        self.alpha = alpha
+        self.alarm_on = alarm_on
+        self.alarm_off = alarm_off
+        self.tracks: Dict[int, TrackState] = {}
+        self.dropped = 0
+
+    def accept(self, track: int, seq: int) -> bool:
+        """False for duplicate or out-of-order frames, which are not worth scoring."""
+        state = self.tracks.setdefault(track, TrackState())
+        if seq <= state.last_received:
+            return False
+        state.last_received = seq
+        return True
+
+    def update(self, track: int, seq: int, fake_probability: float) -> Optional[Dict[str, Any]]:
+        state = self.tracks.setdefault(track, TrackState())
+        if seq <= state.last_scored:
+            return None
+        state.last_scored = seq
+        first = state.ema is None
+        state.ema = fake_probability if first else self.alpha * fake_probability + (1 - self.alpha) * state.ema
+        alarm = state.ema >= self.alarm_on if not state.alarm else state.ema > self.alarm_off
+        if not first and alarm == state.alarm:
+            return None
+        state.alarm = alarm
+        return {
+            "type": "verdict",
+            "track": track,
+            "seq": seq,
+            "state": "alarm" if alarm else "clear",
+            "score": round(state.ema, 4),
+        }
+
+
+class InferenceBatcher:
+    """
+    Collects frames from all sessions and scores them together. A batch is run when
+    `max_batch` frames are waiting or `max_wait_ms` passed since the first one arrived;
+    `predict` (payloads -> probabilities, None for undecodable frames) runs in a worker thread.
+    """
+
+    def __init__(self, predict: Callable[[Sequence[bytes]], List[Optional[float]]],
+                 max_batch: int = 16, max_wait_ms: float = 20):
+        self.predict = predict
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def submit(self, payload: bytes) -> Optional[float]:
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((payload, future))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        # Sessions that disconnected meanwhile cancelled their futures
+        return [(payload, future) for payload, future in batch if not future.done()]
+
+    async def _run(self):
+        while True:
+            batch = await self._collect()
+            if not batch:
+                continue
+            try:
+                scores = await asyncio.to_thread(self.predict, [payload for payload, _ in batch])
+            except Exception as e:
+                print(f"Live Guard Inference Error: {e}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (_, future), score in zip(batch, scores):
+                if not future.done():
+                    future.set_result(score)
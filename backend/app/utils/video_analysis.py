@@ -0,0 +1,181 @@
+import cv2
+from typing import Callable, Dict, Iterator, List, Optional
+
+FALLBACK_FPS = 25.0
+SEEK_GAP = 90           # Frames; larger gaps seek to the keyframe instead of grab()-ing through
+DETECT_WIDTH = 640      # Frames are downscaled to this width for face detection
+FACE_MIN_SIZE = 20
+FACE_PADDING = 0.3      # Context margin around the face box, relative to its size
+
+
+def probe_video(path: str):
+    """(fps, frame_count, duration_seconds). Unusable fps values fall back to FALLBACK_FPS."""
+    cap = cv2.VideoCapture(path)
+    try:
+        if not cap.isOpened():
+            raise ValueError("Could not open video.")
+        fps = cap.get(cv2.CAP_PROP_FPS)
+        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    finally:
+        cap.release()
+    if not fps or fps != fps or fps <= 0 or fps > 1000:
+        fps = FALLBACK_FPS
+    duration = frame_count / fps if frame_count > 0 else None
+    return fps, frame_count, duration
+
+
+def sample_frames(path: str, fps: float, sample_fps: float) -> Iterator[tuple]:
+    """
+    Yields (timestamp, frame) about `sample_fps` times per second of video.
+    Only sampled frames are retrieved; skipped frames are grab()-ed or seeked over.
+    """
+    step = max(1, round(fps / sample_fps))
+    cap = cv2.VideoCapture(path)
+    try:
+        pos = 0
+        target = 0
+        while True:
+            gap = target - pos
+            if gap > SEEK_GAP:
+                cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+            else:
+                for _ in range(gap):
+                    if not cap.grab():
+                        return
+            ok, frame = cap.read()
+            if not ok:
+                return
+            pos = target + 1
+            yield target / fps, frame
+            target += step
+    finally:
+        cap.release()
+
+
+def largest_face(cascade, frame) -> Optional[object]:
+    """RGB crop of the largest (padded) face in a BGR frame, or None."""
+    h, w = frame.shape[:2]
+    scale = min(1.0, DETECT_WIDTH / w)
+    small = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA) if scale < 1 else frame
+    faces = cascade.detectMultiScale(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), 1.1, 4,
+                                     minSize=(FACE_MIN_SIZE, FACE_MIN_SIZE))
+    if len(faces) == 0:
+        return None
+    x, y, fw, fh = [v / scale for v in max(faces, key=lambda f: f[2] * f[3])]
+    left, top = max(0, int(x - fw * FACE_PADDING)), max(0, int(y - fh * FACE_PADDING))
+    right, bottom = min(w, int(x + fw * (1 + FACE_PADDING))), min(h, int(y + fh * (1 + FACE_PADDING)))
+    return cv2.cvtColor(frame[top:bottom, left:right], cv2.COLOR_BGR2RGB)
+
+
+class TemporalAggregator:
+    """
+    Groups per-frame fake probabilities into fixed-length time segments.
+    Each segment score is smoothed with an exponential moving average over previous segments,
+    so a single misclassified frame doesn't flip the verdict while a sustained manipulation does.
+    """
+
+    def __init__(self, segment_seconds: float, alpha: float, threshold: float):
+        self.segment_seconds = segment_seconds
+        self.alpha = alpha
+        self.threshold = threshold
+        self.ema = None
+        self.index = 0
+        self.frames = 0
+        self.scores: List[float] = []
+        self.segments: List[Dict] = []
+        self.timeline: List[Dict] = []
+
+    def _close(self) -> Dict:
+        start = self.index * self.segment_seconds
+        segment = {
+            "type": "segment",
+            "index": self.index,
+            "start": round(start, 2),
+            "end": round(start + self.segment_seconds, 2),
+            "frames": self.frames,
+            "faces": len(self.scores),
+            "mean_score": None,
+            "score": None,
+            "label": "no_face",
+        }
+        if self.scores:
+            mean = sum(self.scores) / len(self.scores)
+            self.ema = mean if self.ema is None else self.alpha * mean + (1 - self.alpha) * self.ema
+            segment.update(
+                mean_score=round(mean, 4),
+                score=round(self.ema, 4),
+                label="fake" if self.ema >= self.threshold else "real",
+            )
+        self.segments.append(segment)
+        self.index += 1
+        self.frames = 0
+        self.scores = []
+        return segment
+
+    def add(self, timestamp: float, fake_probability: Optional[float]) -> List[Dict]:
+        """Records one sampled frame (None = no face); returns the segments it closed."""
+        closed = []
+        while timestamp >= (self.index + 1) * self.segment_seconds:
+            closed.append(self._close())
+        self.frames += 1
+        if fake_probability is not None:
+            self.scores.append(fake_probability)
+            self.timeline.append({"time": round(timestamp, 2), "score": round(fake_probability, 4)})
+        return closed
+
+    def finish(self) -> List[Dict]:
+        closed = [self._close()] if self.frames else []
+        scored = [s for s in self.segments if s["score"] is not None]
+        fake = [s for s in scored if s["label"] == "fake"]
+        all_scores = [p["score"] for p in self.timeline]
+        closed.append({
+            "type": "summary",
+            "verdict": "fake" if fake else ("real" if scored else "no_face"),
+            "score": round(sum(all_scores) / len(all_scores), 4) if all_scores else None,
+            "max_segment_score": max((s["score"] for s in scored), default=None),
+            "segments": len(self.segments),
+            "fake_segments": len(fake),
+            "analyzed_frames": len(all_scores),
+            "timeline": self.timeline,
+        })
+        return closed
+
+
+def analyze_video(
+    path: str,
+    predict: Callable[[List[object]], List[float]],
+    cascade,
+    sample_fps: float = 1.0,
+    segment_seconds: float = 5.0,
+    batch_size: int = 16,
+    alpha: float = 0.5,
+    threshold: float = 0.5,
+) -> Iterator[Dict]:
+    """
+    Decodes sampled frames, crops faces and runs `predict` (crops -> fake probabilities) in batches.
+    Yields a "meta" event, then each "segment" as soon as it is complete, then a "summary".
+    """
+    fps, frame_count, duration = probe_video(path)
+    yield {"type": "meta", "fps": round(fps, 3), "frame_count": frame_count,
+           "duration": round(duration, 2) if duration else None,
+           "sample_fps": sample_fps, "segment_seconds": segment_seconds}
+
+    aggregator = TemporalAggregator(segment_seconds, alpha, threshold)
+    pending = []  # (timestamp, crop or None) waiting for the next batch
+
+    def flush():
+        crops = [crop for _, crop in pending if crop is not None]
+        scores = iter(predict(crops) if crops else [])
+        closed = []
+        for timestamp, crop in pending:
+            closed += aggregator.add(timestamp, float(next(scores)) if crop is not None else None)
+        pending.clear()
+        return closed
+
+    for timestamp, frame in sample_frames(path, fps, sample_fps):
+        pending.append((timestamp, largest_face(cascade, frame)))
+        # Face-less stretches still close their segments without waiting for a full batch
+        if sum(1 for _, crop in pending if crop is not None) >= batch_size or len(pending) >= 4 * batch_size:
+            yield from flush()
+    yield from flush()
+    yield from aggregator.finish()
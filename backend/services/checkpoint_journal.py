@@ -0,0 +1,188 @@
+import asyncio
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+PENDING = "pending"
+DONE = "done"
+# Deneme hakkı tükenmiş UID; devam noktasını tutmaz, kayıt olarak saklanır
+FAILED = "failed"
+
+
+def idempotency_key(account_id, folder, uidvalidity, uid):
+    return f"{account_id}/{folder}/{uidvalidity}/{uid}"
+
+
+def mail_id_for(key):
+    # Aynı mail yeniden işlense bile inbox kaydı aynı id'yi alır
+    return str(uuid.uuid5(uuid.NAMESPACE_URL, f"imap://{key}"))
+
+
+class CheckpointJournal:
+    """
+    Posta kutusu başına, UID bazında işleme durumunu tutan SQLite günlüğü.
+    Her durum değişikliği kendi transaction'ında commit edilir; süreç çökse bile
+    yeniden başlatmada ilk işlenmemiş UID'den devam edilir.
+
+    synchronous=FULL commit'leri fsync beklediği için event loop'tan metotlar doğrudan
+    değil, tek thread'li executor üzerinden `run` ile çağrılır.
+    """
+
+    def __init__(self, path):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="checkpoint-sqlite")
+        self.conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS mailboxes (
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uidvalidity INTEGER NOT NULL,
+                PRIMARY KEY (account, folder)
+            );
+            CREATE TABLE IF NOT EXISTS messages (
+                account TEXT NOT NULL,
+                folder TEXT NOT NULL,
+                uid INTEGER NOT NULL,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                mail_id TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (account, folder, uid)
+            );
+        """)
+
+    async def run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+    def open_mailbox(self, account_id, folder, uidvalidity):
+        """
+        SELECT sonrası çağrılır. Dönüş: "new" (ilk kez görülüyor), "same" ya da "reset".
+        UIDVALIDITY değiştiyse eski UID'ler anlamsızdır; posta kutusunun günlüğü sıfırlanır.
+        """
+        row = self.conn.execute(
+            "SELECT uidvalidity FROM mailboxes WHERE account = ? AND folder = ?", (account_id, folder)
+        ).fetchone()
+        if row is not None and row[0] == uidvalidity:
+            return "same"
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.execute("DELETE FROM messages WHERE account = ? AND folder = ?", (account_id, folder))
+            self.conn.execute(
+                "INSERT OR REPLACE INTO mailboxes (account, folder, uidvalidity) VALUES (?, ?, ?)",
+                (account_id, folder, uidvalidity),
+            )
+        return "new" if row is None else "reset"
+
+    def resume_uid(self, account_id, folder):
+        """İlk işlenmemiş UID; hepsi işlendiyse en yüksek UID + 1, geçmiş yoksa None."""
+        row = self.conn.execute(
+            "SELECT MIN(uid) FROM messages WHERE account = ? AND folder = ? AND state = ?",
+            (account_id, folder, PENDING),
+        ).fetchone()
+        if row[0] is not None:
+            return row[0]
+        row = self.conn.execute(
+            "SELECT MAX(uid) FROM messages WHERE account = ? AND folder = ?", (account_id, folder)
+        ).fetchone()
+        return row[0] + 1 if row[0] is not None else None
+
+    def set_watermark(self, account_id, folder, uid):
+        """Eski last_seen_uid dosyasından geçiş: verilen UID'ye kadar her şey işlenmiş sayılır."""
+        self.conn.execute(
+            "INSERT OR IGNORE INTO messages (account, folder, uid, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (account_id, folder, uid, DONE, time.time()),
+        )
+
+    def record_pending(self, account_id, folder, uids):
+        """UID'leri kuyruğa alınmış olarak işaretler ve her biri için deneme sayısını döner."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO messages (account, folder, uid, state, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(account_id, folder, uid, PENDING, now) for uid in uids],
+            )
+            self.conn.executemany(
+                "UPDATE messages SET attempts = attempts + 1, updated_at = ? "
+                "WHERE account = ? AND folder = ? AND uid = ? AND state = ?",
+                [(now, account_id, folder, uid, PENDING) for uid in uids],
+            )
+        placeholders = ",".join("?" * len(uids))
+        rows = self.conn.execute(
+            f"SELECT uid, attempts, state FROM messages WHERE account = ? AND folder = ? AND uid IN ({placeholders})",
+            (account_id, folder, *uids),
+        ).fetchall()
+        return {uid: (attempts, state) for uid, attempts, state in rows}
+
+    def forget_missing(self, account_id, folder, present_uids):
+        """
+        Sunucuda artık bulunmayan (expunge edilmiş) bekleyen UID'leri kapatır;
+        aksi halde devam noktası sonsuza kadar onlara takılı kalır.
+        """
+        if not present_uids:
+            return 0
+        rows = self.conn.execute(
+            "SELECT uid FROM messages WHERE account = ? AND folder = ? AND state = ? AND uid <= ?",
+            (account_id, folder, PENDING, max(present_uids)),
+        ).fetchall()
+        present = set(present_uids)
+        missing = [uid for (uid,) in rows if uid not in present]
+        self.conn.executemany(
+            "UPDATE messages SET state = ?, updated_at = ? WHERE account = ? AND folder = ? AND uid = ?",
+            [(DONE, time.time(), account_id, folder, uid) for uid in missing],
+        )
+        return len(missing)
+
+    def mark_done(self, account_id, folder, uid, mail_id):
+        self.conn.execute(
+            "UPDATE messages SET state = ?, mail_id = ?, updated_at = ? WHERE account = ? AND folder = ? AND uid = ?",
+            (DONE, mail_id, time.time(), account_id, folder, uid),
+        )
+
+    def retry_or_fail(self, account_id, folder, uid, max_attempts):
+        """
+        Saklama/analiz hatasından sonra çağrılır. Deneme hakkı kaldıysa sayacı artırıp True döner
+        (iş yeniden kuyruğa alınır); kalmadıysa UID'yi 'failed' olarak işaretler ve False döner.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            row = self.conn.execute(
+                "SELECT attempts FROM messages WHERE account = ? AND folder = ? AND uid = ? AND state = ?",
+                (account_id, folder, uid, PENDING),
+            ).fetchone()
+            if row is None:
+                return False
+            retry = row[0] < max_attempts
+            self.conn.execute(
+                "UPDATE messages SET state = ?, attempts = attempts + ?, updated_at = ? "
+                "WHERE account = ? AND folder = ? AND uid = ?",
+                (PENDING if retry else FAILED, int(retry), time.time(), account_id, folder, uid),
+            )
+        return retry
+
+    def is_done(self, account_id, folder, uid):
+        row = self.conn.execute(
+            "SELECT state FROM messages WHERE account = ? AND folder = ? AND uid = ?", (account_id, folder, uid)
+        ).fetchone()
+        return row is not None and row[0] == DONE
+
+    def compact(self, account_id, folder):
+        """İlk işlenmemiş UID'nin altındaki 'done' satırlarını siler; en yüksek satır işaret olarak kalır."""
+        resume = self.resume_uid(account_id, folder)
+        if resume is None:
+            return 0
+        cur = self.conn.execute(
+            "DELETE FROM messages WHERE account = ? AND folder = ? AND state = ? AND uid < ? "
+            "AND uid != (SELECT MAX(uid) FROM messages WHERE account = ? AND folder = ?)",
+            (account_id, folder, DONE, resume, account_id, folder),
+        )
+        return cur.rowcount
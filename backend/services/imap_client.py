@@ -0,0 +1,348 @@
+import asyncio
+import re
+import ssl
+
+LITERAL_RE = re.compile(rb"\{(\d+)\}\r\n$")
+UNTAGGED_STATUS_RE = re.compile(rb"^\* (\d+) (EXISTS|RECENT|EXPUNGE)\b", re.IGNORECASE)
+
+
+class IMAPError(Exception):
+    pass
+
+
+def quote(s):
+    return '"' + s.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _tokenize(chunks):
+    """Yanıt chunk'larını IMAP token'larına ayırır. Literal'ler tek token olarak döner."""
+    for i, chunk in enumerate(chunks):
+        if i % 2:
+            yield "literal", chunk
+            continue
+        pos, n = 0, len(chunk)
+        while pos < n:
+            c = chunk[pos:pos + 1]
+            if c == b" ":
+                pos += 1
+            elif c in (b"(", b")"):
+                yield c.decode(), None
+                pos += 1
+            elif c == b'"':
+                pos += 1
+                buf = bytearray()
+                while pos < n and chunk[pos:pos + 1] != b'"':
+                    if chunk[pos:pos + 1] == b"\\":
+                        pos += 1
+                    buf += chunk[pos:pos + 1]
+                    pos += 1
+                pos += 1
+                yield "string", bytes(buf)
+            else:
+                # Atom; BODY[HEADER.FIELDS (FROM)] gibi köşeli parantez içindeki boşluk/parantezler atoma dahildir
+                start, depth = pos, 0
+                while pos < n:
+                    c = chunk[pos:pos + 1]
+                    if c == b"[":
+                        depth += 1
+                    elif c == b"]":
+                        depth -= 1
+                    elif depth == 0 and c in (b" ", b"(", b")"):
+                        break
+                    pos += 1
+                atom = chunk[start:pos]
+                yield "atom", None if atom.upper() == b"NIL" else atom
+
+
+def parse_response(chunks):
+    """Bir yanıtı iç içe listelere çevirir: NIL -> None, diğer her şey bytes."""
+    root = []
+    stack = [root]
+    for kind, value in _tokenize(chunks):
+        if kind == "(":
+            child = []
+            stack[-1].append(child)
+            stack.append(child)
+        elif kind == ")":
+            if len(stack) > 1:
+                stack.pop()
+        else:
+            stack[-1].append(value)
+    return root
+
+
+def parse_fetch(response):
+    """'* 12 FETCH (UID 5 BODY[1] {..})' yanıtından {'UID': b'5', 'BODY[1]': b'...'} sözlüğü üretir."""
+    tokens = parse_response(response)
+    items = next((t for t in tokens if isinstance(t, list)), [])
+    result = {}
+    for i in range(0, len(items) - 1, 2):
+        key = items[i].decode(errors="replace").upper() if isinstance(items[i], bytes) else str(items[i])
+        result[key] = items[i + 1]
+    return result
+
+
+def _text(value):
+    return value.decode(errors="replace") if isinstance(value, bytes) else value
+
+
+def _param_dict(value):
+    if not isinstance(value, list):
+        return {}
+    return {_text(value[i]).lower(): _text(value[i + 1]) for i in range(0, len(value) - 1, 2)}
+
+
+def walk_bodystructure(structure, section=""):
+    """
+    BODYSTRUCTURE ağacını dolaşır ve her yaprak parça için bir sözlük üretir:
+    section (BODY.PEEK[...] için), type, subtype, params, encoding, size, filename.
+    message/rfc822 parçalarının içine inilmez.
+    """
+    if structure and isinstance(structure[0], list):
+        index = 0
+        for child in structure:
+            if not isinstance(child, list):
+                break
+            index += 1
+            yield from walk_bodystructure(child, f"{section}.{index}" if section else str(index))
+        return
+    maintype = (_text(structure[0]) or "").lower()
+    subtype = (_text(structure[1]) or "").lower()
+    params = _param_dict(structure[2])
+    # Disposition alanının yeri gövde tipine göre değişir (RFC 3501 7.4.2)
+    if maintype == "text":
+        disposition_index = 9
+    elif maintype == "message" and subtype == "rfc822":
+        disposition_index = 11
+    else:
+        disposition_index = 8
+    disposition = structure[disposition_index] if len(structure) > disposition_index else None
+    disposition_params = _param_dict(disposition[1]) if isinstance(disposition, list) and len(disposition) > 1 else {}
+    yield {
+        "section": section or "1",
+        "type": maintype,
+        "subtype": subtype,
+        "params": params,
+        "encoding": (_text(structure[5]) or "7bit").lower(),
+        "size": int(structure[6]) if structure[6] is not None else 0,
+        "filename": disposition_params.get("filename") or params.get("name"),
+    }
+
+
+def parse_envelope(envelope):
+    """ENVELOPE listesini başlık benzeri bir sözlüğe çevirir. Adresler (isim, adres) çiftleridir."""
+    def addresses(value):
+        result = []
+        for addr in value or []:
+            name, _, mailbox, host = (list(addr) + [None] * 4)[:4]
+            if mailbox is None or host is None:
+                continue
+            result.append((_text(name) or "", f"{_text(mailbox)}@{_text(host)}"))
+        return result
+
+    return {
+        "date": _text(envelope[0]),
+        "subject": _text(envelope[1]),
+        "from": addresses(envelope[2]),
+        "to": addresses(envelope[5]),
+        "message_id": _text(envelope[9]) if len(envelope) > 9 else None,
+    }
+
+
+class IMAPClient:
+    """
+    Minimal asyncio IMAP4rev1 client.
+    Tek bir kimliği doğrulanmış bağlantıyı açık tutar; imaplib gibi event loop'u bloklamaz.
+    Her yanıt, satır metni ve literal ({n}) bloklarından oluşan bir chunk listesi olarak döner.
+    """
+
+    def __init__(self, host, port=993, use_ssl=True, timeout=30.0):
+        self.host = host
+        self.port = port
+        self.use_ssl = use_ssl
+        self.timeout = timeout
+        self.capabilities = set()
+        self.exists = 0
+        self.reader = None
+        self.writer = None
+        self._tag_counter = 0
+
+    async def connect(self):
+        ssl_ctx = ssl.create_default_context() if self.use_ssl else None
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=ssl_ctx),
+            timeout=self.timeout,
+        )
+        greeting = await self._read_response()
+        if not greeting[0].startswith(b"* OK") and not greeting[0].startswith(b"* PREAUTH"):
+            raise IMAPError(f"Unexpected greeting: {greeting[0]!r}")
+        await self.capability()
+
+    async def close(self):
+        if self.writer is None:
+            return
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+        self.writer = None
+        self.reader = None
+
+    def has_capability(self, name):
+        return name.upper() in self.capabilities
+
+    def _next_tag(self):
+        self._tag_counter += 1
+        return f"A{self._tag_counter:04d}"
+
+    async def _read_line(self, timeout=None):
+        line = await asyncio.wait_for(self.reader.readline(), timeout=timeout or self.timeout)
+        if not line:
+            raise IMAPError("Connection closed by server")
+        return line
+
+    async def _read_response(self, timeout=None):
+        """Bir yanıtı literal'leri ile birlikte okur: [satır, literal, satır devamı, ...]"""
+        chunks = []
+        line = await self._read_line(timeout)
+        while True:
+            match = LITERAL_RE.search(line)
+            if not match:
+                chunks.append(line.rstrip(b"\r\n"))
+                self._track_status(chunks[0])
+                return chunks
+            chunks.append(line[:match.start()])
+            literal = await asyncio.wait_for(
+                self.reader.readexactly(int(match.group(1))), timeout=self.timeout
+            )
+            chunks.append(literal)
+            line = await self._read_line(timeout)
+
+    def _track_status(self, head):
+        match = UNTAGGED_STATUS_RE.match(head)
+        if match and match.group(2).upper() == b"EXISTS":
+            self.exists = int(match.group(1))
+
+    async def _send(self, command):
+        tag = self._next_tag()
+        self.writer.write(f"{tag} {command}\r\n".encode())
+        await self.writer.drain()
+        return tag
+
+    async def command(self, command):
+        """Komutu gönderir, tagged tamamlanma yanıtına kadar untagged yanıtları toplar."""
+        tag = await self._send(command)
+        untagged = []
+        tag_bytes = tag.encode()
+        while True:
+            response = await self._read_response()
+            head = response[0]
+            if head.startswith(tag_bytes + b" "):
+                status = head[len(tag_bytes) + 1:]
+                if not status.upper().startswith(b"OK"):
+                    raise IMAPError(f"{command.split(' ')[0]} failed: {status.decode(errors='replace')}")
+                return status, untagged
+            untagged.append(response)
+
+    async def capability(self):
+        _, untagged = await self.command("CAPABILITY")
+        for response in untagged:
+            if response[0].upper().startswith(b"* CAPABILITY "):
+                self.capabilities = set(response[0][13:].decode().upper().split())
+        return self.capabilities
+
+    async def login(self, user, password):
+        await self.command(f"LOGIN {quote(user)} {quote(password)}")
+        # Sunucular login sonrası yetenek listesini değiştirebilir (ör. IDLE)
+        await self.capability()
+
+    async def select(self, mailbox="INBOX"):
+        _, untagged = await self.command(f"SELECT {quote(mailbox)}")
+        info = {}
+        for response in untagged:
+            head = response[0]
+            match = UNTAGGED_STATUS_RE.match(head)
+            if match:
+                info[match.group(2).decode().upper()] = int(match.group(1))
+                continue
+            match = re.search(rb"\[(UIDVALIDITY|UIDNEXT) (\d+)\]", head)
+            if match:
+                info[match.group(1).decode()] = int(match.group(2))
+        return info
+
+    async def uid_search(self, criteria):
+        _, untagged = await self.command(f"UID SEARCH {criteria}")
+        uids = []
+        for response in untagged:
+            if response[0].upper().startswith(b"* SEARCH"):
+                uids.extend(int(x) for x in response[0][8:].split())
+        return sorted(uids)
+
+    async def pipeline(self, commands):
+        """
+        Komutların hepsini yanıt beklemeden gönderir, ardından tagged yanıtları toplar.
+        Her komut için (ok, status, untagged) döner; bir komutun NO yanıtı diğerlerini etkilemez.
+        """
+        tags = []
+        for command in commands:
+            tag = self._next_tag()
+            self.writer.write(f"{tag} {command}\r\n".encode())
+            tags.append(tag.encode())
+        await self.writer.drain()
+        results = {}
+        untagged = []
+        while len(results) < len(tags):
+            response = await self._read_response()
+            head = response[0]
+            tag = next((t for t in tags if head.startswith(t + b" ")), None)
+            if tag is None:
+                untagged.append(response)
+                continue
+            status = head[len(tag) + 1:]
+            results[tag] = (status.upper().startswith(b"OK"), status, untagged)
+            untagged = []
+        return [results[tag] for tag in tags]
+
+    async def uid_fetch(self, uid_set, items):
+        _, untagged = await self.command(f"UID FETCH {uid_set} {items}")
+        return [r for r in untagged if re.match(rb"^\* \d+ FETCH", r[0], re.IGNORECASE)]
+
+    async def noop(self):
+        await self.command("NOOP")
+
+    async def idle(self, timeout):
+        """
+        IDLE ile sunucudan push bildirimi bekler.
+        Yeni mail/expunge bildirimi gelirse True, zaman aşımında False döner.
+        """
+        tag = await self._send("IDLE")
+        response = await self._read_response()
+        if not response[0].startswith(b"+"):
+            raise IMAPError(f"IDLE rejected: {response[0].decode(errors='replace')}")
+        changed = False
+        try:
+            while True:
+                response = await self._read_response(timeout=timeout)
+                if UNTAGGED_STATUS_RE.match(response[0]):
+                    changed = True
+                    break
+        except asyncio.TimeoutError:
+            pass
+        self.writer.write(b"DONE\r\n")
+        await self.writer.drain()
+        tag_bytes = tag.encode()
+        while True:
+            response = await self._read_response()
+            if response[0].startswith(tag_bytes + b" "):
+                return changed
+            if UNTAGGED_STATUS_RE.match(response[0]):
+                changed = True
+
+    async def logout(self):
+        try:
+            await self.command("LOGOUT")
+        except IMAPError:
+            pass
+        finally:
+            await self.close()
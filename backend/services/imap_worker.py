@@ -1,9 +1,13 @@
 from dotenv import load_dotenv
 load_dotenv()
 import asyncio
+import base64
 import email
-import imaplib
 import os
+import quopri
+import random
+import re
+import sys
 import uuid
 import json
 import aiohttp
@@ -24,7 +28,40 @@ JSONL_PATH = os.getenv("INBOX_CACHE", "backend/app/inbox_cache.jsonl")
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 TMP_DIR = os.path.join(PROJECT_ROOT, os.getenv("TMP_DIR", "tmp/"))
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+# Eski last_seen_uid dosyaları; bir posta kutusu günlükte ilk kez görüldüğünde bir kez okunur
 LAST_UID_PATH = "app/last_seen_uid.txt"
+UID_STATE_DIR = os.getenv("UID_STATE_DIR", "app/uid_state")
+CHECKPOINT_DB = os.getenv("CHECKPOINT_DB", "app/ingest_checkpoints.sqlite3")
+IMAP_FOLDER = os.getenv("IMAP_FOLDER", "INBOX")
+IMAP_SSL = os.getenv("IMAP_SSL", "1") not in ("0", "false", "False")
+# RFC 2177: IDLE en geç 29 dakikada bir yenilenmeli
+IMAP_IDLE_TIMEOUT = float(os.getenv("IMAP_IDLE_TIMEOUT", 29 * 60))
+# Sunucu IDLE desteklemiyorsa NOOP ile yoklama aralığı
+IMAP_POLL_INTERVAL = float(os.getenv("IMAP_POLL_INTERVAL", 60))
+IMAP_RECONNECT_MIN = float(os.getenv("IMAP_RECONNECT_MIN", 1))
+IMAP_RECONNECT_MAX = float(os.getenv("IMAP_RECONNECT_MAX", 300))
+MAX_NEW_PER_SYNC = 50
+# Tüm posta kutusu poller'larının paylaştığı analiz kuyruğu
+ANALYSIS_QUEUE_SIZE = int(os.getenv("ANALYSIS_QUEUE_SIZE", 100))
+ANALYSIS_CONCURRENCY = int(os.getenv("ANALYSIS_CONCURRENCY", 4))
+# Saklama/analiz hatasında bir UID en fazla bu kadar denenir, sonra günlükte 'failed' olur
+STORE_MAX_ATTEMPTS = int(os.getenv("STORE_MAX_ATTEMPTS", 3))
+STORE_RETRY_DELAY = float(os.getenv("STORE_RETRY_DELAY", 5))
+MAX_ATTACHMENT_BYTES = 2 * 1024 * 1024
+MAX_ATTACHMENTS = 5
+IMAGE_TYPES = ("image/jpeg", "image/png")
+# Yanıtı beklenmeden art arda gönderilen UID FETCH komutu sayısı
+IMAP_PIPELINE_DEPTH = int(os.getenv("IMAP_PIPELINE_DEPTH", 16))
+# Inbox sıkıştırma ve depolama temizliği worker süreci içinde çalışır
+INBOX_MAINTENANCE = os.getenv("INBOX_MAINTENANCE", "1") not in ("0", "false", "False")
+INBOX_COMPACT_INTERVAL = float(os.getenv("INBOX_COMPACT_INTERVAL", 60 * 60))
+
+sys.path.append(PROJECT_ROOT)
+from services.imap_client import IMAPClient, parse_fetch, parse_envelope, walk_bodystructure
+from services.checkpoint_journal import CheckpointJournal, PENDING, idempotency_key, mail_id_for
+from services.mime_stream import AttachmentStore, parse_message_stream
+from services.inbox_cache_cleaner import append_line, compact_inbox
+from services.storage_janitor import JANITOR_INTERVAL, StorageJanitor
 
 os.makedirs(TMP_DIR, exist_ok=True)
 
@@ -57,38 +94,80 @@ def sanitize_html(html):
     # Basit temizlik, daha güvenli için bleach/dompurify önerilir
     return html.replace('<script', '&lt;script')
 
-def parse_email(msg):
-    html = None
-    text = None
-    attachments = []
-    skipped_attachments = []
-    for part in msg.walk():
-        ctype = part.get_content_type()
-        fname = part.get_filename()
-        if fname:
-            fname = decode_mime_words(fname)
-        if ctype in ["image/jpeg", "image/png"] and fname:
-            payload = part.get_payload(decode=True)
-            if payload:
-                if len(payload) > 2 * 1024 * 1024:
-                    skipped_attachments.append(fname)
-                    continue
-                path = os.path.join(TMP_DIR, f"att_{uuid.uuid4().hex}_{fname}")
-                with open(path, "wb") as f:
-                    f.write(payload)
-                basename = os.path.basename(path)
-                full_path = os.path.join(TMP_DIR, basename)
-                if full_path not in attachments:
-                    attachments.append(full_path)
-        elif ctype == "text/html" and not html:
-            html = part.get_payload(decode=True)
-            if html:
-                html = html.decode(errors="ignore")
-        elif ctype == "text/plain" and not text:
-            text = part.get_payload(decode=True)
-            if text:
-                text = text.decode(errors="ignore")
-    return html, text, attachments, skipped_attachments
+def attachment_store():
+    return AttachmentStore(TMP_DIR)
+
+def parse_email(raw):
+    """
+    Ham maili akış halinde ayrıştırır: görseller parça parça diske çözülür, tüm gövde
+    hiçbir zaman çözülmüş haliyle bellekte tutulmaz. (msg, html, text, attachments, skipped) döner.
+    """
+    msg, html, text, attachments, skipped = parse_message_stream(
+        raw, attachment_store(), MAX_ATTACHMENT_BYTES, MAX_ATTACHMENTS
+    )
+    return msg, html, text, attachments, [decode_mime_words(name) for name in skipped]
+
+def estimated_decoded_size(part):
+    # BODYSTRUCTURE boyutu transfer-encoded halidir; base64 satırı 76 karakter + CRLF, 57 bayt taşır
+    if part["encoding"] == "base64":
+        return part["size"] * 57 // 78
+    return part["size"]
+
+def plan_message(structure):
+    """
+    BODYSTRUCTURE'a bakarak hangi parçaların indirileceğine karar verir.
+    Boyut ve adet sınırını aşan görseller hiç indirilmeden atlanır.
+    """
+    plan = {"html": None, "text": None, "images": [], "skipped": []}
+    for part in walk_bodystructure(structure):
+        ctype = f"{part['type']}/{part['subtype']}"
+        fname = decode_mime_words(part["filename"]) if part["filename"] else None
+        if ctype in IMAGE_TYPES and fname:
+            if estimated_decoded_size(part) > MAX_ATTACHMENT_BYTES or len(plan["images"]) >= MAX_ATTACHMENTS:
+                plan["skipped"].append(fname)
+            else:
+                plan["images"].append((part, fname))
+        elif ctype == "text/html" and plan["html"] is None:
+            plan["html"] = part
+        elif ctype == "text/plain" and plan["text"] is None:
+            plan["text"] = part
+    return plan
+
+def plan_sections(plan):
+    parts = [plan["html"], plan["text"]] + [part for part, _ in plan["images"]]
+    return [part["section"] for part in parts if part is not None]
+
+def decode_transfer(data, encoding):
+    if encoding == "base64":
+        return base64.b64decode(data)
+    if encoding == "quoted-printable":
+        return quopri.decodestring(data)
+    return data
+
+def decode_text_part(part, bodies):
+    if part is None or bodies.get(part["section"]) is None:
+        return None
+    payload = decode_transfer(bodies[part["section"]], part["encoding"])
+    charset = part["params"].get("charset") or "utf-8"
+    try:
+        return payload.decode(charset, errors="ignore")
+    except LookupError:
+        return payload.decode(errors="ignore")
+
+def format_addresses(addresses):
+    return ", ".join(
+        f"{decode_mime_words(name)} <{addr}>" if name else addr
+        for name, addr in addresses
+    )
+
+def envelope_headers(envelope):
+    envelope = parse_envelope(envelope)
+    return {
+        "from": format_addresses(envelope["from"]),
+        "to": [format_addresses(envelope["to"])],
+        "subject": decode_mime_words(envelope["subject"]),
+        "date": envelope["date"],
+    }
 
 def decode_mime_words(s):
     if not s:
@@ -108,100 +187,410 @@ def decode_mime_words(s):
             result.append(part)
     return ''.join(result)
 
-def load_last_seen_uid():
+def uid_state_path(account_id, folder):
+    safe_folder = re.sub(r"[^\w.-]", "_", folder)
+    return os.path.join(UID_STATE_DIR, account_id, f"{safe_folder}.uid")
+
+def load_last_seen_uid(account_id="default", folder="INBOX"):
+    paths = [uid_state_path(account_id, folder)]
+    if account_id == "default" and folder == "INBOX":
+        paths.append(LAST_UID_PATH)
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                return int(f.read().strip())
+        except Exception:
+            continue
+    return None
+
+async def fetch_new_uids(client, resume_uid):
+    """resume_uid ve sonrasındaki UID'leri sunucu tarafında arar; tüm posta kutusunu taramaz."""
+    if resume_uid is None:
+        # İlk çalıştırma: sadece son MAX_NEW_PER_SYNC mesajın sıra numaraları
+        exists = client.exists
+        if exists == 0:
+            return []
+        first = max(1, exists - MAX_NEW_PER_SYNC + 1)
+        return await client.uid_search(f"{first}:{exists}")
+    # "n:*" her zaman en yüksek UID'yi döndürür, n'den küçük olsa bile
+    uids = await client.uid_search(f"UID {resume_uid}:*")
+    return [uid for uid in uids if uid >= resume_uid]
+
+# Aynı anda analiz edilen içerik adresli ekler; aynı görsel için ikinci istek atılmaz
+_inflight_analyses = {}
+
+def analysis_result_path(att):
+    return f"{att}.result.json"
+
+def load_analysis_result(att):
     try:
-        with open(LAST_UID_PATH, "r") as f:
-            return int(f.read().strip())
-    except Exception:
+        with open(analysis_result_path(att), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
         return None
 
-def save_last_seen_uid(uid):
-    os.makedirs(os.path.dirname(LAST_UID_PATH), exist_ok=True)
-    with open(LAST_UID_PATH, "w") as f:
-        f.write(str(uid))
+def save_analysis_result(att, result):
+    tmp_path = f"{analysis_result_path(att)}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(result, f)
+    os.replace(tmp_path, analysis_result_path(att))
+
+async def analyze_attachment_once(session, att):
+    """Ekler hash ile adreslendiği için sonuç dosya yanında saklanır; aynı görsel bir kez analiz edilir."""
+    cached = load_analysis_result(att)
+    if cached is not None:
+        print(f"[IMAP WORKER] Cached analysis for {att}")
+        return cached
+    pending = _inflight_analyses.get(att)
+    if pending is None:
+        pending = asyncio.ensure_future(analyze_image(session, att))
+        _inflight_analyses[att] = pending
+        pending.add_done_callback(lambda _: _inflight_analyses.pop(att, None))
+    res = await asyncio.shield(pending)
+    if res.get("result") != "error":
+        save_analysis_result(att, res)
+    return res
+
+async def analyze_attachments(session, attachments):
+    results = []
+    for att in attachments:
+        if not os.path.exists(att):
+            print(f"[IMAP WORKER] File does not exist: {att}")
+        print(f"[IMAP WORKER] Analyzing attachment: {att}")
+        try:
+            res = await analyze_attachment_once(session, att)
+        except Exception as e:
+            print(f"[IMAP WORKER] Analyze error for {att}: {e}")
+            res = {"result": "error", "score": 0.0}
+        results.append(res)
+    return results
+
+def mail_in_inbox(mail_id):
+    try:
+        with open(JSONL_PATH, "r", encoding="utf-8") as f:
+            return any(mail_id in line and json.loads(line).get("id") == mail_id for line in f)
+    except FileNotFoundError:
+        return False
+
+async def store_mail(job, session, redis_conn, journal):
+    uid = job["uid"]
+    account_id, folder = job["account"], job["folder"]
+    if await journal.run(journal.is_done, account_id, folder, uid):
+        return None
+    # Önceki bir denemede inbox'a yazılmış ama günlüğe işlenememiş olabilir
+    if job["recovered"] and mail_in_inbox(job["mail_id"]):
+        print(f"[IMAP WORKER] {job['key']} already in inbox, skipping duplicate")
+        await journal.run(journal.mark_done, account_id, folder, uid, job["mail_id"])
+        return None
+    attachments = job["attachments"]
+    skipped_attachments = job["skipped_attachments"]
+    print(f"[IMAP WORKER] {account_id}/{folder} UID: {uid} | Attachments: {attachments} | Skipped: {skipped_attachments}")
+    results = await analyze_attachments(session, attachments)
+    print(f"[IMAP WORKER] ANALYZE RESULTS for UID {uid}: {results}")
+    phishing = any(r.get("result") == "fake" and r.get("score", 0) >= 0.8 for r in results)
+    score = max([r.get("score", 0) for r in results], default=0)
+    headers = job["headers"]
+    obj = {
+        "id": job["mail_id"],
+        "uid": uid,
+        "account": account_id,
+        "folder": folder,
+        "from": headers["from"],
+        "to": headers["to"],
+        "subject": headers["subject"],
+        "date": headers["date"],
+        "html": sanitize_html(job["html"] or ""),
+        "text": job["text"] or "",
+        "phishing": phishing,
+        "score": score,
+        "attachments": attachments,
+        "skipped_attachments": skipped_attachments,
+        "deleted": False
+    }
+    # Sadece ekleme yapılır; eski ve silinmiş kayıtları maintenance_loop içindeki sıkıştırıcı atar
+    append_line(JSONL_PATH, json.dumps(obj, ensure_ascii=False) + "\n")
+    await redis_conn.publish("mail:new", json.dumps(obj))
+    await journal.run(journal.mark_done, account_id, folder, uid, obj["id"])
+    return obj
+
+def job_from_raw(mailbox, uid, raw):
+    """Tam RFC822 gövdesinden analiz işi; BODYSTRUCTURE çözülemediğinde kullanılır."""
+    msg, html, text, attachments, skipped_attachments = parse_email(raw)
+    headers = {
+        "from": decode_mime_words(msg.get("From")),
+        "to": [decode_mime_words(msg.get("To"))],
+        "subject": decode_mime_words(msg.get("Subject")),
+        "date": msg.get("Date"),
+    }
+    return make_job(mailbox, uid, headers, html, text, attachments, skipped_attachments)
+
+def job_from_parts(mailbox, uid, plan, bodies):
+    """BODYSTRUCTURE planına göre seçilerek indirilmiş parçalardan analiz işi."""
+    store = attachment_store()
+    attachments = []
+    skipped_attachments = list(plan["skipped"])
+    for part, fname in plan["images"]:
+        payload = bodies.get(part["section"])
+        if not payload:
+            continue
+        if part["encoding"] == "base64":
+            path = store.save_base64(fname, payload, MAX_ATTACHMENT_BYTES)
+        else:
+            path = store.save_bytes(fname, decode_transfer(payload, part["encoding"]), MAX_ATTACHMENT_BYTES)
+        if path is None:
+            skipped_attachments.append(fname)
+        elif path not in attachments:
+            attachments.append(path)
+    html = decode_text_part(plan["html"], bodies)
+    text = decode_text_part(plan["text"], bodies)
+    return make_job(mailbox, uid, plan["headers"], html, text, attachments, skipped_attachments)
+
+def make_job(mailbox, uid, headers, html, text, attachments, skipped_attachments):
+    account_id, folder, uidvalidity = mailbox
+    key = idempotency_key(account_id, folder, uidvalidity, uid)
+    return {
+        "account": account_id,
+        "folder": folder,
+        "uid": uid,
+        "key": key,
+        "mail_id": mail_id_for(key),
+        "recovered": False,
+        "headers": headers,
+        "html": html,
+        "text": text,
+        "attachments": attachments,
+        "skipped_attachments": skipped_attachments,
+    }
+
+async def fetch_summaries(client, uids):
+    """Tüm batch için tek round trip: UID FETCH a,b,c (BODYSTRUCTURE ENVELOPE)."""
+    responses = await client.uid_fetch(",".join(map(str, uids)), "(UID BODYSTRUCTURE ENVELOPE)")
+    summaries = {}
+    for response in responses:
+        items = parse_fetch(response)
+        if "UID" in items:
+            summaries[int(items["UID"])] = items
+    return summaries
+
+async def fetch_sections(client, sections_by_uid):
+    """
+    Her mesaj için sadece seçilen parçaları BODY.PEEK[part] ile çeker.
+    Komutlar IMAP_PIPELINE_DEPTH'lik pencerelerle pipeline edilir.
+    """
+    bodies = {uid: {} for uid in sections_by_uid}
+    commands = [
+        f"UID FETCH {uid} (UID {' '.join(f'BODY.PEEK[{s}]' for s in sections)})"
+        for uid, sections in sections_by_uid.items() if sections
+    ]
+    for i in range(0, len(commands), IMAP_PIPELINE_DEPTH):
+        for ok, status, untagged in await client.pipeline(commands[i:i + IMAP_PIPELINE_DEPTH]):
+            if not ok:
+                print(f"[IMAP WORKER] Partial fetch failed: {status!r}")
+            for response in untagged:
+                items = parse_fetch(response)
+                if "UID" not in items:
+                    continue
+                uid = int(items["UID"])
+                for key, value in items.items():
+                    if key.startswith("BODY[") and uid in bodies:
+                        bodies[uid][key[5:key.index("]")]] = value
+    return bodies
+
+async def sync_mailbox(client, mailbox, queue, journal, high_water):
+    """
+    Yeni mailleri en eskiden başlayarak MAX_NEW_PER_SYNC'lik batch'ler halinde indirir
+    ve paylaşılan analiz kuyruğuna ekler. Bu süreçte kuyruğa alınan en yüksek UID'yi döner.
+    """
+    account_id, folder, _ = mailbox
+    while True:
+        if high_water is not None:
+            resume = high_water + 1
+        else:
+            resume = await journal.run(journal.resume_uid, account_id, folder)
+        uids = await fetch_new_uids(client, resume)
+        if high_water is None and resume is not None:
+            await journal.run(journal.forget_missing, account_id, folder, uids)
+        if not uids:
+            return high_water
+        batch = uids[:MAX_NEW_PER_SYNC]
+        high_water = max(batch)
+        states = await journal.run(journal.record_pending, account_id, folder, batch)
+        batch = [uid for uid in batch if states[uid][1] == PENDING]
+        print(f"[IMAP WORKER] {account_id}/{folder} UIDs to process:", batch)
+        if batch:
+            await enqueue_batch(client, mailbox, queue, batch, states)
+
+async def enqueue_batch(client, mailbox, queue, uids, states):
+    summaries = await fetch_summaries(client, uids)
+    plans = {}
+    for uid in uids:
+        try:
+            plans[uid] = plan_message(summaries[uid]["BODYSTRUCTURE"])
+            plans[uid]["headers"] = envelope_headers(summaries[uid]["ENVELOPE"])
+        except (KeyError, IndexError, TypeError, ValueError) as e:
+            print(f"[IMAP WORKER] UID {uid} BODYSTRUCTURE unusable ({e!r}), falling back to RFC822")
+    bodies = await fetch_sections(client, {uid: plan_sections(plan) for uid, plan in plans.items()})
+    for uid in uids:
+        if uid in plans:
+            job = job_from_parts(mailbox, uid, plans[uid], bodies[uid])
+        else:
+            responses = await client.uid_fetch(str(uid), "(RFC822)")
+            raw = next((chunk for r in responses for chunk in r[1:2]), None)
+            if raw is None:
+                print(f"[IMAP WORKER] UID {uid} fetch returned no body")
+                continue
+            job = job_from_raw(mailbox, uid, raw)
+        job["recovered"] = states[uid][0] > 1
+        await queue.put(job)
+
+async def wait_for_new_mail(client):
+    if client.has_capability("IDLE"):
+        await client.idle(IMAP_IDLE_TIMEOUT)
+    else:
+        await asyncio.sleep(IMAP_POLL_INTERVAL)
+        await client.noop()
+
+async def poll_mailbox(account, folder, queue, journal):
+    """
+    Tek bir hesap/klasör için kalıcı bağlantı: yeni mailleri kuyruğa ekler, IDLE ile bekler.
+    Hata durumunda üstel geri çekilme ile yeniden bağlanır.
+    """
+    account_id = account["id"]
+    # Bu süreçte kuyruğa alınan en yüksek UID; yeniden bağlanınca aynı mailler tekrar kuyruğa girmez
+    high_water = None
+    backoff = IMAP_RECONNECT_MIN
+    while True:
+        client = IMAPClient(account["host"], account.get("port", 993), use_ssl=account.get("ssl", True))
+        try:
+            await client.connect()
+            await client.login(account["user"], account["password"])
+            mailbox_info = await client.select(folder)
+            print(f"[IMAP WORKER] {account_id} select:", folder, "mailbox_info:", mailbox_info)
+            uidvalidity = mailbox_info.get("UIDVALIDITY", 0)
+            status = await journal.run(journal.open_mailbox, account_id, folder, uidvalidity)
+            if status == "new":
+                legacy_uid = load_last_seen_uid(account_id, folder)
+                if legacy_uid is not None:
+                    await journal.run(journal.set_watermark, account_id, folder, legacy_uid)
+            elif status == "reset":
+                print(f"[IMAP WORKER] {account_id}/{folder} UIDVALIDITY changed, journal reset")
+                high_water = None
+            backoff = IMAP_RECONNECT_MIN
+            mailbox = (account_id, folder, uidvalidity)
+            while True:
+                high_water = await sync_mailbox(client, mailbox, queue, journal, high_water)
+                await journal.run(journal.compact, account_id, folder)
+                await wait_for_new_mail(client)
+        except asyncio.CancelledError:
+            await client.close()
+            raise
+        except Exception as e:
+            print(f"IMAP worker error ({account_id}/{folder}):", repr(e))
+            traceback.print_exc()
+        await client.close()
+        delay = backoff * (1 + random.random() * 0.1)
+        print(f"[IMAP WORKER] {account_id}/{folder} reconnecting in {delay:.1f}s")
+        await asyncio.sleep(delay)
+        backoff = min(backoff * 2, IMAP_RECONNECT_MAX)
+
+async def analysis_worker(queue, redis_conn, journal):
+    # HTTP oturumu tüm mailler boyunca açık kalır
+    async with aiohttp.ClientSession() as session:
+        while True:
+            job = await queue.get()
+            try:
+                await store_mail(job, session, redis_conn, journal)
+            except Exception as e:
+                print(f"[IMAP WORKER] Store error for {job['key']}:", repr(e))
+                traceback.print_exc()
+                await handle_store_failure(queue, journal, job)
+            finally:
+                queue.task_done()
+
+async def handle_store_failure(queue, journal, job):
+    """
+    Hata alan işi deneme hakkı varsa gecikmeli olarak yeniden kuyruğa alır,
+    yoksa günlükte 'failed' olarak işaretler; UID 'pending'de takılı kalmaz.
+    """
+    try:
+        retry = await journal.run(journal.retry_or_fail, job["account"], job["folder"], job["uid"], STORE_MAX_ATTEMPTS)
+    except Exception as e:
+        print(f"[IMAP WORKER] Journal error for {job['key']}:", repr(e))
+        return
+    if not retry:
+        print(f"[IMAP WORKER] {job['key']} failed {STORE_MAX_ATTEMPTS} times, marked as failed")
+        return
+    # Önceki deneme inbox'a yazıp günlüğe işleyememiş olabilir
+    job["recovered"] = True
+    asyncio.create_task(requeue_later(queue, job, STORE_RETRY_DELAY))
+
+async def requeue_later(queue, job, delay):
+    # Worker'lar dolu kuyruğa put beklerken kilitlenmesin diye ayrı task'ta beklenir
+    await asyncio.sleep(delay)
+    await queue.put(job)
+
+async def maintenance_loop():
+    """
+    Inbox JSONL'ını periyodik olarak sıkıştırır ve ek/yükleme dizinlerinde kota uygular.
+    Dosya işleri thread'de yapılır; event loop'u bloklamaz.
+    """
+    janitor = StorageJanitor(tmp_dir=TMP_DIR, inbox_path=JSONL_PATH)
+    loop = asyncio.get_running_loop()
+    next_compact = loop.time()
+    while True:
+        if loop.time() >= next_compact:
+            next_compact = loop.time() + INBOX_COMPACT_INTERVAL
+            try:
+                await asyncio.to_thread(compact_inbox, JSONL_PATH)
+            except Exception as e:
+                print(f"[IMAP WORKER] Inbox compaction error: {e}")
+        try:
+            await asyncio.to_thread(janitor.run_once)
+        except Exception as e:
+            print(f"[IMAP WORKER] Storage janitor error: {e}")
+        await asyncio.sleep(min(JANITOR_INTERVAL, INBOX_COMPACT_INTERVAL))
+
+async def run_ingestion(accounts, redis_conn, journal=None, maintenance=False):
+    """
+    Her hesap/klasör için bir poller ve paylaşılan kuyruğu tüketen analiz worker'ları çalıştırır.
+    maintenance=True ise inbox sıkıştırma ve depolama temizliği de bu süreçte planlanır;
+    birden çok shard aynı dosyaları paylaşıyorsa sadece biri açmalıdır.
+    """
+    journal = journal or CheckpointJournal(CHECKPOINT_DB)
+    queue = asyncio.Queue(maxsize=ANALYSIS_QUEUE_SIZE)
+    tasks = [
+        asyncio.create_task(poll_mailbox(account, folder, queue, journal))
+        for account in accounts
+        for folder in account.get("folders") or ["INBOX"]
+    ]
+    tasks += [asyncio.create_task(analysis_worker(queue, redis_conn, journal)) for _ in range(ANALYSIS_CONCURRENCY)]
+    if maintenance:
+        tasks.append(asyncio.create_task(maintenance_loop()))
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+def env_account():
+    """IMAP_* ortam değişkenlerinden tek hesaplı yapılandırma (geriye dönük uyumluluk)."""
+    return {
+        "id": "default",
+        "host": IMAP_HOST,
+        "port": IMAP_PORT,
+        "user": IMAP_USER,
+        "password": IMAP_PASS,
+        "ssl": IMAP_SSL,
+        "folders": [IMAP_FOLDER],
+    }
 
 async def imap_worker():
     print("IMAP_HOST:", IMAP_HOST)
     print("IMAP_PORT:", IMAP_PORT)
     print("IMAP_USER:", IMAP_USER)
     redis_conn = await aioredis.from_url(REDIS_URL)
-    last_seen_uid = load_last_seen_uid()
-    while True:
-        try:
-            mail = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT)
-            mail.login(IMAP_USER, IMAP_PASS)
-            # Klasör seç (INBOX veya All Mail)
-            # mail.select('"[Gmail]/All Mail"')  # Gmail için tüm mailler
-            typ, mailbox_info = mail.select("INBOX")
-            print("IMAP select typ:", typ, "mailbox_info:", mailbox_info)
-            typ, data = mail.uid('search', None, "ALL")
-            uids = [int(x) for x in data[0].split()]
-            uids.sort()
-            print("last_seen_uid (from file):", last_seen_uid)
-            # Sadece en yeni 50 maili işle
-            new_uids = [uid for uid in uids if last_seen_uid is None or uid > last_seen_uid]
-            new_uids = new_uids[-50:]
-            print("New UIDs to process (limited to 50):", new_uids)
-            if new_uids:
-                last_seen_uid = max(new_uids)
-                save_last_seen_uid(last_seen_uid)
-            for uid in new_uids:
-                typ, msg_data = mail.uid('fetch', str(uid), '(RFC822)')
-                raw = msg_data[0][1]
-                msg = email.message_from_bytes(raw)
-                html, text, attachments, skipped_attachments = parse_email(msg)
-                print(f"[IMAP WORKER] UID: {uid} | Attachments: {attachments} | Skipped: {skipped_attachments}")
-                if len(attachments) > 5:
-                    skipped_attachments += attachments[5:]
-                    attachments = attachments[:5]
-                results = []
-                async with aiohttp.ClientSession() as session:
-                    for att in attachments:
-                        if not os.path.exists(att):
-                            print(f"[IMAP WORKER] File does not exist: {att}")
-                        print(f"[IMAP WORKER] Analyzing attachment: {att}")
-                        try:
-                            res = await analyze_image(session, att)
-                        except Exception as e:
-                            print(f"[IMAP WORKER] Analyze error for {att}: {e}")
-                            res = {"result": "error", "score": 0.0}
-                        results.append(res)
-                print(f"[IMAP WORKER] ANALYZE RESULTS for UID {uid}: {results}")
-                phishing = any(r.get("result") == "fake" and r.get("score", 0) >= 0.8 for r in results)
-                score = max([r.get("score", 0) for r in results], default=0)
-                obj = {
-                    "id": str(uuid.uuid4()),
-                    "uid": uid,
-                    "from": decode_mime_words(msg.get("From")),
-                    "to": [decode_mime_words(msg.get("To"))],
-                    "subject": decode_mime_words(msg.get("Subject")),
-                    "date": msg.get("Date"),
-                    "html": sanitize_html(html or ""),
-                    "text": text or "",
-                    "phishing": phishing,
-                    "score": score,
-                    "attachments": attachments,
-                    "skipped_attachments": skipped_attachments,
-                    "deleted": False
-                }
-                # Yeni maili eklemeden önce, dosyadaki satır sayısını kontrol et
-                try:
-                    with open(JSONL_PATH, "r", encoding="utf-8") as f:
-                        lines = f.readlines()
-                except FileNotFoundError:
-                    lines = []
-                lines.append(json.dumps(obj, ensure_ascii=False) + "\n")
-                # Sadece son 20 maili tut
-                if len(lines) > 20:
-                    lines = lines[-20:]
-                with open(JSONL_PATH, "w", encoding="utf-8") as f:
-                    f.writelines(lines)
-                await redis_conn.publish("mail:new", json.dumps(obj))
-            mail.logout()
-        except Exception as e:
-            print("IMAP worker error:", repr(e))
-            traceback.print_exc()
-        await asyncio.sleep(60)
+    await run_ingestion([env_account()], redis_conn, maintenance=INBOX_MAINTENANCE)
 
 if __name__ == "__main__":
-    asyncio.run(imap_worker()) 
\ No newline at end of file
+    asyncio.run(imap_worker())
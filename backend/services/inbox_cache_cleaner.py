@@ -1,41 +1,151 @@
 import os
 import json
-from datetime import datetime, timedelta
+import argparse
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows: süreçler arası kilit yok, tek süreçli kullanım varsayılır
+    fcntl = None
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 JSONL_PATH = os.getenv("INBOX_CACHE", os.path.join(PROJECT_ROOT, "app/inbox_cache.jsonl"))
 DAYS_KEEP = int(os.getenv("DAYS_KEEP", 30))
 
-cutoff = datetime.utcnow() - timedelta(days=DAYS_KEEP)
-kept = []
-removed = 0
 
-if os.path.exists(JSONL_PATH):
-    with open(JSONL_PATH, "r", encoding="utf-8") as f:
-        for line in f:
+@contextmanager
+def inbox_lock(path):
+    """
+    Inbox dosyasına ekleme ile yeniden yazmanın çakışmaması için süreçler arası kilit.
+    Yazanlar kilidi sadece kısa süre tutar; uzun tarama kilitsiz yapılır.
+    results.json ve kampanya gönderim logu da aynı `<path>.lock` kilidini kullanır.
+    """
+    if fcntl is None:
+        yield
+        return
+    with open(f"{path}.lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def append_line(path, line):
+    """Tek bir JSONL satırını kilit altında ekler; dosyanın tamamı yeniden yazılmaz."""
+    with inbox_lock(path):
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def rewrite_jsonl(path, transform):
+    """
+    JSONL dosyasını satır satır akıtarak yeniden yazar; bellek kullanımı satır boyutuyla sınırlıdır.
+    transform(obj): None -> satırı at, True -> olduğu gibi bırak, dict -> yerine yaz.
+    Tarama sırasında eklenen satırlar son adımda kilit altında kopyalanır, sonra temp dosya rename edilir.
+    Dönüş: {"kept", "dropped", "bytes_before", "bytes_after", "bytes_reclaimed"}
+    """
+    stats = {"kept": 0, "dropped": 0, "bytes_before": 0, "bytes_after": 0, "bytes_reclaimed": 0}
+    if not os.path.exists(path):
+        return stats
+    tmp_path = f"{path}.compact.tmp"
+
+    def pump(src, dst, carry):
+        for line in src:
+            if not line.endswith(b"\n"):
+                # Yazılmakta olan son satır; kilit altında tamamlanmış halini okuyacağız
+                carry += line
+                break
+            if carry:
+                line, carry = carry + line, b""
+            stats["bytes_before"] += len(line)
             try:
-                obj = json.loads(line)
-                date_str = obj.get("date")
-                if date_str:
-                    try:
-                        dt = datetime.strptime(date_str[:19], "%a, %d %b %Y %H:%M:%S")
-                    except Exception:
-                        try:
-                            dt = datetime.fromisoformat(date_str)
-                        except Exception:
-                            dt = None
-                    obj["_parsed_date"] = dt
-                else:
-                    obj["_parsed_date"] = None
-                kept.append(obj)
-            except Exception:
-                kept.append(obj)
-    # En güncel 20 maili bırak
-    kept = sorted(kept, key=lambda x: x.get("_parsed_date") or datetime.min, reverse=True)[:20]
-    with open(JSONL_PATH, "w", encoding="utf-8") as f:
-        for obj in kept:
-            obj.pop("_parsed_date", None)
-            f.write(json.dumps(obj, ensure_ascii=False) + "\n")
-    print(f"[inbox_cache_cleaner] Kept {len(kept)} newest mails.")
-else:
-    print(f"[inbox_cache_cleaner] No file found: {JSONL_PATH}") 
\ No newline at end of file
+                result = transform(json.loads(line))
+            except (ValueError, AttributeError) as e:
+                print(f"[inbox_cache_cleaner] Dropping unparsable line ({e}): {line[:200]!r}")
+                result = None
+            if result is None:
+                stats["dropped"] += 1
+                continue
+            if result is not True:
+                line = (json.dumps(result, ensure_ascii=False) + "\n").encode("utf-8")
+            stats["kept"] += 1
+            stats["bytes_after"] += len(line)
+            dst.write(line)
+        return carry
+
+    with open(path, "rb") as src, open(tmp_path, "wb") as dst:
+        carry = pump(src, dst, b"")
+        with inbox_lock(path):
+            # Okuma EOF'tan devam eder: sadece tarama sırasında eklenen satırlar kalır
+            carry = pump(src, dst, carry)
+            if carry:
+                stats["bytes_before"] += len(carry)
+                dst.write(carry)
+            dst.flush()
+            os.fsync(dst.fileno())
+            os.replace(tmp_path, path)
+    stats["bytes_reclaimed"] = stats["bytes_before"] - stats["bytes_after"]
+    return stats
+
+
+def parse_mail_date(date_str):
+    """RFC 2822 (IMAP) ya da ISO tarihini UTC'ye çevirir; çözülemezse None."""
+    if not date_str:
+        return None
+    try:
+        dt = parsedate_to_datetime(date_str)
+    except (TypeError, ValueError, IndexError):
+        dt = None
+    if dt is None:
+        try:
+            dt = datetime.fromisoformat(date_str)
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt
+
+
+def compact_inbox(path=None, days_keep=None, now=None):
+    """
+    Silinmiş (deleted=True) ve DAYS_KEEP günden eski mailleri tek geçişte atar.
+    Tarihi olmayan ya da çözülemeyen mailler tutulur.
+    """
+    path = path or JSONL_PATH
+    days_keep = DAYS_KEEP if days_keep is None else days_keep
+    cutoff = (now or datetime.now(timezone.utc)) - timedelta(days=days_keep)
+
+    def keep(mail):
+        if mail.get("deleted", False):
+            return None
+        dt = parse_mail_date(mail.get("date"))
+        if dt is not None and dt < cutoff:
+            return None
+        return True
+
+    stats = rewrite_jsonl(path, keep)
+    print(
+        f"[inbox_cache_cleaner] Kept {stats['kept']} mails, dropped {stats['dropped']}, "
+        f"reclaimed {stats['bytes_reclaimed']} bytes."
+    )
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inbox cache JSONL sıkıştırıcı")
+    parser.add_argument("--path", default=JSONL_PATH)
+    parser.add_argument("--days", type=int, default=DAYS_KEEP)
+    args = parser.parse_args()
+    if not os.path.exists(args.path):
+        print(f"[inbox_cache_cleaner] No file found: {args.path}")
+        return
+    compact_inbox(args.path, args.days)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+import asyncio
+import bisect
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import redis.asyncio as aioredis
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ACCOUNTS_FILE = os.getenv("IMAP_ACCOUNTS_FILE", os.path.join(PROJECT_ROOT, "app/imap_accounts.json"))
+SHARD_INDEX = int(os.getenv("INGEST_SHARD_INDEX", 0))
+SHARD_COUNT = int(os.getenv("INGEST_SHARD_COUNT", 1))
+# Her shard'ın halka üzerindeki sanal düğüm sayısı; dağılımı dengeler
+RING_REPLICAS = 64
+
+sys.path.append(PROJECT_ROOT)
+from services import imap_worker
+
+def _hash(key):
+    # Python'un hash()'i süreçler arası rastgeledir; shard ataması tüm süreçlerde aynı olmalı
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest()[:16], 16)
+
+class HashRing:
+    """
+    Tutarlı hashing halkası.
+    Shard sayısı değiştiğinde hesapların sadece küçük bir kısmı başka shard'a taşınır.
+    """
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self._ring = sorted((_hash(f"{node}#{i}"), node) for node in nodes for i in range(replicas))
+        self._keys = [h for h, _ in self._ring]
+
+    def node_for(self, key):
+        idx = bisect.bisect(self._keys, _hash(key)) % len(self._keys)
+        return self._ring[idx][1]
+
+def load_accounts(path=None):
+    """
+    Hesap yapılandırmasını JSON dosyasından okur:
+    {"accounts": [{"id": "destek", "host": "...", "port": 993, "user": "...",
+                   "password_env": "DESTEK_IMAP_PASS", "ssl": true, "folders": ["INBOX", "Spam"]}]}
+    Dosya yoksa IMAP_* ortam değişkenlerindeki tek hesaba düşer.
+    """
+    path = path or ACCOUNTS_FILE
+    if not os.path.exists(path):
+        return [imap_worker.env_account()]
+    with open(path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    accounts = []
+    for account in config.get("accounts", []):
+        account = dict(account)
+        if "password" not in account:
+            account["password"] = os.getenv(account.get("password_env", ""), "")
+        account.setdefault("port", 993)
+        account.setdefault("ssl", True)
+        account.setdefault("folders", ["INBOX"])
+        accounts.append(account)
+    ids = [a["id"] for a in accounts]
+    if len(ids) != len(set(ids)):
+        raise ValueError(f"Duplicate account id in {path}")
+    return accounts
+
+def shard_accounts(accounts, shard_index, shard_count):
+    if shard_count <= 1:
+        return list(accounts)
+    ring = HashRing(range(shard_count))
+    return [a for a in accounts if ring.node_for(a["id"]) == shard_index]
+
+async def run_shard(accounts, shard_index=0, shard_count=1):
+    mine = shard_accounts(accounts, shard_index, shard_count)
+    print(f"[INGEST] shard {shard_index}/{shard_count}: {[a['id'] for a in mine]}")
+    if not mine and shard_index != 0:
+        return
+    redis_conn = await aioredis.from_url(imap_worker.REDIS_URL)
+    # Paylaşılan inbox dosyası ve dizinlerin bakımı tek bir shard'da yapılır
+    await imap_worker.run_ingestion(mine, redis_conn, maintenance=imap_worker.INBOX_MAINTENANCE and shard_index == 0)
+
+def _shard_process(config_path, shard_index, shard_count):
+    asyncio.run(run_shard(load_accounts(config_path), shard_index, shard_count))
+
+def main():
+    parser = argparse.ArgumentParser(description="Çok hesaplı IMAP ingestion supervisor")
+    parser.add_argument("--config", default=ACCOUNTS_FILE)
+    parser.add_argument("--shard-index", type=int, default=SHARD_INDEX)
+    parser.add_argument("--shard-count", type=int, default=SHARD_COUNT)
+    parser.add_argument("--processes", type=int, default=1,
+                        help="Bu makinede başlatılacak shard süreci sayısı (shard-count'u ezer)")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        _shard_process(args.config, args.shard_index, args.shard_count)
+        return
+    procs = [
+        multiprocessing.Process(target=_shard_process, args=(args.config, i, args.processes), daemon=True)
+        for i in range(args.processes)
+    ]
+    for p in procs:
+        p.start()
+    try:
+        for p in procs:
+            p.join()
+    except KeyboardInterrupt:
+        for p in procs:
+            p.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,355 @@
+import base64
+import binascii
+import hashlib
+import os
+import re
+import tempfile
+from email.message import Message
+from email.parser import BytesHeaderParser
+from email.policy import Compat32
+
+IMAGE_TYPES = ("image/jpeg", "image/png")
+FEED_CHUNK = 64 * 1024
+# Satır sonu gelmeden bu kadar birikirse gövde parçası olarak işlenir (sınır satırı bu kadar uzun olamaz)
+MAX_LINE_BUFFER = 8 * 1024
+_B64_JUNK = re.compile(rb"[^A-Za-z0-9+/=]")
+
+
+class AttachmentStore:
+    """
+    İçerik adresli ek deposu: her ek SHA-256 özetine göre att_<hash><ext> olarak saklanır.
+    Farklı maillerdeki aynı görsel tek dosyada tutulur.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def writer(self, fname, max_bytes):
+        return SpoolWriter(self, fname, max_bytes)
+
+    def path_for(self, digest, fname):
+        ext = os.path.splitext(fname or "")[1].lower()
+        if not re.fullmatch(r"\.[a-z0-9]{1,5}", ext):
+            ext = ""
+        return os.path.join(self.directory, f"att_{digest[:32]}{ext}")
+
+    def save_bytes(self, fname, payload, max_bytes):
+        writer = self.writer(fname, max_bytes)
+        writer.write(payload)
+        return writer.close()
+
+    def save_base64(self, fname, data, max_bytes):
+        """Base64 veriyi parça parça çözerek yazar; çözülmüş kopya bellekte tutulmaz."""
+        writer = self.writer(fname, max_bytes)
+        decoder = Base64StreamDecoder(writer)
+        for i in range(0, len(data), FEED_CHUNK):
+            decoder.feed(data[i:i + FEED_CHUNK])
+            if writer.oversized:
+                break
+        decoder.flush()
+        return writer.close()
+
+
+class SpoolWriter:
+    """Çözülmüş ek baytlarını geçici dosyaya yazar ve hash'ler; sınır aşılırsa yazmayı bırakır."""
+
+    def __init__(self, store, fname, max_bytes):
+        self.store = store
+        self.fname = fname
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.oversized = False
+        self.sha256 = hashlib.sha256()
+        fd, self.tmp_path = tempfile.mkstemp(prefix=".spool_", dir=store.directory)
+        self.file = os.fdopen(fd, "wb")
+
+    def write(self, data):
+        if self.oversized or not data:
+            return
+        self.size += len(data)
+        if self.size > self.max_bytes:
+            self.oversized = True
+            self._discard()
+            return
+        self.sha256.update(data)
+        self.file.write(data)
+
+    def _discard(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.unlink(self.tmp_path)
+
+    def close(self):
+        """Kalıcı yol döner; sınır aşıldıysa ya da içerik boşsa None."""
+        if self.oversized or self.file is None:
+            return None
+        self.file.close()
+        self.file = None
+        if self.size == 0:
+            os.unlink(self.tmp_path)
+            return None
+        path = self.store.path_for(self.sha256.hexdigest(), self.fname)
+        if os.path.exists(path):
+            # Aynı içerik zaten var: kopyayı at, mevcut dosyayı kullan
+            os.unlink(self.tmp_path)
+            os.utime(path)
+        else:
+            os.replace(self.tmp_path, path)
+        return path
+
+
+class Base64StreamDecoder:
+    """Base64 metnini 4 karakterlik bloklar halinde çözer; yarım blok bir sonraki parçaya kalır."""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.pending = b""
+
+    def feed(self, data):
+        if isinstance(data, str):
+            data = data.encode("ascii", "ignore")
+        data = self.pending + _B64_JUNK.sub(b"", data)
+        usable = len(data) - len(data) % 4
+        self.pending = data[usable:]
+        if usable:
+            try:
+                self.writer.write(base64.b64decode(data[:usable]))
+            except binascii.Error:
+                pass
+
+    def flush(self):
+        if self.pending:
+            padded = self.pending + b"=" * (-len(self.pending) % 4)
+            try:
+                self.writer.write(base64.b64decode(padded))
+            except binascii.Error:
+                pass
+            self.pending = b""
+
+
+class SpoolingPolicy(Compat32):
+    """
+    Akış halinde ayrıştırma politikası: hangi parçaların diske aktarılacağını ve sınırları taşır.
+    Görsel eklerin gövdeleri mesaj ağacına hiç yazılmaz.
+    """
+    store = None
+    max_attachment_bytes = 2 * 1024 * 1024
+    max_attachments = 5
+    message_factory = None
+
+
+class SpoolingMessage(Message):
+    def __init__(self, policy=None):
+        super().__init__(policy=policy)
+        self.body_mode = None  # None (henüz karar verilmedi), "keep", "spool", "drop"
+        self.spool_writer = None
+        self.decoder = None
+        self.spooled_path = None
+        self.skipped = False
+
+
+SpoolingPolicy.message_factory = SpoolingMessage
+
+
+def _strip_eol(data):
+    if data.endswith(b"\r\n"):
+        return data[:-2]
+    if data.endswith(b"\n"):
+        return data[:-1]
+    return data
+
+
+class StreamingMIMEParser:
+    """
+    Akış halinde MIME ayrıştırıcı; yalnızca email paketinin public API'sini kullanır.
+    Başlık blokları policy ile BytesHeaderParser'a verilir (mesajlar policy.message_factory'den gelir),
+    multipart sınırları satır satır burada izlenir. Böylece gövde satırları biriktirilmeden önce
+    yakalanır: ilk text/html ve text/plain parçaları bellekte tutulur, base64 görseller satır satır
+    çözülerek içerik adresli depoya yazılır, boyut sınırı buffer'lanmadan önce uygulanır.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.header_parser = BytesHeaderParser(policy=policy)
+        self.kept_types = set()
+        self.spooled = []
+        self.root = None
+        self.buffer = b""
+        self.at_line_start = True
+        self.state = "headers"  # headers | body | skip (preamble/epilogue)
+        self.header_lines = []
+        self.current = None  # gövdesi okunan yaprak parça
+        self.body_lines = []
+        self.containers = []  # açık multipart'lar: (mesaj, b"--" + boundary)
+
+    def feed(self, data):
+        self.buffer += data
+        while True:
+            end = self.buffer.find(b"\n")
+            if end < 0:
+                break
+            line, self.buffer = self.buffer[:end + 1], self.buffer[end + 1:]
+            self._line(line, self.at_line_start)
+            self.at_line_start = True
+        if len(self.buffer) > MAX_LINE_BUFFER and self.state != "headers":
+            # Satır sonu olmayan dev gövde satırı: sınır olamaz, parça parça işlenir
+            self._line(self.buffer, False)
+            self.buffer = b""
+            self.at_line_start = False
+
+    def close(self):
+        if self.buffer:
+            self._line(self.buffer, self.at_line_start)
+            self.buffer = b""
+        if self.state == "headers" and (self.header_lines or self.root is None):
+            self._start_part()
+        self._finish_part(in_multipart=bool(self.containers))
+        return self.root
+
+    def _line(self, line, at_line_start):
+        if at_line_start and self.containers and line.startswith(b"--"):
+            marker = line.rstrip(b" \t\r\n")
+            for depth in range(len(self.containers) - 1, -1, -1):
+                delimiter = self.containers[depth][1]
+                if marker == delimiter:
+                    self._finish_part(in_multipart=True)
+                    del self.containers[depth + 1:]
+                    self.state = "headers"
+                    return
+                if marker == delimiter + b"--":
+                    self._finish_part(in_multipart=True)
+                    del self.containers[depth:]
+                    self.state = "skip"
+                    return
+        if self.state == "headers":
+            if at_line_start and line in (b"\r\n", b"\n"):
+                self._start_part()
+            else:
+                self.header_lines.append(line)
+        elif self.state == "body":
+            self._body_line(line)
+
+    def _start_part(self):
+        msg = self.header_parser.parsebytes(b"".join(self.header_lines) + b"\n")
+        self.header_lines = []
+        msg.set_payload(None)  # headersonly ayrıştırma boş gövde bırakır; parçalar attach ile eklenecek
+        if self.containers:
+            self.containers[-1][0].attach(msg)
+        elif self.root is None:
+            self.root = msg
+        else:
+            self.state = "skip"
+            return
+        boundary = msg.get_boundary() if msg.get_content_maintype() == "multipart" else None
+        if boundary:
+            self.containers.append((msg, b"--" + boundary.encode("ascii", "surrogateescape")))
+            self.state = "skip"  # preamble
+            return
+        self.current = msg
+        self.body_lines = []
+        self._choose_mode(msg)
+        self.state = "body"
+
+    def _body_line(self, line):
+        msg = self.current
+        if msg.body_mode == "keep":
+            self.body_lines.append(line)
+        elif msg.body_mode == "spool" and not msg.spool_writer.oversized:
+            msg.decoder.feed(line)
+
+    def _finish_part(self, in_multipart):
+        msg, self.current = self.current, None
+        if msg is None:
+            return
+        if msg.body_mode == "keep":
+            body = b"".join(self.body_lines)
+            self.body_lines = []
+            if in_multipart:
+                # Sınırdan önceki satır sonu sınıra aittir
+                body = _strip_eol(body)
+            msg.set_payload(body.decode("ascii", "surrogateescape"))
+
+    def _kept_images(self):
+        # Sınırı aşıp atılan görseller adet sınırına sayılmaz
+        return sum(1 for m in self.spooled if m.spool_writer is None or not m.spool_writer.oversized)
+
+    def _choose_mode(self, msg):
+        ctype = msg.get_content_type()
+        fname = msg.get_filename()
+        encoding = (msg.get("Content-Transfer-Encoding") or "").strip().lower()
+        if ctype in IMAGE_TYPES and fname:
+            if self._kept_images() >= self.policy.max_attachments:
+                msg.body_mode = "drop"
+                msg.skipped = True
+            elif encoding == "base64":
+                msg.body_mode = "spool"
+                msg.spool_writer = self.policy.store.writer(fname, self.policy.max_attachment_bytes)
+                msg.decoder = Base64StreamDecoder(msg.spool_writer)
+                self.spooled.append(msg)
+            else:
+                # Nadir: base64 olmayan görsel; kapanışta get_payload(decode=True) ile yazılır
+                msg.body_mode = "keep"
+                self.spooled.append(msg)
+        elif ctype in ("text/html", "text/plain") and ctype not in self.kept_types:
+            msg.body_mode = "keep"
+            self.kept_types.add(ctype)
+        else:
+            msg.body_mode = "drop"
+        return msg.body_mode
+
+    def finalize_attachments(self):
+        for msg in self.spooled:
+            if msg.spool_writer is not None:
+                msg.decoder.flush()
+                msg.spooled_path = msg.spool_writer.close()
+            else:
+                payload = msg.get_payload(decode=True) or b""
+                msg.spooled_path = self.policy.store.save_bytes(
+                    msg.get_filename(), payload, self.policy.max_attachment_bytes
+                )
+            msg.skipped = msg.spooled_path is None
+
+
+def parse_message_stream(chunks, store, max_attachment_bytes, max_attachments):
+    """
+    Ham mail baytlarını (tek bytes ya da bytes parçaları) akış halinde ayrıştırır.
+    (msg, html, text, attachments, skipped_filenames) döner; attachments kalıcı dosya yollarıdır.
+    """
+    policy = SpoolingPolicy(
+        store=store,
+        max_attachment_bytes=max_attachment_bytes,
+        max_attachments=max_attachments,
+    )
+    parser = StreamingMIMEParser(policy)
+    if isinstance(chunks, (bytes, bytearray)):
+        raw = chunks
+        chunks = (raw[i:i + FEED_CHUNK] for i in range(0, len(raw), FEED_CHUNK))
+    for chunk in chunks:
+        parser.feed(bytes(chunk))
+    msg = parser.close()
+    parser.finalize_attachments()
+
+    html = text = None
+    attachments = []
+    skipped = []
+    for part in msg.walk():
+        if part.is_multipart():
+            continue
+        if part.body_mode == "keep" and part.get_content_type() in ("text/html", "text/plain"):
+            payload = part.get_payload(decode=True) or b""
+            charset = part.get_content_charset() or "utf-8"
+            try:
+                decoded = payload.decode(charset, errors="ignore")
+            except LookupError:
+                decoded = payload.decode(errors="ignore")
+            if part.get_content_type() == "text/html":
+                html = decoded
+            else:
+                text = decoded
+        elif part.spooled_path and part.spooled_path not in attachments:
+            attachments.append(part.spooled_path)
+        elif part.skipped:
+            skipped.append(part.get_filename())
+    return msg, html, text, attachments, skipped
@@ -0,0 +1,247 @@
+from dotenv import load_dotenv
+load_dotenv()
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import sys
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(PROJECT_ROOT)
+from app.core.config import settings
+from services.inbox_cache_cleaner import inbox_lock, rewrite_jsonl
+
+MB = 1024 * 1024
+DAY = 24 * 60 * 60
+TMP_MAX_BYTES = int(float(os.getenv("JANITOR_TMP_MAX_MB", 500)) * MB)
+TMP_MAX_AGE = float(os.getenv("JANITOR_TMP_MAX_AGE_DAYS", 7)) * DAY
+UPLOAD_MAX_BYTES = int(float(os.getenv("JANITOR_UPLOAD_MAX_MB", 2000)) * MB)
+UPLOAD_MAX_AGE = float(os.getenv("JANITOR_UPLOAD_MAX_AGE_DAYS", 30)) * DAY
+GRADCAM_MAX_BYTES = int(float(os.getenv("JANITOR_GRADCAM_MAX_MB", 1000)) * MB)
+GRADCAM_MAX_AGE = float(os.getenv("JANITOR_GRADCAM_MAX_AGE_DAYS", 30)) * DAY
+JANITOR_INTERVAL = float(os.getenv("JANITOR_INTERVAL", 60))
+# Her turda dizin başına en fazla bu kadar girdi stat'lanır; büyük dizinler birkaç turda taranır
+JANITOR_SCAN_BATCH = int(os.getenv("JANITOR_SCAN_BATCH", 1000))
+# imap_worker'ın ek analiz sonucunu tuttuğu yan dosya; ekle birlikte silinir
+RESULT_SIDECAR_SUFFIX = ".result.json"
+
+
+class DirectoryQuota:
+    """
+    Tek bir dizin için bayt ve yaş kotası.
+    Dosya indeksi os.scandir ile parça parça yenilenir; her turda tüm dizin taranmaz.
+    Son erişim zamanı atime ve mtime'ın büyüğüdür (noatime/relatime mount'larda mtime geçerli olur).
+    """
+
+    def __init__(self, name, path, max_bytes, max_age):
+        self.name = name
+        self.path = str(path)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.index = {}  # dosya adı -> (boyut, son erişim)
+        self.total_bytes = 0
+        self._scan = None
+        self._seen = set()
+
+    def _set(self, name, size, last_access):
+        old = self.index.get(name)
+        if old is not None:
+            self.total_bytes -= old[0]
+        self.index[name] = (size, last_access)
+        self.total_bytes += size
+
+    def _drop(self, name):
+        old = self.index.pop(name, None)
+        if old is not None:
+            self.total_bytes -= old[0]
+
+    def scan_step(self, limit=JANITOR_SCAN_BATCH):
+        """Taramayı kaldığı yerden en fazla `limit` girdi ilerletir. Tam tur tamamlanınca True döner."""
+        if limit <= 0:
+            return self._scan is None
+        if self._scan is None:
+            try:
+                self._scan = os.scandir(self.path)
+            except FileNotFoundError:
+                return True
+            self._seen = set()
+        for _ in range(limit):
+            entry = next(self._scan, None)
+            if entry is None:
+                self._scan.close()
+                self._scan = None
+                # Tur boyunca görülmeyen dosyalar dışarıdan silinmiştir
+                for name in set(self.index) - self._seen:
+                    self._drop(name)
+                return True
+            if entry.name.endswith(RESULT_SIDECAR_SUFFIX):
+                continue
+            try:
+                if not entry.is_file(follow_symlinks=False):
+                    continue
+                st = entry.stat(follow_symlinks=False)
+            except FileNotFoundError:
+                continue
+            self._seen.add(entry.name)
+            self._set(entry.name, st.st_size, max(st.st_atime, st.st_mtime))
+        return False
+
+    def _still_evictable(self, name, cutoff=None):
+        """Silmeden önce dosyayı yeniden stat'lar; indeks tazelenmişse kararı günceller."""
+        try:
+            st = os.stat(os.path.join(self.path, name))
+        except FileNotFoundError:
+            self._drop(name)
+            return False
+        last_access = max(st.st_atime, st.st_mtime)
+        self._set(name, st.st_size, last_access)
+        return cutoff is None or last_access < cutoff
+
+    def _remove(self, name):
+        try:
+            os.remove(os.path.join(self.path, name))
+        except FileNotFoundError:
+            pass
+        self._drop(name)
+
+    def enforce(self, now=None):
+        """Önce yaş kotasını, sonra en eski erişilenden başlayarak bayt kotasını uygular."""
+        now = now or time.time()
+        evicted = []
+        cutoff = now - self.max_age
+        for name, (_, last_access) in list(self.index.items()):
+            if last_access < cutoff and self._still_evictable(name, cutoff):
+                self._remove(name)
+                evicted.append(name)
+        if self.total_bytes > self.max_bytes:
+            # Yarım kalmış (nokta ile başlayan) geçici dosyalar yazılıyor olabilir; sadece yaşla silinir
+            heap = [(last_access, name) for name, (_, last_access) in self.index.items() if not name.startswith(".")]
+            heapq.heapify(heap)
+            while heap and self.total_bytes > self.max_bytes:
+                last_access, name = heapq.heappop(heap)
+                entry = self.index.get(name)
+                if entry is None or entry[1] != last_access:
+                    continue
+                if not self._still_evictable(name):
+                    continue
+                if self.index[name][1] != last_access:
+                    heapq.heappush(heap, (self.index[name][1], name))
+                    continue
+                self._remove(name)
+                evicted.append(name)
+        return evicted
+
+
+def _write_json_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+class StorageJanitor:
+    """
+    TMP_DIR (mail ekleri), UPLOAD_DIR ve GRADCAM_DIR için kota uygulayan temizlikçi.
+    Silinen dosyalara verilen referanslar results.json ve inbox cache'ten de temizlenir.
+    """
+
+    def __init__(self, tmp_dir=None, upload_dir=None, gradcam_dir=None, results_file=None, inbox_path=None):
+        self.tmp = DirectoryQuota("tmp", tmp_dir or settings.TMP_DIR, TMP_MAX_BYTES, TMP_MAX_AGE)
+        self.uploads = DirectoryQuota("uploads", upload_dir or settings.UPLOAD_DIR, UPLOAD_MAX_BYTES, UPLOAD_MAX_AGE)
+        self.gradcam = DirectoryQuota("gradcam", gradcam_dir or settings.GRADCAM_DIR, GRADCAM_MAX_BYTES, GRADCAM_MAX_AGE)
+        self.results_file = str(results_file or settings.RESULTS_FILE)
+        self.inbox_path = str(inbox_path or settings.INBOX_CACHE)
+
+    @property
+    def quotas(self):
+        return [self.tmp, self.uploads, self.gradcam]
+
+    def run_once(self, scan_batch=JANITOR_SCAN_BATCH, now=None):
+        for quota in self.quotas:
+            quota.scan_step(scan_batch)
+        evicted = {quota.name: quota.enforce(now) for quota in self.quotas}
+        self._drop_attachment_artifacts(evicted["tmp"])
+        self._drop_result_artifacts(evicted["uploads"])
+        self._reconcile_results(set(evicted["uploads"]), set(evicted["gradcam"]))
+        self._reconcile_inbox(set(evicted["tmp"]))
+        if any(evicted.values()):
+            print("[JANITOR] evicted: " + ", ".join(f"{k}={len(v)}" for k, v in evicted.items()))
+        return evicted
+
+    def _drop_attachment_artifacts(self, names):
+        for name in names:
+            try:
+                os.remove(os.path.join(self.tmp.path, name + RESULT_SIDECAR_SUFFIX))
+            except FileNotFoundError:
+                pass
+            self.gradcam._remove(f"gradcam_{name}.png")
+
+    def _drop_result_artifacts(self, image_ids):
+        for image_id in image_ids:
+            self.gradcam._remove(f"gradcam_{image_id}.png")
+
+    def _reconcile_results(self, image_ids, gradcams):
+        if not (image_ids or gradcams) or not os.path.exists(self.results_file):
+            return
+        # Backend'in save_result_to_json'u ile aynı kilit; arada kaydedilen analiz kaybolmaz
+        with inbox_lock(self.results_file):
+            try:
+                with open(self.results_file, "r", encoding="utf-8") as f:
+                    results = json.load(f)
+            except Exception:
+                return
+            kept = []
+            for r in results:
+                if r.get("image_id") in image_ids:
+                    continue
+                if r.get("gradcam") in gradcams:
+                    r["gradcam"] = None
+                kept.append(r)
+            _write_json_atomic(self.results_file, kept)
+
+    def _reconcile_inbox(self, names):
+        """Silinen eklerin yollarını inbox kayıtlarından çıkarır; dosya akış halinde yeniden yazılır."""
+        if not names:
+            return
+
+        def drop_expired(mail):
+            attachments = mail.get("attachments") or []
+            kept = [att for att in attachments if os.path.basename(att) not in names]
+            if len(kept) == len(attachments):
+                return True
+            mail["attachments"] = kept
+            mail["expired_attachments"] = len(attachments) - len(kept) + mail.get("expired_attachments", 0)
+            return mail
+
+        rewrite_jsonl(self.inbox_path, drop_expired)
+
+
+async def janitor_loop(janitor=None, interval=JANITOR_INTERVAL):
+    """Worker süreci içinde çalıştırılabilir; her tur dizin başına sınırlı iş yapar."""
+    janitor = janitor or StorageJanitor()
+    while True:
+        try:
+            janitor.run_once()
+        except Exception as e:
+            print(f"[JANITOR] error: {e}")
+        await asyncio.sleep(interval)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TMP/uploads/gradcam dizinleri için kota temizlikçisi")
+    parser.add_argument("--once", action="store_true", help="Tam bir tarama yapıp çık")
+    args = parser.parse_args()
+    janitor = StorageJanitor()
+    if args.once:
+        # Tüm dizinlerin taraması bitene kadar ilerle, sonra kotaları uygula
+        while not all([quota.scan_step() for quota in janitor.quotas]):
+            pass
+        janitor.run_once(scan_batch=0)
+        return
+    asyncio.run(janitor_loop(janitor))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import asyncio
+import email
+import re
+from email.utils import getaddresses
+import pytest_asyncio
+
+
+def _q(value):
+    if value is None:
+        return "NIL"
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def _encoded_body(part):
+    payload = part.get_payload()
+    return payload.encode("utf-8", errors="surrogateescape") if isinstance(payload, str) else payload
+
+
+def bodystructure(part):
+    if part.is_multipart():
+        children = "".join(bodystructure(child) for child in part.get_payload())
+        return f"({children} {_q(part.get_content_subtype().upper())})"
+    params = part.get_params()[1:] if part.get_params() else []
+    params_str = "(" + " ".join(f"{_q(k)} {_q(v)}" for k, v in params) + ")" if params else "NIL"
+    body = _encoded_body(part)
+    encoding = part.get("Content-Transfer-Encoding", "7BIT").upper()
+    fields = [_q(part.get_content_maintype().upper()), _q(part.get_content_subtype().upper()),
+              params_str, "NIL", "NIL", _q(encoding), str(len(body))]
+    if part.get_content_maintype() == "text":
+        fields.append(str(body.count(b"\n")))
+    filename = part.get_filename()
+    disposition = f"({_q('attachment')} ({_q('filename')} {_q(filename)}))" if filename else "NIL"
+    fields += ["NIL", disposition]
+    return "(" + " ".join(fields) + ")"
+
+
+def envelope(msg):
+    def addresses(header):
+        values = getaddresses(msg.get_all(header, []))
+        if not values:
+            return "NIL"
+        return "(" + "".join(
+            f"({_q(name or None)} NIL {_q(addr.split('@')[0])} {_q(addr.split('@')[-1])})" for name, addr in values
+        ) + ")"
+    return "(" + " ".join([
+        _q(msg.get("Date")), _q(msg.get("Subject")), addresses("From"), addresses("From"),
+        addresses("From"), addresses("To"), "NIL", "NIL", "NIL", _q(msg.get("Message-ID")),
+    ]) + ")"
+
+
+def section_body(msg, section):
+    part = msg
+    for index in section.split("."):
+        if part.is_multipart():
+            part = part.get_payload()[int(index) - 1]
+    return _encoded_body(part)
+
+
+class FakeIMAPServer:
+    """
+    Testler için yerel, TLS'siz IMAP sunucusu.
+    LOGIN, SELECT, UID SEARCH, UID FETCH, IDLE/DONE, NOOP ve LOGOUT komutlarının bir alt kümesini destekler.
+    """
+
+    def __init__(self, uidvalidity=1, idle=True):
+        self.messages = []  # [(uid, raw_bytes)]
+        self.uidvalidity = uidvalidity
+        self.next_uid = 1
+        self.idle_supported = idle
+        self.commands = []
+        self.logins = 0
+        self.fetched_bytes = 0
+        self.server = None
+        self.port = None
+        self._idlers = set()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        self.port = self.server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def add_message(self, raw):
+        uid = self.next_uid
+        self.next_uid += 1
+        self.messages.append((uid, raw))
+        for writer in list(self._idlers):
+            writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+        return uid
+
+    def _uids_in(self, uid_set):
+        max_uid = self.messages[-1][0] if self.messages else 0
+        selected = set()
+        for part in uid_set.split(","):
+            if ":" in part:
+                lo, hi = part.split(":")
+                lo = max_uid if lo == "*" else int(lo)
+                hi = max_uid if hi == "*" else int(hi)
+                lo, hi = min(lo, hi), max(lo, hi)
+                selected.update(uid for uid, _ in self.messages if lo <= uid <= hi)
+            else:
+                uid = max_uid if part == "*" else int(part)
+                selected.update(u for u, _ in self.messages if u == uid)
+        return sorted(selected)
+
+    def _seqs_to_uids(self, seq_set):
+        n = len(self.messages)
+        uids = set()
+        for part in seq_set.split(","):
+            lo, _, hi = part.partition(":")
+            lo = n if lo == "*" else int(lo)
+            hi = lo if not hi else (n if hi == "*" else int(hi))
+            for seq in range(min(lo, hi), max(lo, hi) + 1):
+                if 1 <= seq <= n:
+                    uids.add(self.messages[seq - 1][0])
+        return sorted(uids)
+
+    def fetch_items(self, uid, raw, items):
+        """FETCH yanıtındaki öğeleri (bytes parçaları) üretir; alt sınıflar genişletebilir."""
+        parts = [f"UID {uid}".encode()]
+        upper = items.upper()
+        msg = email.message_from_bytes(raw)
+        if "RFC822" in upper:
+            parts.append(f"RFC822 {{{len(raw)}}}\r\n".encode() + raw)
+        if "BODYSTRUCTURE" in upper:
+            parts.append(b"BODYSTRUCTURE " + bodystructure(msg).encode())
+        if "ENVELOPE" in upper:
+            parts.append(b"ENVELOPE " + envelope(msg).encode())
+        for section in re.findall(r"BODY\.PEEK\[([\d.]+)\]", items, re.IGNORECASE):
+            body = section_body(msg, section)
+            self.fetched_bytes += len(body)
+            parts.append(f"BODY[{section}] {{{len(body)}}}\r\n".encode() + body)
+        return parts
+
+    async def _handle(self, reader, writer):
+        writer.write(b"* OK Fake IMAP ready\r\n")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                tag, _, rest = line.decode().rstrip("\r\n").partition(" ")
+                cmd, _, args = rest.partition(" ")
+                cmd = cmd.upper()
+                self.commands.append(rest)
+                if cmd == "CAPABILITY":
+                    caps = "IMAP4rev1 IDLE" if self.idle_supported else "IMAP4rev1"
+                    writer.write(f"* CAPABILITY {caps}\r\n".encode())
+                elif cmd == "LOGIN":
+                    self.logins += 1
+                elif cmd == "SELECT":
+                    writer.write(f"* {len(self.messages)} EXISTS\r\n".encode())
+                    writer.write(f"* OK [UIDVALIDITY {self.uidvalidity}] UIDs valid\r\n".encode())
+                    writer.write(f"* OK [UIDNEXT {self.next_uid}] Predicted next UID\r\n".encode())
+                elif cmd == "UID":
+                    sub, _, sub_args = args.partition(" ")
+                    if sub.upper() == "SEARCH":
+                        match = re.match(r"UID (\S+)", sub_args, re.IGNORECASE)
+                        if match:
+                            uids = self._uids_in(match.group(1))
+                        elif sub_args.upper() == "ALL":
+                            uids = [uid for uid, _ in self.messages]
+                        else:
+                            uids = self._seqs_to_uids(sub_args)
+                        writer.write(("* SEARCH " + " ".join(map(str, uids))).rstrip().encode() + b"\r\n")
+                    elif sub.upper() == "FETCH":
+                        uid_set, _, items = sub_args.partition(" ")
+                        by_uid = dict(self.messages)
+                        for uid in self._uids_in(uid_set):
+                            seq = [u for u, _ in self.messages].index(uid) + 1
+                            body = b" ".join(self.fetch_items(uid, by_uid[uid], items))
+                            writer.write(f"* {seq} FETCH (".encode() + body + b")\r\n")
+                elif cmd == "IDLE":
+                    writer.write(b"+ idling\r\n")
+                    self._idlers.add(writer)
+                    await writer.drain()
+                    await reader.readline()  # DONE
+                    self._idlers.discard(writer)
+                elif cmd == "LOGOUT":
+                    writer.write(b"* BYE\r\n")
+                    writer.write(f"{tag} OK LOGOUT completed\r\n".encode())
+                    await writer.drain()
+                    break
+                writer.write(f"{tag} OK {cmd} completed\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._idlers.discard(writer)
+            writer.close()
+
+
+@pytest_asyncio.fixture
+async def fake_imap():
+    server = await FakeIMAPServer().start()
+    yield server
+    await server.stop()
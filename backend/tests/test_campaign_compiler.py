@@ -0,0 +1,33 @@
+import email
+from email import policy
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 8
+
+
+def test_compiled_campaign_matches_message_structure(tmp_path):
+    from backend.app.mailer.compiler import compile_campaign
+    image = tmp_path / "logo.png"
+    image.write_bytes(PNG_BYTES)
+    campaign = compile_campaign(
+        "Şifrenizi yenileyin",
+        '<p>Merhaba {{ first_name }} ({{ email }})</p><img src="cid:logo">',
+        str(image),
+        "guvenlik@example.com",
+    )
+
+    first = email.message_from_bytes(campaign.render("a@example.com"), policy=policy.default)
+    second = email.message_from_bytes(campaign.render("b@example.com"), policy=policy.default)
+
+    assert first["Subject"] == "Şifrenizi yenileyin"
+    assert first["To"] == "a@example.com" and second["To"] == "b@example.com"
+    assert first["Message-ID"] != second["Message-ID"]
+    assert [p.get_content_type() for p in first.walk()] == [
+        "multipart/mixed", "multipart/alternative", "text/plain",
+        "multipart/related", "text/html", "image/png", "image/png",
+    ]
+    assert first.get_body(("html",)).get_content() == "<p>Merhaba Kullanıcı (a@example.com)</p><img src=\"cid:logo\">"
+    inline, attachment = [p for p in first.walk() if p.get_content_type() == "image/png"]
+    assert inline["Content-ID"] == "<logo>"
+    assert inline.get_content() == PNG_BYTES
+    assert attachment.get_filename() == "logo.png"
+    assert attachment.get_content() == PNG_BYTES
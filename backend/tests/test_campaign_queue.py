@@ -0,0 +1,182 @@
+import asyncio
+import pytest
+
+from test_smtp_pool import smtp_sink, SinkHandler  # noqa: F401  (aiosmtpd fixture)
+
+
+@pytest.fixture
+def smtp_settings(tmp_path, smtp_sink, monkeypatch):
+    from backend.app.mailer.runner import settings
+    controller, handler = smtp_sink
+    monkeypatch.setattr(settings, "SMTP_HOST", controller.hostname)
+    monkeypatch.setattr(settings, "SMTP_PORT", controller.port)
+    monkeypatch.setattr(settings, "SMTP_USER", "kampanya@example.com")
+    monkeypatch.setattr(settings, "SMTP_PASS", "secret")
+    monkeypatch.setattr(settings, "SMTP_START_TLS", False)
+    monkeypatch.setattr(settings, "MAIL_LOGS_PATH", tmp_path / "mail_logs.txt")
+    image = tmp_path / "logo.png"
+    image.write_bytes(b"\x89PNG\r\n\x1a\n" + b"\x00" * 64)
+    return handler, str(image)
+
+
+@pytest.mark.asyncio
+async def test_campaign_resumes_from_last_recipient_after_crash(tmp_path, smtp_settings):
+    from backend.app.mailer.queue import SQLiteCampaignStore
+    from backend.app.mailer.runner import CampaignRunner
+    handler, image_path = smtp_settings
+    store = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    targets = [f"user{i}@example.com" for i in range(10)]
+    task_id = await store.create({"subject": "Test", "html_body": "<p>{{ email }}</p>", "image_name": "logo.png",
+                                  "image_path": image_path, "targets": targets})
+
+    # İlk worker dört alıcıyı gönderip çöker; kirası yenilenmez
+    crashed = await store.lease("crashed-worker", ttl=0.05)
+    assert crashed["id"] == task_id
+    for i in range(4):
+        await store.record(task_id, i, "success")
+    assert await store.lease("other", ttl=30) is None
+
+    await asyncio.sleep(0.1)
+    runner = CampaignRunner(store, worker_id="survivor", concurrency=1, lease_ttl=5, poll_interval=0.05)
+    runner.start()
+    try:
+        for _ in range(100):
+            state = await store.get(task_id)
+            if state["status"] == "done":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await runner.stop()
+
+    assert state == {"progress": 100, "total": 10, "sent": 10, "success": 10, "fail": 0, "status": "done", "error": None}
+    assert sorted(rcpt for [rcpt] in handler.messages) == sorted(targets[4:])
+    # Tamamlanan kampanya tekrar kiralanmaz
+    assert await store.lease("late", ttl=30) is None
+
+
+@pytest.mark.asyncio
+async def test_sqlite_rate_limit_is_shared_per_account(tmp_path):
+    from backend.app.mailer.queue import SQLiteCampaignStore
+    first = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    second = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    delays = [await store.throttle("acct", 5) for store in (first, second) * 3]
+    assert sum(1 for d in delays if d == 0) == 5
+    assert await first.throttle("other", 5) == 0
+
+
+
+@pytest.mark.asyncio
+async def test_sqlite_lock_wait_does_not_block_event_loop(tmp_path):
+    import sqlite3
+    import threading
+    from backend.app.mailer.queue import SQLiteCampaignStore
+    store = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    # Başka bir süreç yazma kilidini tutuyor; throttle BEGIN IMMEDIATE'te bekler
+    holder = sqlite3.connect(tmp_path / "campaigns.sqlite3", isolation_level=None, check_same_thread=False)
+    holder.execute("BEGIN IMMEDIATE")
+    release = threading.Timer(0.3, holder.rollback)
+    release.start()
+
+    ticks = 0
+
+    async def tick():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.02)
+            ticks += 1
+
+    ticker = asyncio.create_task(tick())
+    try:
+        assert await store.throttle("acct", 5) == 0
+    finally:
+        ticker.cancel()
+        release.join()
+        holder.close()
+        await store.close()
+    assert ticks >= 5
+
+@pytest.mark.asyncio
+async def test_progress_events_wake_subscribers_only_on_change(tmp_path, smtp_settings):
+    from backend.app.mailer.progress import ProgressBroker
+    from backend.app.mailer.queue import SQLiteCampaignStore
+    from backend.app.mailer.runner import CampaignRunner
+    handler, image_path = smtp_settings
+    store = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    targets = [f"user{i}@example.com" for i in range(20)] + ["reject@example.com"]
+    task_id = await store.create({"subject": "Test", "html_body": "<p>x</p>", "image_name": "logo.png",
+                                  "image_path": image_path, "targets": targets})
+    broker = ProgressBroker()
+    snapshots = []
+
+    async def listen():
+        async for snapshot in broker.subscribe(task_id, initial=await store.get(task_id)):
+            snapshots.append(snapshot)
+
+    listener = asyncio.create_task(listen())
+    runner = CampaignRunner(store, broker, worker_id="w", concurrency=1, poll_interval=0.01)
+    runner.start()
+    try:
+        await asyncio.wait_for(listener, timeout=5)
+    finally:
+        await runner.stop()
+
+    final = snapshots[-1]
+    assert final["status"] == "done" and final["progress"] == 100
+    assert (final["success"], final["fail"]) == (20, 1)
+    assert final["eta_seconds"] == 0.0
+    # Başlangıç + alıcı başına en fazla bir olay + kapanış; boşta uyanma yok
+    assert len(snapshots) <= len(targets) + 2
+    assert [s["sent"] for s in snapshots] == sorted(s["sent"] for s in snapshots)
+
+
+@pytest.mark.asyncio
+async def test_rendered_messages_are_bounded_by_pool_size(tmp_path, smtp_settings, monkeypatch, caplog):
+    import sys
+    from backend.app.mailer.queue import SQLiteCampaignStore
+    from backend.app.mailer.runner import CampaignRunner, settings
+    runner_module = sys.modules[CampaignRunner.__module__]
+    handler, image_path = smtp_settings
+    monkeypatch.setattr(settings, "SMTP_POOL_SIZE", 2)
+
+    # Render edilip henüz gönderimi bitmemiş mesaj sayısı
+    in_flight = {"now": 0, "max": 0}
+    compile_campaign, pool_send = runner_module.compile_campaign, runner_module.SMTPPool.send
+
+    def counting_compile(*args, **kwargs):
+        campaign = compile_campaign(*args, **kwargs)
+        render = campaign.render
+
+        def counting_render(target):
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+            return render(target)
+        campaign.render = counting_render
+        return campaign
+
+    async def counting_send(self, *args, **kwargs):
+        try:
+            return await pool_send(self, *args, **kwargs)
+        finally:
+            in_flight["now"] -= 1
+
+    monkeypatch.setattr(runner_module, "compile_campaign", counting_compile)
+    monkeypatch.setattr(runner_module.SMTPPool, "send", counting_send)
+
+    store = SQLiteCampaignStore(tmp_path / "campaigns.sqlite3")
+    targets = [f"user{i}@example.com" for i in range(12)] + ["reject@example.com"]
+    task_id = await store.create({"subject": "Test", "html_body": "<p>x</p>", "image_name": "logo.png",
+                                  "image_path": image_path, "targets": targets})
+    runner = CampaignRunner(store, worker_id="w", concurrency=1, poll_interval=0.01)
+    runner.start()
+    try:
+        for _ in range(100):
+            state = await store.get(task_id)
+            if state["status"] == "done":
+                break
+            await asyncio.sleep(0.05)
+    finally:
+        await runner.stop()
+
+    assert (state["success"], state["fail"]) == (12, 1)
+    assert in_flight["max"] <= 2
+    assert any("reject@example.com" in r.getMessage() and r.levelname == "WARNING" for r in caplog.records)
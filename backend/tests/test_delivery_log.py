@@ -0,0 +1,51 @@
+import asyncio
+import gzip
+import json
+
+import pytest
+
+
+def _entry(task_id, i, status="success"):
+    return {
+        "task_id": task_id,
+        "target": f"user{i}@example.com",
+        "status": status,
+        "timestamp": f"2026-01-01T00:00:{i:02d}",
+        "template": "Test",
+        "image_used": "logo.png",
+    }
+
+
+@pytest.mark.asyncio
+async def test_delivery_log_batches_rotates_and_reports_from_index(tmp_path):
+    from backend.app.mailer.delivery_log import DeliveryLog
+    path = tmp_path / "mail_logs.txt"
+    log = DeliveryLog(path, max_bytes=650, flush_entries=5, flush_interval_ms=60_000)
+    log.start()
+
+    for i in range(4):
+        log.log(_entry("a", i))
+    await asyncio.sleep(0.05)
+    # Eşik dolmadan ve süre geçmeden diske yazılmaz
+    assert not path.exists()
+
+    log.log(_entry("a", 4, "fail"))
+    for _ in range(50):
+        await asyncio.sleep(0.02)
+        if not log._buffer:
+            break
+    for i in range(5, 8):
+        log.log(_entry("b", i))
+    await log.stop()
+
+    segments = sorted(tmp_path.glob("mail_logs.txt.*.gz"))
+    assert [s.name for s in segments] == ["mail_logs.txt.1.gz"]
+    with gzip.open(segments[0], "rt", encoding="utf-8") as f:
+        archived = [json.loads(line) for line in f]
+    active = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+    assert [e["target"] for e in archived + active] == [f"user{i}@example.com" for i in range(8)]
+
+    report = log.report("a")
+    assert report["counts"] == {"success": 4, "fail": 1}
+    assert [r["target"] for r in log.report("a", status="fail")["recipients"]] == ["user4@example.com"]
+    assert log.report("b")["counts"] == {"success": 3}
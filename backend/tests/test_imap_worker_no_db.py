@@ -3,56 +3,251 @@ import json
 import tempfile
 import asyncio
 import pytest
-from unittest.mock import patch, MagicMock, AsyncMock
+from email.message import EmailMessage
+from unittest.mock import patch, AsyncMock
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + b"\x00" * 64
+
+
+def make_mail(subject, with_image=True):
+    msg = EmailMessage()
+    msg["From"] = "a@b.com"
+    msg["To"] = "me@c.com"
+    msg["Subject"] = subject
+    msg["Date"] = "Mon, 27 May 2024 12:00:00 +0000"
+    msg.set_content("hi")
+    msg.add_alternative("<b>hi</b>", subtype="html")
+    if with_image:
+        msg.add_attachment(PNG_BYTES, maintype="image", subtype="png", filename="face.png")
+    return msg.as_bytes()
+
+
+async def wait_for_lines(path, count, timeout=5):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while loop.time() < deadline:
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                lines = f.readlines()
+            if len(lines) >= count:
+                return [json.loads(line) for line in lines]
+        await asyncio.sleep(0.05)
+    raise AssertionError(f"{count} mail bekleniyordu")
+
 
 @pytest.mark.asyncio
-async def test_imap_worker_adds_json_and_pubsub():
-    # Geçici dosya ve ortam değişkenleri
+async def test_imap_worker_adds_json_and_pubsub(fake_imap, monkeypatch):
+    from backend.services import imap_worker as worker
     with tempfile.TemporaryDirectory() as tmpdir:
         jsonl_path = os.path.join(tmpdir, "inbox_cache.jsonl")
-        tmp_dir = os.path.join(tmpdir, "tmp")
-        os.makedirs(tmp_dir, exist_ok=True)
-        os.environ["INBOX_CACHE"] = jsonl_path
-        os.environ["TMP_DIR"] = tmp_dir
-        os.environ["IMAP_HOST"] = "mockhost"
-        os.environ["IMAP_PORT"] = "993"
-        os.environ["IMAP_USER"] = "user"
-        os.environ["IMAP_PASS"] = "pass"
-        os.environ["ANALYZE_URL"] = "http://mock/analyze"
-        os.environ["REDIS_URL"] = "redis://localhost:6379/0"
-
-        # Mock IMAP ve analiz
-        with patch("imaplib.IMAP4_SSL") as mock_imap, \
-             patch("aiohttp.ClientSession.post", new_callable=AsyncMock) as mock_post, \
-             patch("redis.asyncio.from_url", new_callable=AsyncMock) as mock_redis:
-            # IMAP davranışı
-            instance = mock_imap.return_value
-            instance.login.return_value = None
-            instance.select.return_value = ("OK", [b"1"])
-            instance.uid.side_effect = [
-                ("OK", [b"123"]),  # search
-                ("OK", [(None, b"rawmail")]),  # fetch
-            ]
-            # E-posta mocku
-            with patch("email.message_from_bytes") as mock_msg:
-                msg = MagicMock()
-                msg.walk.return_value = []
-                msg.get.side_effect = lambda k: {"From": "a@b.com", "To": "me@c.com", "Subject": "Test", "Date": "2024-05-27T12:00:00"}.get(k)
-                mock_msg.return_value = msg
-                # Analyze mocku
-                mock_post.return_value.__aenter__.return_value.json = AsyncMock(return_value={"result": "fake", "score": 0.9})
-                # Redis mocku
-                mock_pub = AsyncMock()
-                mock_redis.return_value = mock_pub
-                # Worker'ı bir kez çalıştır
-                from backend.services.imap_worker import imap_worker
-                await asyncio.wait_for(imap_worker(), timeout=2)
-                # Dosya yazıldı mı?
-                with open(jsonl_path, "r", encoding="utf-8") as f:
-                    lines = f.readlines()
-                    assert len(lines) > 0
-                    obj = json.loads(lines[0])
-                    assert obj["from"] == "a@b.com"
-                    assert obj["phishing"] is True
-                # Redis publish çağrıldı mı?
-                assert mock_pub.publish.called 
\ No newline at end of file
+        monkeypatch.setattr(worker, "JSONL_PATH", jsonl_path)
+        monkeypatch.setattr(worker, "TMP_DIR", tmpdir)
+        monkeypatch.setattr(worker, "UID_STATE_DIR", os.path.join(tmpdir, "uid_state"))
+        monkeypatch.setattr(worker, "CHECKPOINT_DB", os.path.join(tmpdir, "checkpoints.sqlite3"))
+        monkeypatch.setattr(worker, "LAST_UID_PATH", os.path.join(tmpdir, "last_seen_uid.txt"))
+        monkeypatch.setattr(worker, "IMAP_HOST", "127.0.0.1")
+        monkeypatch.setattr(worker, "IMAP_PORT", fake_imap.port)
+        monkeypatch.setattr(worker, "IMAP_USER", "user")
+        monkeypatch.setattr(worker, "IMAP_PASS", "pass")
+        monkeypatch.setattr(worker, "IMAP_SSL", False)
+        monkeypatch.setattr(worker, "INBOX_MAINTENANCE", False)
+        fake_imap.add_message(make_mail("Test"))
+
+        analyze = AsyncMock(return_value={"result": "fake", "score": 0.9})
+        mock_pub = AsyncMock()
+        with patch.object(worker, "analyze_image", analyze), \
+             patch("redis.asyncio.from_url", new_callable=AsyncMock, return_value=mock_pub):
+            task = asyncio.create_task(worker.imap_worker())
+            try:
+                mails = await wait_for_lines(jsonl_path, 1)
+                assert mails[0]["from"] == "a@b.com"
+                assert mails[0]["phishing"] is True
+                assert mock_pub.publish.called
+
+                # IDLE push: yeni mail aynı bağlantı üzerinden, yeniden login olmadan gelmeli
+                fake_imap.add_message(make_mail("Second", with_image=False))
+                mails = await wait_for_lines(jsonl_path, 2)
+                assert mails[1]["subject"] == "Second"
+                assert mails[1]["phishing"] is False
+                assert fake_imap.logins == 1
+                assert not any(c.upper().endswith("SEARCH ALL") for c in fake_imap.commands)
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+
+@pytest.mark.asyncio
+async def test_imap_worker_reconnects_with_backoff(monkeypatch):
+    from backend.services import imap_worker as worker
+    monkeypatch.setattr(worker, "IMAP_HOST", "127.0.0.1")
+    monkeypatch.setattr(worker, "IMAP_PORT", 1)  # bağlantı reddedilir
+    monkeypatch.setattr(worker, "IMAP_SSL", False)
+    monkeypatch.setattr(worker, "INBOX_MAINTENANCE", False)
+    monkeypatch.setattr(worker, "UID_STATE_DIR", os.path.join(tempfile.gettempdir(), "missing_uid_state"))
+    monkeypatch.setattr(worker, "LAST_UID_PATH", os.path.join(tempfile.gettempdir(), "missing_uid.txt"))
+    monkeypatch.setattr(worker, "CHECKPOINT_DB", ":memory:")
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+        if len(delays) >= 4:
+            raise asyncio.CancelledError()
+
+    with patch("redis.asyncio.from_url", new_callable=AsyncMock), \
+         patch.object(worker.asyncio, "sleep", fake_sleep):
+        with pytest.raises(asyncio.CancelledError):
+            await worker.imap_worker()
+    assert delays == sorted(delays)
+    assert delays[-1] > delays[0]
+
+
+@pytest.mark.asyncio
+async def test_imap_worker_fetches_only_selected_parts(fake_imap, monkeypatch):
+    from backend.services import imap_worker as worker
+    with tempfile.TemporaryDirectory() as tmpdir:
+        jsonl_path = os.path.join(tmpdir, "inbox_cache.jsonl")
+        monkeypatch.setattr(worker, "JSONL_PATH", jsonl_path)
+        monkeypatch.setattr(worker, "TMP_DIR", tmpdir)
+        monkeypatch.setattr(worker, "UID_STATE_DIR", os.path.join(tmpdir, "uid_state"))
+        monkeypatch.setattr(worker, "CHECKPOINT_DB", os.path.join(tmpdir, "checkpoints.sqlite3"))
+        monkeypatch.setattr(worker, "LAST_UID_PATH", os.path.join(tmpdir, "last_seen_uid.txt"))
+        monkeypatch.setattr(worker, "IMAP_HOST", "127.0.0.1")
+        monkeypatch.setattr(worker, "IMAP_PORT", fake_imap.port)
+        monkeypatch.setattr(worker, "IMAP_USER", "user")
+        monkeypatch.setattr(worker, "IMAP_PASS", "pass")
+        monkeypatch.setattr(worker, "IMAP_SSL", False)
+        monkeypatch.setattr(worker, "INBOX_MAINTENANCE", False)
+
+        msg = EmailMessage()
+        msg["From"] = "Kampanya <x@y.com>"
+        msg["To"] = "me@c.com"
+        msg["Subject"] = "=?utf-8?b?xZ5pZnJl?="
+        msg.set_content("plain")
+        msg.add_attachment(b"\x00" * (3 * 1024 * 1024), maintype="image", subtype="png", filename="huge.png")
+        for i in range(6):
+            msg.add_attachment(PNG_BYTES, maintype="image", subtype="png", filename=f"img{i}.png")
+        fake_imap.add_message(msg.as_bytes())
+        fake_imap.add_message(make_mail("Other", with_image=False))
+
+        analyze = AsyncMock(return_value={"result": "real", "score": 0.1})
+        with patch.object(worker, "analyze_image", analyze), \
+             patch("redis.asyncio.from_url", new_callable=AsyncMock):
+            task = asyncio.create_task(worker.imap_worker())
+            try:
+                mails = await wait_for_lines(jsonl_path, 2)
+            finally:
+                task.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await task
+
+    first = next(m for m in mails if m["uid"] == 1)
+    assert first["from"] == "Kampanya <x@y.com>"
+    assert first["subject"] == "Şifre"
+    assert first["text"].strip() == "plain"
+    # Beş aynı görsel içerik adresiyle tek dosyaya iner ve bir kez analiz edilir
+    assert len(first["attachments"]) == 1
+    assert analyze.await_count == 1
+    assert first["skipped_attachments"] == ["huge.png", "img5.png"]
+    # Büyük ek ve altıncı görsel hiç indirilmemeli
+    assert fake_imap.fetched_bytes < 100 * 1024
+    assert not any("RFC822" in c.upper() for c in fake_imap.commands)
+    # Özetler tüm batch için tek komutla alınır
+    summary_fetches = [c for c in fake_imap.commands if "BODYSTRUCTURE" in c.upper()]
+    assert summary_fetches == ["UID FETCH 1,2 (UID BODYSTRUCTURE ENVELOPE)"]
+
+
+def test_parse_email_streams_and_dedupes_attachments(tmp_path, monkeypatch):
+    from backend.services import imap_worker as worker
+    monkeypatch.setattr(worker, "TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(worker, "MAX_ATTACHMENT_BYTES", 1024)
+
+    msg = EmailMessage()
+    msg["Subject"] = "x"
+    msg.set_content("plain")
+    msg.add_alternative("<p>html</p>", subtype="html")
+    msg.add_attachment(b"\x00" * 4096, maintype="image", subtype="png", filename="huge.png")
+    msg.add_attachment(PNG_BYTES, maintype="image", subtype="png", filename="face.png")
+    msg.add_attachment(b"%PDF" * 1000, maintype="application", subtype="pdf", filename="doc.pdf")
+
+    _, html, text, first, skipped = worker.parse_email(msg.as_bytes())
+    assert html.strip() == "<p>html</p>"
+    assert text.strip() == "plain"
+    assert skipped == ["huge.png"]
+    _, _, _, second, _ = worker.parse_email(make_mail("other"))
+
+    # Aynı görsel iki farklı mailde tek dosya olarak saklanır; büyük ek diske kalmaz
+    assert first == second
+    with open(first[0], "rb") as f:
+        assert f.read() == PNG_BYTES
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(first[0])]
+
+
+@pytest.mark.asyncio
+async def test_imap_worker_resumes_without_duplicates(fake_imap, tmp_path, monkeypatch):
+    from backend.services import imap_worker as worker
+    from backend.services.checkpoint_journal import CheckpointJournal, idempotency_key, mail_id_for
+    jsonl_path = str(tmp_path / "inbox_cache.jsonl")
+    monkeypatch.setattr(worker, "JSONL_PATH", jsonl_path)
+    monkeypatch.setattr(worker, "TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(worker, "UID_STATE_DIR", str(tmp_path / "uid_state"))
+    monkeypatch.setattr(worker, "MAX_NEW_PER_SYNC", 2)
+    for i in range(5):
+        fake_imap.add_message(make_mail(f"m{i}", with_image=False))
+
+    # Önceki süreç: UID 1 işlenmiş, UID 2 inbox'a yazılmış ama günlüğe işlenmeden çökmüş
+    journal = CheckpointJournal(str(tmp_path / "checkpoints.sqlite3"))
+    journal.open_mailbox("default", "INBOX", fake_imap.uidvalidity)
+    journal.record_pending("default", "INBOX", [1, 2])
+    journal.mark_done("default", "INBOX", 1, "x")
+    crashed_id = mail_id_for(idempotency_key("default", "INBOX", fake_imap.uidvalidity, 2))
+    with open(jsonl_path, "w", encoding="utf-8") as f:
+        f.write(json.dumps({"id": crashed_id, "uid": 2, "subject": "m1"}) + "\n")
+
+    account = {"id": "default", "host": "127.0.0.1", "port": fake_imap.port, "user": "u",
+               "password": "p", "ssl": False, "folders": ["INBOX"]}
+    task = asyncio.create_task(worker.run_ingestion([account], AsyncMock(), journal))
+    try:
+        # 50'lik sınır artık yeni mailleri atlamaz: 3, 4 ve 5 batch'ler halinde işlenir
+        mails = await wait_for_lines(jsonl_path, 4)
+        await asyncio.sleep(0.2)
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        mails = [json.loads(line) for line in f]
+    assert [m["uid"] for m in mails] == [2, 3, 4, 5]
+    assert journal.resume_uid("default", "INBOX") == 6
+
+    # UIDVALIDITY değişince eski UID'ler geçersizdir; günlük sıfırlanır
+    assert journal.open_mailbox("default", "INBOX", fake_imap.uidvalidity + 1) == "reset"
+    assert journal.resume_uid("default", "INBOX") is None
+
+
+@pytest.mark.asyncio
+async def test_store_failure_is_retried_then_marked_failed(tmp_path, monkeypatch):
+    from backend.services import imap_worker as worker
+    from backend.services.checkpoint_journal import CheckpointJournal, FAILED
+    monkeypatch.setattr(worker, "STORE_MAX_ATTEMPTS", 2)
+    monkeypatch.setattr(worker, "STORE_RETRY_DELAY", 0)
+    journal = CheckpointJournal(str(tmp_path / "checkpoints.sqlite3"))
+    journal.open_mailbox("default", "INBOX", 1)
+    journal.record_pending("default", "INBOX", [7, 8])
+    job = worker.make_job(("default", "INBOX", 1), 7, {}, "", "", [], [])
+    queue = asyncio.Queue()
+
+    # İlk hata: deneme hakkı var, iş kurtarılmış olarak yeniden kuyruğa girer
+    await worker.handle_store_failure(queue, journal, job)
+    requeued = await asyncio.wait_for(queue.get(), 1)
+    assert requeued is job and job["recovered"]
+    assert journal.resume_uid("default", "INBOX") == 7
+
+    # Hak tükenince UID 'failed' olur ve devam noktası bir sonrakine geçer
+    await worker.handle_store_failure(queue, journal, job)
+    await asyncio.sleep(0.05)
+    assert queue.empty()
+    row = journal.conn.execute("SELECT state, attempts FROM messages WHERE uid = 7").fetchone()
+    assert row == (FAILED, 2)
+    assert journal.resume_uid("default", "INBOX") == 8
+    journal.close()
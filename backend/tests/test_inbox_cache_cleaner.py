@@ -0,0 +1,73 @@
+import json
+from datetime import datetime, timezone
+
+
+def test_compact_inbox_drops_old_and_deleted_in_one_pass(tmp_path):
+    from backend.services.inbox_cache_cleaner import compact_inbox, append_line
+    path = tmp_path / "inbox_cache.jsonl"
+    mails = [
+        {"id": "old", "date": "Mon, 01 Jan 2024 12:00:00 +0000"},
+        {"id": "deleted", "date": "2024-05-26T12:00:00", "deleted": True},
+        {"id": "recent", "date": "Mon, 27 May 2024 12:00:00 +0000"},
+        {"id": "undated"},
+    ]
+    for mail in mails:
+        append_line(str(path), json.dumps(mail) + "\n")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write("not json\n")
+    size_before = path.stat().st_size
+
+    stats = compact_inbox(str(path), days_keep=30, now=datetime(2024, 6, 1, tzinfo=timezone.utc))
+
+    kept = [json.loads(line)["id"] for line in path.read_text().splitlines()]
+    assert kept == ["recent", "undated"]
+    assert stats["kept"] == 2 and stats["dropped"] == 3
+    assert stats["bytes_before"] == size_before
+    assert stats["bytes_reclaimed"] == size_before - path.stat().st_size
+    assert not (tmp_path / "inbox_cache.jsonl.compact.tmp").exists()
+
+
+def test_rewrite_keeps_partial_tail_and_logs_unparsable_lines(tmp_path, monkeypatch, capsys):
+    from contextlib import contextmanager
+    from backend.services import inbox_cache_cleaner as cleaner
+    path = tmp_path / "inbox_cache.jsonl"
+    path.write_bytes(b'{"id": "a"}\nbroken\n{"id": "pa')
+
+    # Tarama bitince, kilit alınmadan önce yazar satırın devamını ekler ama henüz bitirmemiştir
+    @contextmanager
+    def lock(p):
+        with open(p, "ab") as f:
+            f.write(b'rtial"')
+        yield
+
+    monkeypatch.setattr(cleaner, "inbox_lock", lock)
+    stats = cleaner.rewrite_jsonl(str(path), lambda mail: True)
+
+    assert path.read_bytes() == b'{"id": "a"}\n{"id": "partial"'
+    assert stats["kept"] == 1 and stats["dropped"] == 1
+    assert "Dropping unparsable line" in capsys.readouterr().out
+
+
+def test_inbox_routes_list_newest_first_and_delete_under_lock(tmp_path, monkeypatch):
+    import sys
+    from fastapi.testclient import TestClient
+    from backend.app.main import app
+    from backend.services.inbox_cache_cleaner import append_line
+    inbox = sys.modules["app.routers.inbox"]
+    path = str(tmp_path / "inbox_cache.jsonl")
+    monkeypatch.setattr(inbox, "JSONL_PATH", path)
+    for day in range(1, 26):
+        append_line(path, json.dumps({"id": str(day), "date": f"2024-05-{day:02d}T12:00:00"}) + "\n")
+
+    client = TestClient(app)
+    ids = [m["id"] for m in client.get("/mails").json()]
+    assert ids == [str(day) for day in range(25, 5, -1)]
+
+    locked = []
+    real_rewrite = inbox.rewrite_jsonl
+    monkeypatch.setattr(inbox, "rewrite_jsonl", lambda p, t: locked.append(p) or real_rewrite(p, t))
+    assert client.delete("/mails/25").status_code == 200
+    assert client.delete("/mails/missing").status_code == 404
+    assert locked == [path, path]
+    assert [m["id"] for m in client.get("/mails").json()][0] == "24"
+    assert len(open(path, encoding="utf-8").readlines()) == 25
@@ -0,0 +1,69 @@
+import json
+import asyncio
+import pytest
+from unittest.mock import AsyncMock
+
+from test_imap_worker_no_db import make_mail, wait_for_lines
+from conftest import FakeIMAPServer
+from backend.services.checkpoint_journal import CheckpointJournal
+
+
+def test_shard_accounts_partitions_and_is_stable():
+    from backend.services.ingestion_supervisor import shard_accounts
+    accounts = [{"id": f"acct{i}"} for i in range(200)]
+    shards = [shard_accounts(accounts, i, 4) for i in range(4)]
+    ids = [a["id"] for shard in shards for a in shard]
+    assert sorted(ids) == sorted(a["id"] for a in accounts)
+    assert all(len(shard) > 20 for shard in shards)
+
+    # Bir shard eklendiğinde hesapların çoğu yerinde kalmalı
+    before = {a["id"]: i for i, shard in enumerate(shards) for a in shard}
+    after = {a["id"]: i for i in range(5) for a in shard_accounts(accounts, i, 5)}
+    moved = sum(before[k] != after[k] for k in before)
+    assert moved < len(accounts) / 2
+
+
+def test_load_accounts_reads_password_from_env(tmp_path, monkeypatch):
+    from backend.services.ingestion_supervisor import load_accounts
+    path = tmp_path / "accounts.json"
+    path.write_text(json.dumps({"accounts": [
+        {"id": "destek", "host": "imap.example.com", "user": "d@example.com", "password_env": "DESTEK_PASS"},
+    ]}))
+    monkeypatch.setenv("DESTEK_PASS", "s3cret")
+    [account] = load_accounts(str(path))
+    assert account["password"] == "s3cret"
+    assert account["folders"] == ["INBOX"]
+    assert account["port"] == 993
+
+
+@pytest.mark.asyncio
+async def test_run_ingestion_polls_accounts_concurrently(tmp_path, monkeypatch):
+    from backend.services import imap_worker as worker
+    jsonl_path = str(tmp_path / "inbox_cache.jsonl")
+    monkeypatch.setattr(worker, "JSONL_PATH", jsonl_path)
+    monkeypatch.setattr(worker, "TMP_DIR", str(tmp_path))
+    monkeypatch.setattr(worker, "UID_STATE_DIR", str(tmp_path / "uid_state"))
+
+    servers = [await FakeIMAPServer().start() for _ in range(2)]
+    accounts = [
+        {"id": f"acct{i}", "host": "127.0.0.1", "port": s.port, "user": "u", "password": "p",
+         "ssl": False, "folders": ["INBOX"]}
+        for i, s in enumerate(servers)
+    ]
+    servers[0].add_message(make_mail("from-0", with_image=False))
+    servers[1].add_message(make_mail("from-1", with_image=False))
+    journal = CheckpointJournal(str(tmp_path / "checkpoints.sqlite3"))
+    task = asyncio.create_task(worker.run_ingestion(accounts, AsyncMock(), journal))
+    try:
+        mails = await wait_for_lines(jsonl_path, 2)
+        assert {(m["account"], m["subject"]) for m in mails} == {("acct0", "from-0"), ("acct1", "from-1")}
+        await asyncio.sleep(0.1)
+        # Her hesabın UID durumu ayrı tutulur
+        for account in accounts:
+            assert journal.resume_uid(account["id"], "INBOX") == 2
+    finally:
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        for s in servers:
+            await s.stop()
@@ -0,0 +1,59 @@
+import asyncio
+
+import pytest
+
+
+def test_guard_session_hysteresis_emits_only_state_changes():
+    from backend.app.utils.live_guard import GuardSession, parse_frame, FRAME_HEADER
+    session = GuardSession(alpha=0.5, alarm_on=0.7, alarm_off=0.4)
+
+    events = [session.update(1, seq, p) for seq, p in enumerate([0.2, 0.9, 0.9, 0.9, 0.5, 0.5, 0.1, 0.1])]
+    states = [(e["seq"], e["state"]) for e in events if e]
+    # Scores 0.2 .55 .725 .81 .655 .58 .34 .22: alarm at .725, held through .58, cleared at .34
+    assert states == [(0, "clear"), (2, "alarm"), (6, "clear")]
+
+    assert session.accept(2, 5) and not session.accept(2, 5) and not session.accept(2, 3)
+    assert session.update(1, 3, 0.9) is None  # older than the last scored frame
+    assert parse_frame(FRAME_HEADER.pack(7, 2) + b"jpeg") == (7, 2, b"jpeg")
+    with pytest.raises(ValueError):
+        parse_frame(b"\x00\x01")
+
+
+@pytest.mark.asyncio
+async def test_inference_batcher_scores_frames_from_all_sessions_together():
+    from backend.app.utils.live_guard import InferenceBatcher
+    batches = []
+
+    def predict(payloads):
+        batches.append(list(payloads))
+        return [None if p == b"bad" else len(p) / 10 for p in payloads]
+
+    batcher = InferenceBatcher(predict, max_batch=4, max_wait_ms=50)
+    batcher.start()
+    try:
+        results = await asyncio.gather(*(batcher.submit(p) for p in [b"a", b"bb", b"bad", b"cccc", b"ddddd"]))
+    finally:
+        await batcher.stop()
+
+    assert results == [0.1, 0.2, None, 0.4, 0.5]
+    assert [len(b) for b in batches] == [4, 1]
+
+
+def test_guardian_stream_rejects_text_frames_and_ends_on_disconnect(tmp_path, monkeypatch):
+    import sys
+    from fastapi.testclient import TestClient
+    from backend.app.main import app
+    # Startup hooks open the campaign queue and delivery log; keep their files out of the source tree
+    settings = sys.modules["app.core.config"].settings
+    monkeypatch.setattr(settings, "CAMPAIGN_BACKEND", "sqlite")
+    monkeypatch.setattr(settings, "CAMPAIGN_DB", tmp_path / "campaigns.sqlite3")
+    monkeypatch.setattr(settings, "MAIL_LOGS_PATH", tmp_path / "mail_logs.txt")
+    monkeypatch.setattr(sys.modules["app.routers.mail_sender"], "MAIL_LOGS_PATH", tmp_path / "mail_logs.txt")
+    with TestClient(app) as client:
+        with client.websocket_connect("/ws/guardian") as ws:
+            ws.send_text("hello")
+            assert ws.receive_json() == {"type": "error", "detail": "Expected binary frames."}
+            ws.send_bytes(b"\x00\x01")
+            assert ws.receive_json()["type"] == "error"
+            ws.send_text("still open")
+            assert ws.receive_json()["detail"] == "Expected binary frames."
@@ -0,0 +1,65 @@
+import base64
+import email
+from email.message import EmailMessage
+from email.policy import default
+
+import pytest
+
+PNG_BYTES = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+def _reference(raw):
+    msg = email.message_from_bytes(raw, policy=default)
+    html = msg.get_body(("html",))
+    text = msg.get_body(("plain",))
+    return (html.get_content() if html else None), (text.get_content() if text else None)
+
+
+def _nested_mail(crlf):
+    msg = EmailMessage()
+    msg["Subject"] = "nested"
+    msg.set_content("düz metin\nikinci satır\n")
+    msg.add_alternative("<p>Merhaba dünya</p>\n", subtype="html", cte="quoted-printable")
+    msg.add_attachment(PNG_BYTES, maintype="image", subtype="png", filename="face.png")
+    inner = EmailMessage()
+    inner.set_content("forwarded")
+    msg.add_attachment(inner)
+    raw = msg.as_bytes()
+    raw = raw.replace(b"\n", b"\r\n") if crlf else raw
+    # Preamble and epilogue must be ignored
+    boundary = msg.get_boundary().encode()
+    raw = raw.replace(b"\r\n\r\n--" if crlf else b"\n\n--", (b"\r\n\r\npreamble\r\n--" if crlf else b"\n\npreamble\n--"), 1)
+    return raw + (b"epilogue --" + boundary + b"\r\n" if crlf else b"epilogue --" + boundary + b"\n")
+
+
+@pytest.mark.parametrize("crlf", [False, True])
+@pytest.mark.parametrize("chunk", [1, 7, 4096])
+def test_stream_parser_matches_stdlib_parser(tmp_path, crlf, chunk):
+    from backend.services.mime_stream import AttachmentStore, parse_message_stream
+    raw = _nested_mail(crlf)
+    chunks = [raw[i:i + chunk] for i in range(0, len(raw), chunk)]
+    msg, html, text, attachments, skipped = parse_message_stream(chunks, AttachmentStore(str(tmp_path)), 1 << 20, 5)
+
+    ref_html, ref_text = _reference(raw)
+    assert html.replace("\r\n", "\n") == ref_html.replace("\r\n", "\n")
+    assert text.replace("\r\n", "\n") == ref_text.replace("\r\n", "\n")
+    assert msg["Subject"] == "nested" and msg.is_multipart()
+    assert skipped == []
+    with open(attachments[0], "rb") as f:
+        assert f.read() == PNG_BYTES
+
+
+def test_stream_parser_handles_single_part_and_unwrapped_base64(tmp_path):
+    from backend.services.mime_stream import MAX_LINE_BUFFER, AttachmentStore, parse_message_stream
+    _, html, text, _, _ = parse_message_stream(b"Subject: x\n\nsadece metin\n", AttachmentStore(str(tmp_path)), 1024, 5)
+    assert text == "sadece metin\n" and html is None
+
+    # A base64 body without line breaks is decoded in pieces, never held as one line
+    payload = bytes(range(256)) * 64
+    raw = (b'Content-Type: multipart/mixed; boundary="b"\n\n--b\nContent-Type: image/png; name="a.png"\n'
+           b'Content-Disposition: attachment; filename="a.png"\nContent-Transfer-Encoding: base64\n\n'
+           + base64.b64encode(payload) + b"\n--b--\n")
+    assert len(raw) > 2 * MAX_LINE_BUFFER
+    _, _, _, attachments, _ = parse_message_stream(raw, AttachmentStore(str(tmp_path)), 1 << 20, 5)
+    with open(attachments[0], "rb") as f:
+        assert f.read() == payload
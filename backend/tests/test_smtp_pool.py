@@ -0,0 +1,84 @@
+import socket
+import asyncio
+import pytest
+from email.message import EmailMessage
+
+pytest.importorskip("aiosmtpd")
+from aiosmtpd.controller import Controller
+from aiosmtpd.smtp import AuthResult
+
+
+class SinkHandler:
+    def __init__(self):
+        self.messages = []
+        self.sessions = set()
+        self.rsets = 0
+
+    async def handle_RCPT(self, server, session, envelope, address, rcpt_options):
+        if address.startswith("reject"):
+            return "550 no such user"
+        envelope.rcpt_tos.append(address)
+        return "250 OK"
+
+    async def handle_DATA(self, server, session, envelope):
+        self.sessions.add(id(session))
+        self.messages.append(envelope.rcpt_tos[:])
+        return "250 Message accepted"
+
+    async def handle_RSET(self, server, session, envelope):
+        self.rsets += 1
+        return "250 OK"
+
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@pytest.fixture
+def smtp_sink():
+    handler = SinkHandler()
+    controller = Controller(
+        handler, hostname="127.0.0.1", port=_free_port(),
+        authenticator=lambda *args: AuthResult(success=True), auth_require_tls=False,
+    )
+    controller.start()
+    yield controller, handler
+    controller.stop()
+
+
+def _mail(to):
+    msg = EmailMessage()
+    msg["From"] = "kampanya@example.com"
+    msg["To"] = to
+    msg["Subject"] = "test"
+    msg.set_content("hi")
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_pool_reuses_connections_with_limits(smtp_sink):
+    from backend.app.mailer.smtp_pool import SMTPPool
+    controller, handler = smtp_sink
+    async with SMTPPool(controller.hostname, controller.port, start_tls=False,
+                        size=4, max_messages_per_connection=25) as pool:
+        await asyncio.gather(*(pool.send(_mail(f"user{i}@example.com")) for i in range(200)))
+        # 200 mail, bağlantı başına en fazla 25: mail başına değil, birkaç el sıkışma yeterli
+        assert 8 <= pool.connections_opened <= 12
+    assert len(handler.messages) == 200
+    assert len(handler.sessions) == pool.connections_opened
+
+
+@pytest.mark.asyncio
+async def test_pool_resets_after_refused_recipient(smtp_sink):
+    import aiosmtplib
+    from backend.app.mailer.smtp_pool import SMTPPool
+    controller, handler = smtp_sink
+    async with SMTPPool(controller.hostname, controller.port, start_tls=False, size=1) as pool:
+        with pytest.raises(aiosmtplib.SMTPException):
+            await pool.send(_mail("reject@example.com"))
+        await pool.send(_mail("ok@example.com"))
+        assert pool.connections_opened == 1
+    assert handler.messages == [["ok@example.com"]]
+    assert handler.rsets >= 1
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+
+
+def _touch(path, size, age):
+    with open(path, "wb") as f:
+        f.write(b"\x00" * size)
+    ts = time.time() - age
+    os.utime(path, (ts, ts))
+
+
+def test_janitor_enforces_quotas_and_cleans_references(tmp_path, monkeypatch):
+    from backend.services import storage_janitor as sj
+    monkeypatch.setattr(sj, "TMP_MAX_BYTES", 250)
+    monkeypatch.setattr(sj, "UPLOAD_MAX_AGE", 3600)
+    tmp_dir, uploads, gradcam = tmp_path / "tmp", tmp_path / "uploads", tmp_path / "gradcam"
+    for d in (tmp_dir, uploads, gradcam):
+        d.mkdir()
+
+    # Ekler: kota 250 bayt, en eski erişilen ikisi silinmeli
+    for i, age in enumerate([400, 300, 200, 100]):
+        _touch(tmp_dir / f"att_{i}.png", 100, age)
+    (tmp_dir / "att_0.png.result.json").write_text("{}")
+    _touch(gradcam / "gradcam_att_0.png.png", 10, 400)
+    # Yüklemeler: bir saatten eski olan silinmeli, GradCAM'i ve sonucu da gitmeli
+    _touch(uploads / "old.png", 10, 7200)
+    _touch(uploads / "new.png", 10, 60)
+    _touch(gradcam / "gradcam_old.png.png", 10, 60)
+
+    results_file = tmp_path / "results.json"
+    results_file.write_text(json.dumps([{"image_id": "old.png"}, {"image_id": "new.png"}]))
+    inbox = tmp_path / "inbox_cache.jsonl"
+    inbox.write_text(json.dumps({"id": "m1", "attachments": [str(tmp_dir / "att_0.png"), str(tmp_dir / "att_3.png")]}) + "\n")
+
+    janitor = sj.StorageJanitor(tmp_dir, uploads, gradcam, results_file, inbox)
+    # Küçük parti: tarama birkaç turda tamamlanır, her tur sadece bilinen dosyalara bakar
+    for _ in range(5):
+        janitor.run_once(scan_batch=2)
+
+    assert sorted(os.listdir(tmp_dir)) == ["att_2.png", "att_3.png"]
+    assert sorted(os.listdir(uploads)) == ["new.png"]
+    assert os.listdir(gradcam) == []
+    assert [r["image_id"] for r in json.loads(results_file.read_text())] == ["new.png"]
+    mail = json.loads(inbox.read_text())
+    assert mail["attachments"] == [str(tmp_dir / "att_3.png")]
+    assert mail["expired_attachments"] == 1
+
+
+def test_results_reconcile_waits_for_concurrent_save(tmp_path):
+    import threading
+    from backend.services import storage_janitor as sj
+    from backend.services.inbox_cache_cleaner import inbox_lock
+    for d in ("tmp", "uploads", "gradcam"):
+        (tmp_path / d).mkdir()
+    results_file = tmp_path / "results.json"
+    results_file.write_text(json.dumps([{"image_id": "old.png"}]))
+    janitor = sj.StorageJanitor(tmp_path / "tmp", tmp_path / "uploads", tmp_path / "gradcam", results_file,
+                                tmp_path / "inbox_cache.jsonl")
+
+    # save_result_to_json kilidi tutarken janitor bekler ve yeni kaydı silmeden günceller
+    with inbox_lock(results_file):
+        worker = threading.Thread(target=janitor._reconcile_results, args=({"old.png"}, set()))
+        worker.start()
+        worker.join(0.2)
+        assert worker.is_alive()
+        results_file.write_text(json.dumps([{"image_id": "fresh.png"}, {"image_id": "old.png"}]))
+    worker.join(5)
+    assert [r["image_id"] for r in json.loads(results_file.read_text())] == ["fresh.png"]
@@ -0,0 +1,43 @@
+import numpy as np
+import pytest
+
+cv2 = pytest.importorskip("cv2")
+
+
+class StubCascade:
+    """Finds a 'face' only in bright frames."""
+
+    def detectMultiScale(self, gray, *args, **kwargs):
+        return [(10, 10, 40, 40)] if gray.mean() > 100 else []
+
+
+def test_analyze_video_streams_smoothed_segments_and_handles_missing_faces(tmp_path):
+    from backend.app.utils.video_analysis import analyze_video
+    path = str(tmp_path / "clip.avi")
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 10, (160, 120))
+    # 0-4 s: face, real; 4-6 s: no face; 6-12 s: face, fake
+    for i in range(120):
+        second = i // 10
+        value = 40 if 4 <= second < 6 else (150 if second < 4 else 250)
+        writer.write(np.full((120, 160, 3), value, np.uint8))
+    writer.release()
+
+    batches = []
+
+    def predict(crops):
+        batches.append(len(crops))
+        return [0.9 if crop.mean() > 200 else 0.1 for crop in crops]
+
+    events = list(analyze_video(path, predict, StubCascade(), sample_fps=2, segment_seconds=2, batch_size=4, alpha=0.4))
+
+    assert events[0]["type"] == "meta" and events[0]["fps"] == 10
+    segments = [e for e in events if e["type"] == "segment"]
+    assert [s["label"] for s in segments] == ["real", "real", "no_face", "real", "fake", "fake"]
+    # EMA: the first fake segment is pulled down by history and only crosses the threshold later
+    assert segments[3]["mean_score"] == 0.9 and segments[3]["score"] == pytest.approx(0.42)
+    assert all(size <= 4 for size in batches)
+
+    summary = events[-1]
+    assert summary["type"] == "summary" and summary["verdict"] == "fake"
+    assert summary["analyzed_frames"] == 20 and summary["fake_segments"] == 2
+    assert len(summary["timeline"]) == 20
@@ -7,6 +7,8 @@ import torch.nn as nn
 import torch.optim as optim
 from dotenv import load_dotenv
 import time
+from typing import Optional, Tuple
+from torch.utils.data import DataLoader
 
 # Add parent directory to path
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -17,33 +19,56 @@ from src.common.model import FederatedDeepfakeDetector
 from src.common.config import FederatedConfig
 from src.common.security import SecurityManager
 from src.common.training_utils import apply_dp_privacy, generate_adversarial_example
+from src.common.compression import CodecConfig, UpdateCodec, decode_update
+from src.common.metrics import POSITIVE_CLASS, classification_metrics
+from src.common.batch_transforms import BatchRobustAugment, normalize
 from client_machine.data_manager import DataManager
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class DeepFakeClient(fl.client.NumPyClient):
-    def __init__(self, client_id: str, secret_key: str):
+    def __init__(self, client_id: str, secret_key: str, model: Optional[nn.Module] = None,
+                 loaders: Optional[Tuple[DataLoader, DataLoader]] = None,
+                 codec_config: Optional[CodecConfig] = None):
+        """
+        `model` and `loaders` can be injected so simulated clients share one model instance
+        per worker process and read their partition of a shared dataset.
+        """
         self.config = FederatedConfig()
         self.device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
         logger.info(f"Client {client_id} initializing on {self.device}...")
         # Initialize model
-        self.model = FederatedDeepfakeDetector().to(self.device).eval()
+        self.model = (model or FederatedDeepfakeDetector()).to(self.device).eval()
         self.criterion = nn.CrossEntropyLoss()
         self.data_manager = DataManager(batch_size=self.config.BATCH_SIZE)
-        self.train_loader, self.val_loader = self.data_manager.load_data()
+        self.train_loader, self.val_loader = loaders or self.data_manager.load_data()
         
         # Security
         self.security_manager = SecurityManager(secret_key)
         self.token = self.security_manager.generate_token(client_id)
+        # uint8 batches (BATCH_AUGMENT loaders) are augmented/normalized here, after collation
+        self.augment = BatchRobustAugment()
+        # Update codec keeps error-feedback residuals across rounds
+        self.codec = UpdateCodec(codec_config or CodecConfig.from_config(self.config))
         logger.info(f"Client {client_id} ready.")
 
+    def prepare_batch(self, images: torch.Tensor, train: bool) -> torch.Tensor:
+        """Float batches come preprocessed by the dataset; uint8 ones get the batch augmentations."""
+        images = images.to(self.device)
+        if images.dtype != torch.uint8:
+            return images
+        return self.augment(images) if train else normalize(images)
+
     def get_parameters(self, config):
         return self.model.get_parameters()
 
     def fit(self, parameters, config):
         logger.info("Starting training round...")
+        if "codec" in config:
+            parameters = decode_update(parameters, config["codec"])
         self.model.set_parameters(parameters)
+        started = time.perf_counter()
         
         criterion = nn.CrossEntropyLoss()
         optimizer = optim.SGD(
@@ -54,10 +79,11 @@ class DeepFakeClient(fl.client.NumPyClient):
         
         # Local training
         self.model.train()
+        total_loss, steps = 0.0, 0
         for epoch in range(self.config.EPOCHS_PER_ROUND):
-            total_loss = 0
+            epoch_loss = 0
             for images, labels in self.train_loader:
-                images, labels = images.to(self.device), labels.to(self.device)
+                images, labels = self.prepare_batch(images, train=True), labels.to(self.device)
                 
                 # --- Adversarial Training (FGSM) ---
                 if self.config.ADVERSARIAL_TRAINING:
@@ -94,33 +120,44 @@ class DeepFakeClient(fl.client.NumPyClient):
                 # ----------------------------
 
                 optimizer.step()
-                total_loss += loss.item()
-            logger.info(f"Epoch {epoch+1} loss: {total_loss}")
+                epoch_loss += loss.item()
+                steps += 1
+            total_loss += epoch_loss
+            logger.info(f"Epoch {epoch+1} loss: {epoch_loss}")
                 
-        return self.model.get_parameters(), len(self.train_loader.dataset), {"token": self.token}
+        # Delta against the round's global weights, cast/sparsified per CodecConfig
+        encoded, header = self.codec.encode(self.model.get_parameters(), reference=parameters)
+        num_samples = len(self.train_loader.dataset)
+        metrics = {"token": self.token, "codec": header, "train_seconds": time.perf_counter() - started,
+                   "num_samples": num_samples, "loss": total_loss / max(steps, 1)}
+        return encoded, num_samples, metrics
 
     def evaluate(self, parameters, config):
         logger.info("Evaluating...")
+        if "codec" in config:
+            parameters = decode_update(parameters, config["codec"])
         self.model.set_parameters(parameters)
         self.model.eval()
-        loss = 0.0
-        correct = 0
-        total = 0
+        loss_sum = 0.0
+        tp = fp = fn = tn = 0
         
-        criterion = nn.CrossEntropyLoss()
+        criterion = nn.CrossEntropyLoss(reduction="sum")
         
         with torch.no_grad():
             for images, labels in self.val_loader:
-                images, labels = images.to(self.device), labels.to(self.device)
+                images, labels = self.prepare_batch(images, train=False), labels.to(self.device)
                 outputs = self.model(images)
-                loss += criterion(outputs, labels).item()
-                _, predicted = torch.max(outputs.data, 1)
-                total += labels.size(0)
-                correct += (predicted == labels).sum().item()
+                loss_sum += criterion(outputs, labels).item()
+                predicted_pos = outputs.argmax(dim=1) == POSITIVE_CLASS
+                actual_pos = labels == POSITIVE_CLASS
+                tp += (predicted_pos & actual_pos).sum().item()
+                fp += (predicted_pos & ~actual_pos).sum().item()
+                fn += (~predicted_pos & actual_pos).sum().item()
+                tn += (~predicted_pos & ~actual_pos).sum().item()
         
-        accuracy = correct / total
-        logger.info(f"Evaluation accuracy: {accuracy}")
-        return float(loss), len(self.val_loader.dataset), {"accuracy": float(accuracy), "token": self.token}
+        metrics = classification_metrics(loss_sum, tp, fp, fn, tn)
+        logger.info(f"Evaluation accuracy: {metrics['accuracy']}, F1: {metrics['f1_score']}")
+        return float(metrics["loss"]), metrics["num_samples"], {**metrics, "token": self.token}
 
 def start_client(client_id: str):
     load_dotenv()
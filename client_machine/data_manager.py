@@ -1,10 +1,34 @@
 import os
-from torch.utils.data import DataLoader, TensorDataset
+from torch.utils.data import DataLoader, Dataset
 from torchvision import datasets, transforms
-from src.common.transforms import get_robust_transforms
+from src.common.transforms import get_base_transforms, get_robust_transforms
+from src.common.config import FederatedConfig
+from client_machine.shard_cache import ShardDataset, build_shard
 import torch
 import logging
 
+
+class SyntheticDataset(Dataset):
+    """
+    Random images generated on access (seeded per index), so even large simulated
+    datasets cost no memory and every process sees the same samples.
+    """
+    def __init__(self, num_samples: int, img_size: int = 380, seed: int = 0):
+        self.num_samples = num_samples
+        self.img_size = img_size
+        self.seed = seed
+        generator = torch.Generator().manual_seed(seed)
+        self.targets = torch.randint(0, 2, (num_samples,), generator=generator).tolist()
+
+    def __len__(self):
+        return self.num_samples
+
+    def __getitem__(self, idx):
+        generator = torch.Generator().manual_seed(self.seed * 1_000_003 + idx)
+        image = torch.randn(3, self.img_size, self.img_size, generator=generator)
+        return image, self.targets[idx]
+
+
 class DataManager:
     """
     Manages data loading for the Federated Client.
@@ -13,13 +37,24 @@ class DataManager:
     def __init__(self, batch_size: int = 32, data_root: str = "data"):
         self.batch_size = batch_size
         self.data_root = data_root
+        self.config = FederatedConfig()
         
-        # Initialize robust transforms
-        self.transform = get_robust_transforms(img_size=380)
+        # Initialize robust transforms. With FL_BATCH_AUGMENT=1 (off by default) the loaders only
+        # resize and the augmentations run on collated batches in the training loop (batch_transforms.py)
+        if self.config.BATCH_AUGMENT:
+            self.transform = get_base_transforms(img_size=380)
+        else:
+            self.transform = get_robust_transforms(img_size=380)
         
     def load_data(self):
         """Loads real data from disk, or falls back to synthetic if not found."""
-        
+        train_ds, val_ds = self.load_datasets()
+        # Synthetic samples are generated in-process; workers only pay off for real images
+        num_workers = 0 if isinstance(train_ds, SyntheticDataset) else self.config.LOADER_WORKERS
+        return self.make_loaders(train_ds, val_ds, num_workers=num_workers)
+
+    def load_datasets(self, synthetic_train: int = 32, synthetic_val: int = 16, img_size: int = 380):
+        """(train, val) datasets: ImageFolder under data_root if present, otherwise synthetic."""
         # Check if real data exists
         train_dir = os.path.join(self.data_root, "train")
         val_dir = os.path.join(self.data_root, "val")
@@ -27,35 +62,40 @@ class DataManager:
         if os.path.exists(train_dir) and os.path.exists(val_dir):
             print(f"DataManager: ✅ Real dataset found at {self.data_root}")
             
-            train_ds = datasets.ImageFolder(root=train_dir, transform=self.transform)
-            val_ds = datasets.ImageFolder(root=val_dir, transform=self.transform)
+            train_ds = val_ds = None
+            if self.config.SHARD_CACHE:
+                train_ds, val_ds = self._load_shards(train_dir, val_dir, img_size)
+            if train_ds is None:
+                train_ds = datasets.ImageFolder(root=train_dir, transform=self.transform)
+                val_ds = datasets.ImageFolder(root=val_dir, transform=self.transform)
             
             print(f"DataManager: Loaded {len(train_ds)} training images and {len(val_ds)} validation images.")
-            
-            # Configure loaders
-            # num_workers=0 ensures compatibility across Windows/Linux without spawn issues
-            train_loader = DataLoader(train_ds, batch_size=self.batch_size, shuffle=True, num_workers=2, pin_memory=True)
-            val_loader = DataLoader(val_ds, batch_size=self.batch_size, shuffle=False)
-            
-            return train_loader, val_loader
+            return train_ds, val_ds
         else:
             print(f"DataManager: ⚠️ Real dataset NOT found at {self.data_root}. Using SYNTHETIC data.")
-            return self._generate_synthetic_data()
+            print("DataManager: Generating synthetic dataset...")
+            return SyntheticDataset(synthetic_train, img_size, seed=0), SyntheticDataset(synthetic_val, img_size, seed=1)
 
-    def _generate_synthetic_data(self):
-        print("DataManager: Generating synthetic dataset...")
-        # Train: 32 samples (3 channels, 380x380 for EfficientNet)
-        train_x = torch.randn(32, 3, 380, 380)
-        train_y = torch.randint(0, 2, (32,))
-        
-        # Val: 16 samples
-        val_x = torch.randn(16, 3, 380, 380)
-        val_y = torch.randint(0, 2, (16,))
-        
-        train_ds = TensorDataset(train_x, train_y)
-        val_ds = TensorDataset(val_x, val_y)
-        
-        train_loader = DataLoader(train_ds, batch_size=self.batch_size, shuffle=True)
-        val_loader = DataLoader(val_ds, batch_size=self.batch_size)
-        
+    def _load_shards(self, train_dir: str, val_dir: str, img_size: int):
+        """
+        Pre-decoded, pre-resized uint8 shards (see shard_cache.py), built on first use and whenever the
+        images change. Only used with FL_SHARD_CACHE=1. Falls back to plain ImageFolder if the cache
+        directory is not writable.
+        """
+        cache_root = self.config.SHARD_CACHE_DIR or os.path.join(self.data_root, ".shard_cache")
+        try:
+            train_shard = build_shard(train_dir, os.path.join(cache_root, f"train_{img_size}"), img_size)
+            val_shard = build_shard(val_dir, os.path.join(cache_root, f"val_{img_size}"), img_size)
+        except OSError as e:
+            logging.warning(f"DataManager: shard cache unavailable ({e}), decoding images every epoch")
+            return None, None
+        return ShardDataset(train_shard, transform=self.transform), ShardDataset(val_shard, transform=self.transform)
+
+    def make_loaders(self, train_ds: Dataset, val_ds: Dataset, num_workers: int = 0):
+        loader_args = {"num_workers": num_workers, "pin_memory": num_workers > 0 and torch.cuda.is_available()}
+        if num_workers > 0:
+            # Rounds are short and frequent: keep workers alive between epochs and stay ahead of the model
+            loader_args.update(persistent_workers=True, prefetch_factor=self.config.PREFETCH_FACTOR)
+        train_loader = DataLoader(train_ds, batch_size=self.batch_size, shuffle=True, **loader_args)
+        val_loader = DataLoader(val_ds, batch_size=self.batch_size, shuffle=False, **loader_args)
         return train_loader, val_loader
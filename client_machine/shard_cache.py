@@ -0,0 +1,98 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+import numpy as np
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import datasets
+
+MANIFEST = "manifest.json"
+SHARD_VERSION = 1
+
+
+def folder_fingerprint(folder: datasets.ImageFolder, img_size: int) -> str:
+    """Changes whenever a file is added, removed, replaced or touched, or the target size changes."""
+    digest = hashlib.sha1(f"{SHARD_VERSION}:{img_size}".encode())
+    for path, label in folder.samples:
+        st = os.stat(path)
+        digest.update(f"{os.path.relpath(path, folder.root)}\0{label}\0{st.st_size}\0{st.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def _load_resized(path: str, img_size: int) -> np.ndarray:
+    with Image.open(path) as img:
+        # Same resampling as transforms.Resize((img_size, img_size)) on a PIL image
+        return np.asarray(img.convert("RGB").resize((img_size, img_size), Image.BILINEAR), dtype=np.uint8)
+
+
+def build_shard(root: str, cache_dir: str, img_size: int = 380, workers: int = 8) -> str:
+    """
+    Decodes every image of the ImageFolder at `root` once, resizes it to img_size x img_size and
+    stores the batch as a (N, H, W, 3) uint8 .npy plus labels, for memory-mapped reading.
+    Rebuilt only when the folder's fingerprint changes; returns the shard directory.
+    """
+    folder = datasets.ImageFolder(root=root)
+    fingerprint = folder_fingerprint(folder, img_size)
+    manifest_path = os.path.join(cache_dir, MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding="utf-8") as f:
+            if json.load(f).get("fingerprint") == fingerprint:
+                return cache_dir
+
+    os.makedirs(cache_dir, exist_ok=True)
+    count = len(folder.samples)
+    print(f"ShardCache: Decoding {count} images from {root} into {cache_dir} ({img_size}x{img_size})...")
+    images_tmp = os.path.join(cache_dir, "images.npy.tmp")
+    images = np.lib.format.open_memmap(images_tmp, mode="w+", dtype=np.uint8, shape=(count, img_size, img_size, 3))
+    # PIL releases the GIL while decoding and resizing, so threads scale here
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, array in enumerate(pool.map(lambda s: _load_resized(s[0], img_size), folder.samples)):
+            images[i] = array
+    images.flush()
+    del images
+    labels = np.array([label for _, label in folder.samples], dtype=np.int64)
+    np.save(os.path.join(cache_dir, "labels.npy"), labels)
+    os.replace(images_tmp, os.path.join(cache_dir, "images.npy"))
+    # Written last: a shard without a matching manifest is never used
+    with open(manifest_path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"fingerprint": fingerprint, "count": count, "img_size": img_size, "classes": folder.classes}, f)
+    os.replace(manifest_path + ".tmp", manifest_path)
+    return cache_dir
+
+
+class ShardDataset(Dataset):
+    """
+    ImageFolder-compatible dataset over a shard from `build_shard`. The image array is memory-mapped
+    lazily in each process (DataLoader workers included), so no decoding or resizing happens per epoch;
+    `transform` receives the already resized PIL image.
+    """
+
+    def __init__(self, shard_dir: str, transform: Optional[Callable] = None):
+        self.shard_dir = shard_dir
+        self.transform = transform
+        with open(os.path.join(shard_dir, MANIFEST), encoding="utf-8") as f:
+            manifest = json.load(f)
+        self.classes = manifest["classes"]
+        self.class_to_idx = {name: i for i, name in enumerate(self.classes)}
+        self.targets = np.load(os.path.join(shard_dir, "labels.npy")).tolist()
+        self._images = None
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        if self._images is None:
+            self._images = np.load(os.path.join(self.shard_dir, "images.npy"), mmap_mode="r")
+        img = Image.fromarray(np.asarray(self._images[idx]))
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, self.targets[idx]
+
+    def __getstate__(self):
+        # Workers map the file themselves instead of receiving a pickled copy
+        state = self.__dict__.copy()
+        state["_images"] = None
+        return state
@@ -1,21 +1,65 @@
 import os
 import time
+import json
+import struct
 import cv2
 import numpy as np
 import requests
 import threading
+import queue
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image, ImageTk
 import mss
+try:
+    from websockets.sync.client import connect as ws_connect
+except ImportError:  # websockets < 11 has no threaded client; live guard falls back to HTTP batches
+    ws_connect = None
 
 # --- Configuration ---
 SERVER_URL = "http://localhost:8000/analyze"
+BATCH_ENDPOINT = "/analyze-batch"  # Face crops of one tick go in a single request
+STREAM_ENDPOINT = "/ws/guardian"   # Persistent channel; the server keeps per-track temporal state
+LIVE_TRANSPORT = "websocket"       # "websocket" streams crops to STREAM_ENDPOINT, "http" posts batches
 CONFIDENCE_THRESHOLD = 0.90
 TEMPORAL_BUFFER_SIZE = 5  # Analyze last N frames
 SCAN_INTERVAL = 0.5       # Seconds between screen scans
 
+# --- Frame Gate Configuration ---
+GATE_THUMB_SIZE = (64, 36)  # Downsampled grayscale size used for change detection
+GATE_PIXEL_DELTA = 12       # Gray level difference (0-255) that marks a thumbnail pixel as changed
+GATE_CHANGED_RATIO = 0.005  # Fraction of changed thumbnail pixels that triggers an upload
+GATE_MAX_IDLE = 10.0        # Re-send an unchanged screen at least this often (seconds)
+
+# --- Face Region Configuration ---
+FACE_DETECT_WIDTH = 640     # Full screen is downscaled to this width for face detection
+FACE_DETECT_INTERVAL = 1.0  # Seconds between full-screen detections; tracked regions are grabbed in between
+FACE_MIN_SIZE = 20          # Minimum face size in the downscaled detection image (pixels)
+FACE_PADDING = 0.3          # Context margin around a face box, relative to its size
+FACE_CROP_MAX_SIDE = 512    # Crops larger than this are downscaled before upload
+TRACK_IOU_MATCH = 0.3       # Minimum overlap for a detection to continue an existing track
+TRACK_SMOOTHING = 0.5       # Weight of the new detection when updating a track's box
+TRACK_MAX_MISSES = 3        # Detections a track may miss before it is dropped
+
+# --- Pipeline Configuration ---
+UPLOAD_IN_FLIGHT = 2        # Concurrent uploads, each worker on its own keep-alive session
+UPLOAD_TIMEOUT = 2.0        # Seconds
+UPLOAD_RETRIES = 1          # Times a failed batch is re-queued before its faces wait for the next capture
+ENCODE_QUEUE_SIZE = 2       # Captured ticks waiting for encoding; the oldest is dropped when full
+MAX_SCAN_INTERVAL = 4.0     # Slowest capture pace when the server is slow or failing (seconds)
+LATENCY_FACTOR = 1.5        # Capture interval follows smoothed server latency times this factor
+LATENCY_SMOOTHING = 0.3     # EWMA weight of the newest latency sample
+
+# --- Video Scan Configuration ---
+VIDEO_SAMPLE_INTERVAL = 1.0  # Seconds of video between analyzed frames
+VIDEO_FALLBACK_FPS = 25.0    # Used when the container reports no usable frame rate
+VIDEO_WORKERS = max(1, min(4, (os.cpu_count() or 2) // 2))  # Parallel decoders, one segment each
+VIDEO_MIN_SEGMENT = 60.0     # Seconds; shorter recordings are not split across workers
+VIDEO_SEEK_GAP = 90          # Frames; larger gaps seek to the keyframe instead of grab()-ing through
+VIDEO_BATCH_SIZE = 16        # Face crops per analysis request (server MAX_BATCH_FILES)
+
 # --- Theme Configuration ---
 COLOR_BG = "#1e1e1e"
 COLOR_FG = "#ffffff"
@@ -58,6 +102,485 @@ class ToastNotification:
         except:
             pass
 
+class FrameGate:
+    """Skips frames that look the same as the last uploaded one.
+
+    Each capture is area-downsampled to a tiny grayscale thumbnail straight from the
+    BGRA buffer and compared with the thumbnail of the last frame that was sent.
+    Only frames where enough thumbnail pixels changed go to the server, so a static
+    screen costs one request every GATE_MAX_IDLE seconds instead of two per second.
+    """
+    def __init__(self, thumb_size=GATE_THUMB_SIZE, pixel_delta=GATE_PIXEL_DELTA,
+                 changed_ratio=GATE_CHANGED_RATIO, max_idle=GATE_MAX_IDLE):
+        self.thumb_size = thumb_size
+        self.pixel_delta = pixel_delta
+        self.changed_ratio = changed_ratio
+        self.max_idle = max_idle
+        self.reset()
+
+    def reset(self):
+        self.last_thumb = None
+        self.last_sent = 0.0
+
+    def thumbnail(self, screenshot):
+        w, h = screenshot.size
+        frame = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(h, w, 4)
+        small = cv2.resize(frame, self.thumb_size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGRA2GRAY)
+
+    def should_send(self, thumb, now=None):
+        now = time.monotonic() if now is None else now
+        if self.last_thumb is None or now - self.last_sent >= self.max_idle:
+            changed = True
+        else:
+            diff = cv2.absdiff(thumb, self.last_thumb)
+            changed = np.count_nonzero(diff > self.pixel_delta) >= self.changed_ratio * diff.size
+        if changed:
+            self.last_thumb = thumb
+            self.last_sent = now
+        return changed
+
+def padded_box(box, width, height, padding=FACE_PADDING):
+    """(left, top, right, bottom) of a face box grown by `padding`, clamped to the image."""
+    x, y, w, h = box
+    pad_w, pad_h = w * padding, h * padding
+    left = max(0, int(x - pad_w))
+    top = max(0, int(y - pad_h))
+    right = min(width, int(x + w + pad_w))
+    bottom = min(height, int(y + h + pad_h))
+    return left, top, max(left + 1, right), max(top + 1, bottom)
+
+def detect_faces(cascade, frame, detect_width=FACE_DETECT_WIDTH):
+    """Haar face boxes (x, y, w, h) in `frame` coordinates, found on a downscaled grayscale copy."""
+    h, w = frame.shape[:2]
+    scale = min(1.0, detect_width / w)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    gray = cv2.cvtColor(frame, cv2.COLOR_BGRA2GRAY if frame.shape[2] == 4 else cv2.COLOR_BGR2GRAY)
+    faces = cascade.detectMultiScale(gray, 1.1, 4, minSize=(FACE_MIN_SIZE, FACE_MIN_SIZE))
+    return [tuple(v / scale for v in face) for face in faces]
+
+def box_iou(a, b):
+    ax, ay, aw, ah = a
+    bx, by, bw, bh = b
+    iw = max(0, min(ax + aw, bx + bw) - max(ax, bx))
+    ih = max(0, min(ay + ah, by + bh) - max(ay, by))
+    inter = iw * ih
+    union = aw * ah + bw * bh - inter
+    return inter / union if union else 0.0
+
+class FaceTrack:
+    """A face region followed across detections, with its own change gate and alert history."""
+    def __init__(self, track_id, box):
+        self.id = track_id
+        self.box = box  # (x, y, w, h) in monitor coordinates
+        self.misses = 0
+        self.gate = FrameGate(thumb_size=(32, 32), changed_ratio=0.02)
+        self.history = deque(maxlen=TEMPORAL_BUFFER_SIZE)
+
+    def region(self, monitor, padding=FACE_PADDING):
+        """Padded mss grab region for this face, clamped to the monitor."""
+        left, top, right, bottom = padded_box(self.box, monitor["width"], monitor["height"], padding)
+        return {"left": monitor["left"] + left, "top": monitor["top"] + top,
+                "width": right - left, "height": bottom - top}
+
+class FaceTracker:
+    """Finds faces on a downscaled full-screen capture and keeps their regions between detections.
+
+    Detection is a Haar cascade on a FACE_DETECT_WIDTH-wide grayscale copy of the screen.
+    Boxes are scaled back to monitor coordinates and greedily matched to existing tracks by IoU,
+    so a video-call tile keeps the same track (and gate/history) while the layout is stable.
+    """
+    def __init__(self, detect_width=FACE_DETECT_WIDTH, detect_interval=FACE_DETECT_INTERVAL,
+                 max_misses=TRACK_MAX_MISSES, cascade=None):
+        self.detect_width = detect_width
+        self.detect_interval = detect_interval
+        self.max_misses = max_misses
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        self.cascade = cascade
+        self.reset()
+
+    def reset(self):
+        self.tracks = []
+        self.last_detect = 0.0
+        self._next_id = 0
+
+    def due(self, now):
+        return now - self.last_detect >= self.detect_interval
+
+    def detect(self, screenshot):
+        w, h = screenshot.size
+        frame = np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(h, w, 4)
+        return detect_faces(self.cascade, frame, self.detect_width)
+
+    def update(self, boxes, now):
+        self.last_detect = now
+        unmatched = list(self.tracks)
+        for box in sorted(boxes, key=lambda b: b[2] * b[3], reverse=True):
+            best = max(unmatched, key=lambda t: box_iou(t.box, box), default=None)
+            if best is not None and box_iou(best.box, box) >= TRACK_IOU_MATCH:
+                unmatched.remove(best)
+                best.box = tuple(TRACK_SMOOTHING * n + (1 - TRACK_SMOOTHING) * o for n, o in zip(box, best.box))
+                best.misses = 0
+            else:
+                self.tracks.append(FaceTrack(self._next_id, box))
+                self._next_id += 1
+        for track in unmatched:
+            track.misses += 1
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+def encode_image(image, max_side=FACE_CROP_MAX_SIDE):
+    """JPEG bytes for a BGR or BGRA image, downscaled to `max_side` if larger."""
+    h, w = image.shape[:2]
+    scale = max_side / max(w, h)
+    if scale < 1:
+        image = cv2.resize(image, (int(w * scale), int(h * scale)), interpolation=cv2.INTER_AREA)
+    # The JPEG encoder drops the alpha channel itself, no separate BGRA -> BGR copy
+    _, encoded = cv2.imencode('.jpg', image)
+    return encoded.tobytes()
+
+def encode_crop(screenshot, max_side=FACE_CROP_MAX_SIDE):
+    """JPEG bytes for a region grab, straight from its BGRA buffer."""
+    w, h = screenshot.size
+    return encode_image(np.frombuffer(screenshot.raw, dtype=np.uint8).reshape(h, w, 4), max_side)
+
+# Binary stream frame: sequence number (uint32), track id (uint16), then the JPEG crop.
+# Must match FRAME_HEADER in backend/app/utils/live_guard.py.
+FRAME_HEADER = struct.Struct(">IH")
+
+def stream_url(url):
+    """ws(s):// URL of the streaming channel on the same server as `url`."""
+    base = url.rsplit("/", 1)[0] + STREAM_ENDPOINT
+    return "ws" + base[len("http"):] if base.startswith("http") else base
+
+def pack_frame(seq, track_id, jpeg):
+    return FRAME_HEADER.pack(seq & 0xFFFFFFFF, track_id & 0xFFFF) + jpeg
+
+def post_face_batch(session, url, crops, timeout=UPLOAD_TIMEOUT):
+    """Sends face crops in a single request; returns a result per crop."""
+    files = [('files', (f'face_{i}.jpg', jpeg, 'image/jpeg')) for i, jpeg in enumerate(crops)]
+    response = session.post(url, files=files, timeout=timeout)
+    response.raise_for_status()
+    return [{"label": r.get("result"), "confidence": r.get("score", 0)/100}
+            for r in response.json().get("results", [])]
+
+class AdaptivePacer:
+    """Capture interval that follows server latency and backs off on failed uploads."""
+    def __init__(self, base=SCAN_INTERVAL, maximum=MAX_SCAN_INTERVAL):
+        self.base = base
+        self.maximum = maximum
+        self.latency = None
+        self.interval = base
+        self.lock = threading.Lock()
+
+    def observe(self, latency):
+        with self.lock:
+            if self.latency is None:
+                self.latency = latency
+            else:
+                self.latency = LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * self.latency
+            self.interval = min(self.maximum, max(self.base, self.latency * LATENCY_FACTOR))
+
+    def failed(self):
+        with self.lock:
+            self.interval = min(self.maximum, self.interval * 2)
+
+class GuardPipeline:
+    """Live guard as three stages connected by bounded queues.
+
+    capture (mss, face tracking, gates) -> encode (BGRA -> JPEG) -> upload workers
+
+    The capture thread never waits on the network. When encoding falls behind, the oldest
+    captured tick is dropped, and at most `in_flight` uploads are outstanding at once.
+    A failed batch is re-queued up to `retries` times if the upload window has room;
+    after that its faces are re-captured on the next tick.
+
+    With the websocket transport a single stream worker replaces the HTTP upload workers:
+    every crop goes out as one framed binary message and the server pushes back a verdict
+    whenever a track's smoothed state changes (see backend /ws/guardian).
+    """
+    def __init__(self, app, url, in_flight=UPLOAD_IN_FLIGHT, retries=UPLOAD_RETRIES, face_tracker=None,
+                 transport=LIVE_TRANSPORT):
+        self.app = app
+        self.url = url.rsplit("/", 1)[0] + BATCH_ENDPOINT
+        self.stream_url = stream_url(url)
+        if transport == "websocket" and ws_connect is None:
+            print("[GUARD] websockets client not available, uploading over HTTP")
+            transport = "http"
+        self.transport = transport
+        self.in_flight = in_flight
+        self.retries = retries
+        self.pacer = AdaptivePacer()
+        self.frame_gate = FrameGate()
+        self.face_tracker = face_tracker or FaceTracker()
+        self.encode_queue = queue.Queue(maxsize=ENCODE_QUEUE_SIZE)
+        self.upload_queue = queue.Queue(maxsize=in_flight)
+        self.running = False
+        self.failures = 0
+
+    def start(self):
+        self.running = True
+        threads = [threading.Thread(target=self.capture_loop, daemon=True),
+                   threading.Thread(target=self.encode_loop, daemon=True)]
+        if self.transport == "websocket":
+            threads.append(threading.Thread(target=self.stream_loop, daemon=True))
+        else:
+            threads += [threading.Thread(target=self.upload_loop, daemon=True) for _ in range(self.in_flight)]
+        for t in threads:
+            t.start()
+
+    def stop(self):
+        # Stages shut down in order once the capture loop sees this
+        self.running = False
+
+    def offer(self, item):
+        """Non-blocking put that replaces the oldest queued tick when encoding lags."""
+        while True:
+            try:
+                self.encode_queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    for track, _ in self.encode_queue.get_nowait():
+                        track.gate.reset()
+                except queue.Empty:
+                    pass
+
+    def capture_tick(self, sct, monitor, now):
+        # Re-detect faces periodically, and only when the screen actually changed
+        if self.face_tracker.due(now):
+            screenshot = sct.grab(monitor)
+            if self.frame_gate.should_send(self.frame_gate.thumbnail(screenshot)):
+                self.face_tracker.update(self.face_tracker.detect(screenshot), now)
+            else:
+                self.face_tracker.last_detect = now
+        
+        # Grab only tracked face regions; unchanged faces are skipped
+        shots = []
+        for track in self.face_tracker.tracks:
+            crop = sct.grab(track.region(monitor))
+            if track.gate.should_send(track.gate.thumbnail(crop)):
+                shots.append((track, crop))
+        return shots
+
+    def capture_loop(self):
+        try:
+            with mss.mss() as sct:
+                monitor = sct.monitors[1]
+                while self.running:
+                    started = time.monotonic()
+                    try:
+                        shots = self.capture_tick(sct, monitor, started)
+                        if shots:
+                            self.offer(shots)
+                    except Exception as e:
+                        print(f"[GUARD] Capture error: {e}")
+                    time.sleep(max(0.0, self.pacer.interval - (time.monotonic() - started)))
+        finally:
+            self.encode_queue.put(None)
+
+    def encode_loop(self):
+        while True:
+            shots = self.encode_queue.get()
+            if shots is None:
+                break
+            try:
+                batch = [(track, encode_crop(crop)) for track, crop in shots]
+            except Exception as e:
+                print(f"[GUARD] Encode error: {e}")
+                continue
+            # Blocks while the upload window is full; capture keeps running and drops stale ticks
+            self.upload_queue.put((batch, 0))
+        for _ in range(self.in_flight):
+            self.upload_queue.put(None)
+
+    def retry(self, batch, attempt):
+        """Re-queues a failed batch while retries remain; otherwise lets its faces be sent on the next tick."""
+        if self.running and attempt < self.retries:
+            try:
+                self.upload_queue.put_nowait((batch, attempt + 1))
+                return True
+            except queue.Full:
+                pass
+        for track, _ in batch:
+            track.gate.reset()
+        return False
+
+    def upload_loop(self):
+        # One keep-alive connection per worker instead of a new connection per frame
+        session = requests.Session()
+        try:
+            while True:
+                item = self.upload_queue.get()
+                if item is None:
+                    break
+                batch, attempt = item
+                started = time.monotonic()
+                try:
+                    results = post_face_batch(session, self.url, [jpeg for _, jpeg in batch])
+                except Exception as e:
+                    self.failures += 1
+                    self.pacer.failed()
+                    print(f"[GUARD] Upload failed ({self.failures} so far), next scan in {self.pacer.interval:.1f}s: {e}")
+                    self.retry(batch, attempt)
+                    continue
+                self.pacer.observe(time.monotonic() - started)
+                if not self.running:
+                    continue
+                for (track, _), result in zip(batch, results):
+                    self.app.process_live_result(result, track.history)
+        finally:
+            session.close()
+
+    def stream_loop(self):
+        """Sends encoded crops over one WebSocket, reconnecting with the pacer's backoff on errors."""
+        seq = 0
+        while True:
+            batch = []
+            try:
+                with ws_connect(self.stream_url, open_timeout=UPLOAD_TIMEOUT) as ws:
+                    threading.Thread(target=self.receive_loop, args=(ws,), daemon=True).start()
+                    while True:
+                        item = self.upload_queue.get()
+                        if item is None:
+                            return
+                        batch, _ = item
+                        for track, jpeg in batch:
+                            seq += 1
+                            ws.send(pack_frame(seq, track.id, jpeg))
+                        batch = []
+            except Exception as e:
+                self.failures += 1
+                self.pacer.failed()
+                print(f"[GUARD] Stream failed ({self.failures} so far), reconnecting in {self.pacer.interval:.1f}s: {e}")
+                for track, _ in batch:
+                    track.gate.reset()
+                if not self.running:
+                    return
+                time.sleep(self.pacer.interval)
+
+    def receive_loop(self, ws):
+        try:
+            for message in ws:
+                event = json.loads(message)
+                if event.get("type") == "verdict":
+                    if self.running:
+                        self.app.process_verdict(event)
+                elif event.get("type") == "error":
+                    print(f"[GUARD] Server: {event.get('detail')}")
+        except Exception:
+            pass  # The sender sees the closed connection and reconnects
+
+class VideoScanner:
+    """Samples a recorded video about once per VIDEO_SAMPLE_INTERVAL and analyzes the faces in it.
+
+    Only sampled frames are decoded into images: short gaps are skipped with grab() (no
+    retrieve/colour conversion), long gaps seek straight to the nearest keyframe. Long
+    recordings are split into time segments that a pool of workers decodes in parallel,
+    each with its own capture, face detector and keep-alive session. The largest face of
+    every sampled frame is sent in batches of VIDEO_BATCH_SIZE crops.
+    """
+    def __init__(self, url, workers=VIDEO_WORKERS, sample_interval=VIDEO_SAMPLE_INTERVAL,
+                 batch_size=VIDEO_BATCH_SIZE):
+        self.url = url.rsplit("/", 1)[0] + BATCH_ENDPOINT
+        self.workers = workers
+        self.sample_interval = sample_interval
+        self.batch_size = batch_size
+
+    @staticmethod
+    def probe(path):
+        cap = cv2.VideoCapture(path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"Could not open video: {path}")
+            fps = cap.get(cv2.CAP_PROP_FPS)
+            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        finally:
+            cap.release()
+        # Some containers report 0, NaN or absurd values
+        if not fps or fps != fps or fps <= 0 or fps > 1000:
+            fps = VIDEO_FALLBACK_FPS
+        return fps, frame_count
+
+    def segments(self, fps, frame_count):
+        """(start, stop) frame ranges per worker; stop is None when the length is unknown."""
+        if frame_count <= 0:
+            return [(0, None)]
+        parts = max(1, min(self.workers, int(frame_count / (fps * VIDEO_MIN_SEGMENT))))
+        bounds = [round(frame_count * i / parts) for i in range(parts + 1)]
+        return list(zip(bounds[:-1], bounds[1:]))
+
+    @staticmethod
+    def sample_frames(path, start, stop, step):
+        cap = cv2.VideoCapture(path)
+        try:
+            pos = 0
+            target = start
+            while stop is None or target < stop:
+                gap = target - pos
+                if gap > VIDEO_SEEK_GAP:
+                    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+                    pos = target
+                else:
+                    for _ in range(gap):
+                        if not cap.grab():
+                            return
+                    pos = target
+                ok, frame = cap.read()
+                if not ok:
+                    return
+                pos += 1
+                yield frame
+                target += step
+        finally:
+            cap.release()
+
+    def scan_segment(self, path, start, stop, step):
+        cascade = cv2.CascadeClassifier(cv2.data.haarcascades + 'haarcascade_frontalface_default.xml')
+        session = requests.Session()
+        counts = {"analyzed": 0, "fake": 0}
+        crops = []
+
+        def flush():
+            try:
+                results = post_face_batch(session, self.url, crops, timeout=UPLOAD_TIMEOUT * 5)
+            except Exception as e:
+                print(f"[SCAN] Batch of {len(crops)} frames failed: {e}")
+                results = []
+            counts["analyzed"] += len(results)
+            counts["fake"] += sum(1 for r in results if r["label"] == "fake")
+            crops.clear()
+
+        try:
+            for frame in self.sample_frames(path, start, stop, step):
+                faces = detect_faces(cascade, frame)
+                if not faces:
+                    continue
+                h, w = frame.shape[:2]
+                left, top, right, bottom = padded_box(max(faces, key=lambda b: b[2] * b[3]), w, h)
+                crops.append(encode_image(frame[top:bottom, left:right]))
+                if len(crops) >= self.batch_size:
+                    flush()
+            if crops:
+                flush()
+        finally:
+            session.close()
+        print(f"[SCAN] Frames {start}-{stop if stop is not None else 'end'}: "
+              f"{counts['fake']}/{counts['analyzed']} fake")
+        return counts
+
+    def scan(self, path):
+        fps, frame_count = self.probe(path)
+        step = max(1, round(fps * self.sample_interval))
+        segments = self.segments(fps, frame_count)
+        with ThreadPoolExecutor(max_workers=len(segments)) as pool:
+            parts = list(pool.map(lambda seg: self.scan_segment(path, seg[0], seg[1], step), segments))
+        return {
+            "analyzed": sum(p["analyzed"] for p in parts),
+            "fake": sum(p["fake"] for p in parts),
+        }
+
 class DeepfakeGuardianApp:
     def __init__(self, root):
         self.root = root
@@ -69,6 +592,7 @@ class DeepfakeGuardianApp:
         self.server_url = tk.StringVar(value=SERVER_URL)
         self.is_guard_active = False
         self.history = deque(maxlen=TEMPORAL_BUFFER_SIZE)
+        self.pipeline = None
         
         self.setup_ui()
         
@@ -125,6 +649,9 @@ class DeepfakeGuardianApp:
         if self.is_guard_active:
             # STOP
             self.is_guard_active = False
+            if self.pipeline is not None:
+                self.pipeline.stop()
+                self.pipeline = None
             self.guard_btn.config(text="🛡️ START LIVE GUARD", bg=COLOR_ACCENT)
             self.status_label.config(text="System: IDLE", foreground="#888888")
         else:
@@ -133,43 +660,21 @@ class DeepfakeGuardianApp:
             self.guard_btn.config(text="🛑 STOP LIVE GUARD", bg=COLOR_DANGER)
             self.status_label.config(text="System: MONITORING (Zoom/Teams/Screen)", foreground=COLOR_SUCCESS)
             
-            # Start Monitor Thread
-            t = threading.Thread(target=self.guard_loop, daemon=True)
-            t.start()
+            # Start capture/encode/upload stages
+            self.pipeline = GuardPipeline(self, self.server_url.get())
+            self.pipeline.start()
             
-    def guard_loop(self):
-        with mss.mss() as sct:
-            monitor = sct.monitors[1]
-            while self.is_guard_active:
-                try:
-                    # Capture
-                    screenshot = sct.grab(monitor)
-                    img = Image.frombytes("RGB", screenshot.size, screenshot.bgra, "raw", "BGRX")
-                    frame = np.array(img)
-                    frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
-                    
-                    # Analyze
-                    result = self.analyze_frame(frame)
-                    
-                    # Alert Logic
-                    if result:
-                        self.process_live_result(result)
-                        
-                    time.sleep(SCAN_INTERVAL)
-                except Exception as e:
-                    print(f"Error: {e}")
-                    time.sleep(1)
-
-    def process_live_result(self, result):
+    def process_live_result(self, result, history=None):
+        history = self.history if history is None else history
         label = result.get("label", "unknown")
         # Temporal smoothing
         if label == "fake":
-            self.history.append(1)
+            history.append(1)
         elif label == "real":
-            self.history.append(0)
+            history.append(0)
             
         # Check alarm
-        if sum(self.history) >= (self.history.maxlen * 0.8): # 80% confidence
+        if sum(history) >= (history.maxlen * 0.8): # 80% confidence
              # Only show toast if not already showing recently? 
              # For now, simplistic check
              self.root.after(0, lambda: ToastNotification(
@@ -177,7 +682,16 @@ class DeepfakeGuardianApp:
                  "Potential manipulation detected on screen!", 
                  COLOR_DANGER
              ))
-             self.history.clear() # Reset buffer to avoid spam
+             history.clear() # Reset buffer to avoid spam
+
+    def process_verdict(self, event):
+        """Verdict pushed over the stream; the server already smoothed it and sends only state changes."""
+        if event.get("state") == "alarm":
+            self.root.after(0, lambda: ToastNotification(
+                "⚠️ DEEPFAKE DETECTED",
+                "Potential manipulation detected on screen!",
+                COLOR_DANGER
+            ))
 
     def scan_video_file(self):
         filepath = filedialog.askopenfilename(filetypes=[("Video Files", "*.mp4 *.avi *.mov")])
@@ -190,51 +704,26 @@ class DeepfakeGuardianApp:
     def _run_scan(self, filepath):
         self.root.after(0, lambda: messagebox.showinfo("Scanning", "Video analysis started. Check console for details."))
         
-        cap = cv2.VideoCapture(filepath)
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        fake_frames = 0
-        analyzed_frames = 0
-        
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret: break
-            
-            # Sample 1 fps
-            current_frame = cap.get(cv2.CAP_PROP_POS_FRAMES)
-            if current_frame % int(fps) != 0: continue
-            
-            result = self.analyze_frame(frame)
-            analyzed_frames += 1
-            
-            if result and result.get("label") == "fake":
-                fake_frames += 1
-                
-        cap.release()
+        try:
+            counts = VideoScanner(self.server_url.get()).scan(filepath)
+        except Exception as e:
+            error = str(e)
+            print(f"[SCAN] Error: {error}")
+            self.root.after(0, lambda: messagebox.showerror("Scan Failed", error))
+            return
+        fake_frames = counts["fake"]
+        analyzed_frames = counts["analyzed"]
         
         ratio = fake_frames / analyzed_frames if analyzed_frames > 0 else 0
         is_fake = ratio > 0.3
         
         msg = f"Analysis Complete.\nScore: {ratio:.1%} Probability of Deepfake."
+        msg += f"\n({analyzed_frames} sampled frames with a face analyzed)"
         title = "🚨 DETECTED!" if is_fake else "✅ CLEAN"
         icon = "warning" if is_fake else "info"
         
         self.root.after(0, lambda: messagebox.showinfo(title, msg, icon=icon))
 
-    def analyze_frame(self, frame_cv2):
-        try:
-            _, img_encoded = cv2.imencode('.jpg', frame_cv2)
-            files = {'file': ('frame.jpg', img_encoded.tobytes(), 'image/jpeg')}
-            response = requests.post(self.server_url.get(), files=files, timeout=2)
-            
-            if response.status_code == 200:
-                data = response.json()
-                return {"label": data.get("result"), "confidence": data.get("score", 0)/100}
-        except:
-            pass
-        return None
-
 if __name__ == "__main__":
     root = tk.Tk()
     app = DeepfakeGuardianApp(root)
@@ -1,10 +1,218 @@
+"""
+Federated learning simulation.
+
+By default N virtual clients run inside a small pool of worker processes: each worker holds one
+FederatedDeepfakeDetector and a DeepFakeClient per virtual client it serves, all reading their
+partition (IID or Dirichlet non-IID) of one dataset that is loaded once and shared with the workers.
+The unchanged DeepFakeServer strategy (or FedBuffServer with FL_AGGREGATION_MODE=fedbuff) drives
+them through Flower's own server loop, so round timing is comparable with a real deployment.
+
+    python run_simulation.py --clients 100 --workers 4 --partition dirichlet --alpha 0.3 --rounds 5
+    python run_simulation.py --processes      # old behaviour: server + 2 clients over gRPC
+"""
+import argparse
+import concurrent.futures
+import dataclasses
+import multiprocessing
 import subprocess
+import threading
 import time
 import sys
 import os
 import signal
 
-def run_simulation():
+import flwr as fl
+from flwr.server.client_proxy import ClientProxy
+from dotenv import load_dotenv
+
+# State of one simulation worker process (set by _init_worker)
+_worker = {}
+
+
+def _init_worker(train_ds, val_ds, train_parts, val_parts, secret_key, codec_config, threads):
+    import torch
+    from src.common.model import FederatedDeepfakeDetector
+    torch.set_num_threads(threads)
+    _worker.update(
+        model=FederatedDeepfakeDetector(),
+        train_ds=train_ds, val_ds=val_ds,
+        train_parts=train_parts, val_parts=val_parts,
+        secret_key=secret_key, codec_config=codec_config,
+        clients={}, round=(None, None),
+    )
+
+
+def _virtual_client(cid: str):
+    """DeepFakeClient for a virtual client, created on first use; the model is the worker's single instance."""
+    clients = _worker["clients"]
+    if cid not in clients:
+        from torch.utils.data import Subset
+        from client_machine.client import DeepFakeClient
+        from client_machine.data_manager import DataManager
+        from src.common.config import FederatedConfig
+        i = int(cid)
+        loaders = DataManager(batch_size=FederatedConfig().BATCH_SIZE).make_loaders(
+            Subset(_worker["train_ds"], _worker["train_parts"][i].tolist()),
+            Subset(_worker["val_ds"], _worker["val_parts"][i].tolist()),
+        )
+        clients[cid] = DeepFakeClient(f"client_{i + 1}", _worker["secret_key"], model=_worker["model"],
+                                      loaders=loaders, codec_config=_worker["codec_config"])
+    return clients[cid]
+
+
+def _worker_call(method: str, cid: str, key: int, arrays, config):
+    # Global weights are shipped once per worker and version; later tasks for the same version reuse them
+    if arrays is not None:
+        _worker["round"] = (key, arrays)
+    cached_key, arrays = _worker["round"]
+    if cached_key != key:
+        raise RuntimeError(f"Worker has weights version {cached_key}, task needs {key}")
+    return getattr(_virtual_client(cid), method)(arrays, config)
+
+
+def _worker_parameters(cid: str, config):
+    # Current weights of the worker's shared model, as last loaded by fit/evaluate
+    return _virtual_client(cid).get_parameters(config)
+
+
+class WorkerPool:
+    """
+    `num_workers` single-process executors. Virtual client i always runs on worker i % num_workers,
+    so its DeepFakeClient (codec residuals included) lives in one place across rounds, and tasks
+    on a worker run in submission order, which lets the global weights be sent only once per version.
+    """
+
+    def __init__(self, num_workers: int, initargs):
+        methods = multiprocessing.get_all_start_methods()
+        # fork shares the loaded dataset and partitions copy-on-write instead of pickling them
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        self.executors = [
+            concurrent.futures.ProcessPoolExecutor(1, mp_context=context, initializer=_init_worker, initargs=initargs)
+            for _ in range(num_workers)
+        ]
+        self.locks = [threading.Lock() for _ in self.executors]
+        self.sent = [None] * num_workers
+        self._broadcast_lock = threading.Lock()
+        self._broadcast = (None, None, None)  # (Parameters object, key, ndarrays)
+        self._key = 0
+
+    def _arrays(self, parameters: fl.common.Parameters):
+        with self._broadcast_lock:
+            if self._broadcast[0] is not parameters:
+                self._key += 1
+                self._broadcast = (parameters, self._key, fl.common.parameters_to_ndarrays(parameters))
+            return self._broadcast[1], self._broadcast[2]
+
+    def submit(self, cid: str, method: str, parameters: fl.common.Parameters, config):
+        w = int(cid) % len(self.executors)
+        key, arrays = self._arrays(parameters)
+        with self.locks[w]:
+            payload = None if self.sent[w] == key else arrays
+            self.sent[w] = key
+            return self.executors[w].submit(_worker_call, method, cid, key, payload, config)
+
+    def parameters(self, cid: str, config):
+        w = int(cid) % len(self.executors)
+        with self.locks[w]:
+            return self.executors[w].submit(_worker_parameters, cid, config)
+
+    def shutdown(self):
+        for executor in self.executors:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+class VirtualClientProxy(ClientProxy):
+    """ClientProxy whose fit/evaluate run on the client's worker process instead of over gRPC."""
+
+    def __init__(self, cid: str, pool: WorkerPool):
+        super().__init__(cid)
+        self.pool = pool
+
+    def fit(self, ins, timeout, group_id):
+        arrays, num_examples, metrics = self.pool.submit(self.cid, "fit", ins.parameters, ins.config).result(timeout)
+        status = fl.common.Status(fl.common.Code.OK, "Success")
+        return fl.common.FitRes(status, fl.common.ndarrays_to_parameters(arrays), num_examples, metrics)
+
+    def evaluate(self, ins, timeout, group_id):
+        loss, num_examples, metrics = self.pool.submit(self.cid, "evaluate", ins.parameters, ins.config).result(timeout)
+        return fl.common.EvaluateRes(fl.common.Status(fl.common.Code.OK, "Success"), loss, num_examples, metrics)
+
+    def get_properties(self, ins, timeout, group_id):
+        return fl.common.GetPropertiesRes(fl.common.Status(fl.common.Code.OK, "Success"), {})
+
+    def get_parameters(self, ins, timeout, group_id):
+        arrays = self.pool.parameters(self.cid, ins.config).result(timeout)
+        status = fl.common.Status(fl.common.Code.OK, "Success")
+        return fl.common.GetParametersRes(status, fl.common.ndarrays_to_parameters(arrays))
+
+    def reconnect(self, ins, timeout, group_id):
+        return fl.common.DisconnectRes(reason="")
+
+
+def run_virtual(args):
+    import numpy as np
+    from client_machine.data_manager import DataManager
+    from server.server import DeepFakeServer, FedBuffServer
+    from src.common.compression import CodecConfig
+    from src.common.config import FederatedConfig
+    from src.common.partition import dirichlet_partition, iid_partition
+
+    load_dotenv()
+    config = FederatedConfig()
+    print(f"Starting in-process simulation: {args.clients} virtual clients on {args.workers} workers "
+          f"({args.partition} partition, {config.AGGREGATION_MODE} aggregation)")
+
+    train_ds, val_ds = DataManager(batch_size=config.BATCH_SIZE).load_datasets(
+        synthetic_train=args.clients * args.samples_per_client,
+        synthetic_val=args.clients * max(1, args.samples_per_client // 2),
+        img_size=args.img_size,
+    )
+    if args.partition == "dirichlet":
+        train_parts = dirichlet_partition(train_ds.targets, args.clients, args.alpha, seed=args.seed)
+        val_parts = dirichlet_partition(val_ds.targets, args.clients, args.alpha, seed=args.seed + 1)
+    else:
+        train_parts = iid_partition(len(train_ds), args.clients, seed=args.seed)
+        val_parts = iid_partition(len(val_ds), args.clients, seed=args.seed + 1)
+    sizes = np.array([len(p) for p in train_parts])
+    print(f"Train samples per client: min {sizes.min()}, median {int(np.median(sizes))}, max {sizes.max()}")
+
+    # Error feedback keeps a model-sized residual per client, which does not scale to 100+ virtual clients
+    codec_config = dataclasses.replace(CodecConfig.from_config(config), error_feedback=args.error_feedback)
+    threads = max(1, (os.cpu_count() or 1) // args.workers)
+    secret_key = os.getenv('SECRET_KEY', 'default_secret_key')
+    pool = WorkerPool(args.workers, (train_ds, val_ds, train_parts, val_parts, secret_key, codec_config, threads))
+
+    strategy = DeepFakeServer(
+        fraction_fit=args.fraction_fit,
+        fraction_evaluate=args.fraction_evaluate,
+        min_fit_clients=min(config.MIN_CLIENTS, args.clients),
+        min_evaluate_clients=min(config.MIN_CLIENTS, args.clients),
+        min_available_clients=args.clients,
+    )
+    strategy.initial_parameters = fl.common.ndarrays_to_parameters(strategy.global_model.get_parameters())
+    client_manager = fl.server.SimpleClientManager()
+    for i in range(args.clients):
+        client_manager.register(VirtualClientProxy(str(i), pool))
+    if config.AGGREGATION_MODE == "fedbuff":
+        server = FedBuffServer(client_manager=client_manager, strategy=strategy)
+    else:
+        server = fl.server.Server(client_manager=client_manager, strategy=strategy)
+
+    try:
+        history, elapsed = server.fit(num_rounds=args.rounds, timeout=None)
+    finally:
+        pool.shutdown()
+
+    round_seconds = [seconds for _, seconds in history.metrics_distributed_fit.get("round_seconds", [])]
+    print(f"\nSimulation finished in {elapsed:.1f}s; "
+          f"mean round {np.mean(round_seconds) if round_seconds else float('nan'):.1f}s over {len(round_seconds)} rounds")
+    for rnd, loss in history.losses_distributed:
+        print(f"  round {rnd}: distributed loss {loss:.4f}")
+    return history
+
+
+def run_processes(num_clients: int = 2):
+    """Original launcher: the real server and clients as separate processes over gRPC."""
     print("Starting Federated Learning Simulation...")
     print("-----------------------------------------")
     
@@ -20,7 +228,6 @@ def run_simulation():
     time.sleep(5)
     
     clients = []
-    num_clients = 2
     
     # 2. Start Clients
     for i in range(num_clients):
@@ -54,5 +261,28 @@ def run_simulation():
         
     print("Cleaned up.")
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Federated learning simulation")
+    parser.add_argument("--processes", action="store_true", help="run the real server and clients as OS processes")
+    parser.add_argument("--clients", type=int, default=2, help="number of (virtual) clients")
+    parser.add_argument("--workers", type=int, default=max(1, min(4, os.cpu_count() or 1)),
+                        help="worker processes, each holding one model")
+    parser.add_argument("--rounds", type=int, default=int(os.getenv('ROUNDS', 3)))
+    parser.add_argument("--partition", choices=("iid", "dirichlet"), default="iid")
+    parser.add_argument("--alpha", type=float, default=0.5, help="Dirichlet concentration (smaller = more skewed)")
+    parser.add_argument("--fraction-fit", type=float, default=1.0)
+    parser.add_argument("--fraction-evaluate", type=float, default=1.0)
+    parser.add_argument("--samples-per-client", type=int, default=16, help="synthetic data only")
+    parser.add_argument("--img-size", type=int, default=380, help="synthetic data only")
+    parser.add_argument("--error-feedback", action="store_true", help="keep codec residuals per virtual client")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    run_simulation()
+    args = parse_args()
+    if args.processes:
+        run_processes(args.clients)
+    else:
+        run_virtual(args)
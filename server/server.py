@@ -1,9 +1,9 @@
 import os
 import logging
+import time
+import concurrent.futures
 from typing import Dict, List, Optional, Tuple
 import flwr as fl
-from flwr.server.strategy.aggregate import aggregate
-import torch
 import numpy as np
 from dotenv import load_dotenv
 
@@ -15,11 +15,10 @@ sys.path.append(parent_dir)
 
 from src.common.model import FederatedDeepfakeDetector
 from src.common.config import FederatedConfig
-from src.common.security import SecurityManager
-
-# Initialize model
-device = torch.device("cuda:0" if torch.cuda.is_available() else "cpu")
-global_model = FederatedDeepfakeDetector().to(device)
+from src.common.security import ClientSessionRegistry, SecurityManager
+from src.common.metrics import weighted_metrics
+from src.common.compression import CodecConfig, UpdateCodec, decode_update, iter_decoded, payload_nbytes
+from src.common.aggregation import FedBuffBuffer, RoundTelemetry, WeightedAverageAccumulator
 
 # Setup logging
 logging.basicConfig(
@@ -37,9 +36,49 @@ class DeepFakeServer(fl.server.strategy.FedAvg):
         super().__init__(*args, **kwargs)
         self.config = FederatedConfig()
         self.security_manager = SecurityManager(os.getenv('SECRET_KEY', 'default_secret_key'))
+        # Tokens are decoded once per expiry window, not on every result of every round
+        self.sessions = ClientSessionRegistry(self.security_manager)
         self.global_model = FederatedDeepfakeDetector()
         self.client_weights: Dict[str, List[np.ndarray]] = {}
         self.client_metrics: Dict[str, Dict[str, float]] = {}
+        # Global weights as the clients received them this round; deltas are decoded against these
+        self.round_reference: Optional[List[np.ndarray]] = None
+        self.downlink_codec = UpdateCodec(CodecConfig(delta=False, dtype=self.config.DOWNLINK_DTYPE))
+        self.bytes_down = 0
+        self.telemetry = RoundTelemetry("sync", self.config.TELEMETRY_PATH or None)
+
+    def downlink(self, arrays: List[np.ndarray]):
+        """
+        Global weights as sent to clients: (parameters, reference the clients will see, codec header or None).
+        With DOWNLINK_DTYPE float32 the arrays go unchanged.
+        """
+        if self.downlink_codec.config.dtype == "float32":
+            return fl.common.ndarrays_to_parameters(arrays), arrays, None
+        encoded, header = self.downlink_codec.encode(arrays)
+        return fl.common.ndarrays_to_parameters(encoded), decode_update(encoded, header), header
+
+    def configure_fit(self, server_round, parameters, client_manager):
+        """Send the global model, optionally cast to DOWNLINK_DTYPE, and remember the reference."""
+        instructions = super().configure_fit(server_round, parameters, client_manager)
+        self.telemetry.start_round()
+        if not instructions:
+            return instructions
+        downlink, self.round_reference, header = self.downlink(fl.common.parameters_to_ndarrays(parameters))
+        self.bytes_down = sum(len(t) for t in downlink.tensors) * len(instructions)
+        if header is None:
+            return instructions
+        return [
+            (client, fl.common.FitIns(downlink, {**fit_ins.config, "codec": header}))
+            for client, fit_ins in instructions
+        ]
+
+    def iter_fit_res(self, fit_res: fl.common.FitRes, reference: Optional[List[np.ndarray]] = None):
+        """Deserializes and decodes a client's update one tensor at a time."""
+        arrays = (fl.common.bytes_to_ndarray(tensor) for tensor in fit_res.parameters.tensors)
+        header = fit_res.metrics.get("codec")
+        if not header:
+            return arrays
+        return iter_decoded(arrays, header, self.round_reference if reference is None else reference)
         
     def aggregate_fit(
         self,
@@ -54,7 +93,7 @@ class DeepFakeServer(fl.server.strategy.FedAvg):
         # Verify client tokens and collect weights
         valid_results = []
         for client, fit_res in results:
-            if not self.security_manager.is_token_valid(fit_res.metrics.get('token', '')):
+            if not self.sessions.is_valid(fit_res.metrics.get('token', ''), client.cid):
                 logger.warning(f"Invalid token from client {client.cid}")
                 continue
                 
@@ -63,18 +102,38 @@ class DeepFakeServer(fl.server.strategy.FedAvg):
         if not valid_results:
             return None
             
-        # Aggregate weights
-        # Aggregate weights
-        weights_results = [
-            (fl.common.parameters_to_ndarrays(fit_res.parameters), fit_res.num_examples)
-            for _, fit_res in valid_results
-        ]
-        weights_aggregated = aggregate(weights_results)
+        # Streaming FedAvg: each update is decoded tensor by tensor and folded into one buffer
+        accumulator = WeightedAverageAccumulator(dtype=self.config.AGGREGATION_DTYPE)
+        bytes_up = 0
+        train_metrics = []
+        for client, fit_res in valid_results:
+            train_metrics.append({k: fit_res.metrics[k] for k in ("num_samples", "loss") if k in fit_res.metrics})
+            train_seconds = fit_res.metrics.get("train_seconds")
+            self.telemetry.record_update(client.cid, train_seconds or 0.0, train_seconds=train_seconds)
+            bytes_up += sum(len(t) for t in fit_res.parameters.tensors)
+            accumulator.add(self.iter_fit_res(fit_res), fit_res.num_examples, consume=True)
+            # Folded in; release the payload so only one client's update is alive at a time
+            fit_res.parameters.tensors = []
         
-        # Update global model
-        self.global_model.set_parameters(weights_aggregated)
+        # The mean is written straight into the global model's tensors, no extra copy
+        weights_aggregated = accumulator.result(out=self.global_model.parameter_views())
+        if weights_aggregated is None:
+            return None
         
-        return fl.common.ndarrays_to_parameters(weights_aggregated), {}
+        bytes_dense = payload_nbytes(weights_aggregated) * len(valid_results)
+        timing = self.telemetry.close_round(rnd)
+        metrics = {"bytes_up": bytes_up, "bytes_down": self.bytes_down, "bytes_up_dense": bytes_dense,
+                   "round_seconds": timing["round_seconds"], "max_client_seconds": timing["max_client_seconds"]}
+        train_loss = weighted_metrics(train_metrics).get("loss")
+        if train_loss is not None:
+            metrics["train_loss"] = train_loss
+        logger.info(
+            f"Round {rnd} - uplink {bytes_up / 1e6:.1f} MB "
+            f"({bytes_up / max(bytes_dense, 1):.1%} of dense fp32), downlink {self.bytes_down / 1e6:.1f} MB, "
+            f"{timing['round_seconds']:.1f}s wall-clock (slowest client {timing['max_client_seconds']:.1f}s)"
+        )
+        
+        return fl.common.ndarrays_to_parameters(weights_aggregated), metrics
         
     def aggregate_evaluate(
         self,
@@ -89,10 +148,15 @@ class DeepFakeServer(fl.server.strategy.FedAvg):
         # Collect metrics from valid clients
         valid_metrics = []
         for client, eval_res in results:
-            if not self.security_manager.is_token_valid(eval_res.metrics.get('token', '')):
+            claims = self.sessions.verify(eval_res.metrics.get('token', ''), client.cid)
+            if claims is None:
                 continue
-                
-            valid_metrics.append(eval_res.metrics)
+            
+            metrics = {k: v for k, v in eval_res.metrics.items() if k != 'token'}
+            metrics.setdefault('num_samples', eval_res.num_examples)
+            metrics.setdefault('loss', eval_res.loss)
+            self.client_metrics[claims.get('client_id', client.cid)] = metrics
+            valid_metrics.append(metrics)
             
         if not valid_metrics:
             return None
@@ -104,26 +168,154 @@ class DeepFakeServer(fl.server.strategy.FedAvg):
         return global_metrics.get('loss', 0.0), global_metrics
         
     def calculate_global_metrics(self, client_metrics: List[Dict[str, float]]) -> Dict[str, float]:
-        """Calculate global metrics from client metrics."""
-        total_samples = sum(metrics.get('num_samples', 0) for metrics in client_metrics)
-        if total_samples == 0:
-            return {}
-            
-        global_metrics = {
-            'accuracy': 0.0,
-            'loss': 0.0,
-            'precision': 0.0,
-            'recall': 0.0,
-            'f1_score': 0.0
-        }
-        
-        for metrics in client_metrics:
-            weight = metrics.get('num_samples', 0) / total_samples
-            for key in global_metrics:
-                if key in metrics:
-                    global_metrics[key] += metrics[key] * weight
-                    
-        return global_metrics
+        """Calculate global metrics from client metrics (num_samples-weighted, see weighted_metrics)."""
+        return weighted_metrics(client_metrics)
+
+
+class FedBuffServer(fl.server.Server):
+    """
+    Buffered asynchronous training loop (FedBuff) around a DeepFakeServer strategy.
+    Every connected client trains continuously: as soon as one returns, its delta against the global
+    version it started from is folded into a FedBuffBuffer (discounted by staleness) and the client is
+    sent the current global model again. The global model advances once FEDBUFF_BUFFER_SIZE updates
+    are buffered, so `num_rounds` counts these effective rounds and nobody waits for the slowest client.
+    Every FEDBUFF_EVAL_EVERY versions (and after the last one) dispatching pauses until in-flight clients
+    return, and that version is evaluated on the clients like fl.server.Server does after each round.
+    """
+
+    def __init__(self, *, client_manager, strategy: DeepFakeServer):
+        super().__init__(client_manager=client_manager, strategy=strategy)
+        config = strategy.config
+        self.buffer = FedBuffBuffer(
+            config.FEDBUFF_BUFFER_SIZE,
+            config.FEDBUFF_MAX_STALENESS,
+            server_lr=config.FEDBUFF_SERVER_LR,
+            staleness_exponent=config.FEDBUFF_STALENESS_EXPONENT,
+            dtype=config.AGGREGATION_DTYPE,
+        )
+        self.telemetry = RoundTelemetry("fedbuff", config.TELEMETRY_PATH or None)
+        self.eval_every = config.FEDBUFF_EVAL_EVERY
+
+    def evaluate_version(self, version: int, weights: List[np.ndarray], timeout: Optional[float],
+                         history: fl.server.History):
+        """Federated and centralized evaluation of a global version, recorded in `history`."""
+        self.parameters = fl.common.ndarrays_to_parameters(weights)
+        res_fed = self.evaluate_round(server_round=version, timeout=timeout)
+        if res_fed is not None:
+            loss_fed, metrics_fed, _ = res_fed
+            if loss_fed is not None:
+                history.add_loss_distributed(server_round=version, loss=loss_fed)
+                history.add_metrics_distributed(server_round=version, metrics=metrics_fed)
+        res_cen = self.strategy.evaluate(version, parameters=self.parameters)
+        if res_cen is not None:
+            history.add_loss_centralized(server_round=version, loss=res_cen[0])
+            history.add_metrics_centralized(server_round=version, metrics=res_cen[1])
+
+    def fit(self, num_rounds: int, timeout: Optional[float]):
+        history = fl.server.History()
+        strategy: DeepFakeServer = self.strategy
+        self.parameters = self._get_initial_parameters(server_round=0, timeout=timeout)
+        weights = fl.common.parameters_to_ndarrays(self.parameters)
+        self._client_manager.wait_for(strategy.min_available_clients)
+
+        version = 0
+        # Global versions that clients may still be training on; deltas are decoded against these
+        snapshots = {version: strategy.downlink([w.copy() for w in weights])}
+        in_flight: Dict[concurrent.futures.Future, Tuple] = {}
+        failed = set()
+        # Set when a version is due for evaluation; no new fits go out until in-flight ones return
+        evaluate_pending = False
+        start_time = time.perf_counter()
+        self.telemetry.start_round()
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers or 32)
+
+        def dispatch_idle():
+            busy = {client.cid for client, _, _ in in_flight.values()}
+            for cid, client in self._client_manager.all().items():
+                if cid in busy or cid in failed:
+                    continue
+                parameters, _, codec_header = snapshots[version]
+                config = {"server_round": version + 1}
+                if codec_header is not None:
+                    config["codec"] = codec_header
+                ins = fl.common.FitIns(parameters, config)
+                future = executor.submit(client.fit, ins, timeout, None)
+                in_flight[future] = (client, version, time.perf_counter())
+
+        def advance():
+            nonlocal version, evaluate_pending
+            mean_staleness = float(np.mean(self.buffer.staleness))
+            self.buffer.apply(weights)
+            version += 1
+            timing = self.telemetry.close_round(version)
+            snapshots[version] = strategy.downlink([w.copy() for w in weights])
+            for old in [v for v in snapshots if v < version - self.buffer.max_staleness]:
+                del snapshots[old]
+            failed.clear()
+            metrics = {"round_seconds": timing["round_seconds"], "mean_staleness": mean_staleness,
+                       "updates": timing["updates"], "dropped_updates": timing["dropped_updates"]}
+            history.add_metrics_distributed_fit(server_round=version, metrics=metrics)
+            logger.info(
+                f"Round {version} (fedbuff) - {timing['updates']} updates, mean staleness "
+                f"{mean_staleness:.2f}, {timing['round_seconds']:.1f}s wall-clock, "
+                f"{time.perf_counter() - start_time:.1f}s total"
+            )
+            if self.eval_every > 0 and version % self.eval_every == 0 and version < num_rounds:
+                evaluate_pending = True
+
+        dispatch_idle()
+        while version < num_rounds and in_flight:
+            done, _ = concurrent.futures.wait(in_flight, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                client, base_version, dispatched = in_flight.pop(future)
+                seconds = time.perf_counter() - dispatched
+                try:
+                    fit_res = future.result()
+                except Exception as e:
+                    logger.warning(f"Client {client.cid} failed: {e}")
+                    failed.add(client.cid)
+                    continue
+                if fit_res.status.code != fl.common.Code.OK:
+                    failed.add(client.cid)
+                    continue
+                staleness = version - base_version
+                accepted = False
+                if staleness > self.buffer.max_staleness:
+                    logger.info(f"Dropping update from {client.cid}: staleness {staleness}")
+                elif not strategy.sessions.is_valid(fit_res.metrics.get("token", ""), client.cid):
+                    logger.warning(f"Invalid token from client {client.cid}")
+                else:
+                    _, base, _ = snapshots[base_version]
+                    decoded = strategy.iter_fit_res(fit_res, base)
+                    deltas = (np.subtract(t, b, dtype=np.float32) if np.issubdtype(t.dtype, np.floating)
+                              else np.subtract(t, b) for t, b in zip(decoded, base))
+                    accepted = self.buffer.add(deltas, fit_res.num_examples, staleness)
+                    fit_res.parameters.tensors = []
+                self.telemetry.record_update(client.cid, seconds, staleness,
+                                             fit_res.metrics.get("train_seconds"), accepted)
+
+                # While draining for an evaluation, updates wait in the buffer so the due version is evaluated
+                if self.buffer.ready and version < num_rounds and not evaluate_pending:
+                    advance()
+            while evaluate_pending and not in_flight:
+                # Clients are idle now; updates buffered while draining go into the next version
+                self.evaluate_version(version, weights, timeout, history)
+                evaluate_pending = False
+                if self.buffer.ready and version < num_rounds:
+                    advance()
+            if version < num_rounds and not evaluate_pending:
+                dispatch_idle()
+
+        if version < num_rounds:
+            logger.warning(f"FedBuff stopped after {version}/{num_rounds} rounds: no clients left to train")
+        # Stragglers' updates are discarded, but the final evaluation waits for them to free their clients
+        concurrent.futures.wait(in_flight, timeout=timeout)
+        executor.shutdown(wait=False)
+        strategy.global_model.set_parameters(weights)
+        self.evaluate_version(version, weights, timeout, history)
+        return history, time.perf_counter() - start_time
+
 
 def start_server():
     """Start the Flower server."""
@@ -141,11 +333,16 @@ def start_server():
         ),
     )
     
+    server = None
+    if strategy.config.AGGREGATION_MODE == "fedbuff":
+        server = FedBuffServer(client_manager=fl.server.SimpleClientManager(), strategy=strategy)
+    
     # Start server
     fl.server.start_server(
         server_address="[::]:8081",
         config=fl.server.ServerConfig(num_rounds=int(os.getenv('ROUNDS', 10))),
-        strategy=strategy
+        server=server,
+        strategy=None if server else strategy
     )
 
 if __name__ == "__main__":
@@ -0,0 +1,162 @@
+import json
+import time
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+class WeightedAverageAccumulator:
+    """
+    Running weighted average of model updates.
+    Each client's tensors are folded into one preallocated buffer per tensor as they are decoded,
+    so memory stays at one model (plus the tensor being folded) no matter how many clients report.
+    """
+
+    def __init__(self, dtype=np.float32):
+        self.dtype = np.dtype(dtype)
+        self.buffers: Optional[List[np.ndarray]] = None
+        self.dtypes: List[np.dtype] = []
+        self.total_weight = 0.0
+        self.count = 0
+
+    def add(self, tensors: Iterable[np.ndarray], weight: float, consume: bool = False):
+        """Folds one update in. With `consume=True` the given tensors are scaled in place (no temporaries)."""
+        if weight <= 0:
+            return
+        first = self.buffers is None
+        if first:
+            self.buffers = []
+        for i, tensor in enumerate(tensors):
+            tensor = np.asarray(tensor)
+            if first:
+                buf = np.empty(tensor.shape, dtype=self.dtype)
+                np.multiply(tensor, weight, out=buf, casting="unsafe")
+                self.buffers.append(buf)
+                self.dtypes.append(tensor.dtype)
+                continue
+            buf = self.buffers[i]
+            if buf.shape != tensor.shape:
+                raise ValueError(f"Tensor {i} shape {tensor.shape} does not match {buf.shape}")
+            if consume and tensor.dtype == buf.dtype and tensor.flags.writeable:
+                tensor *= weight
+                buf += tensor
+            else:
+                buf += np.multiply(tensor, weight, dtype=buf.dtype)
+        self.total_weight += weight
+        self.count += 1
+
+    def result(self, out: Optional[List[np.ndarray]] = None) -> Optional[List[np.ndarray]]:
+        """
+        The weighted mean, in each tensor's original dtype (integer buffers are rounded).
+        With `out` (e.g. NumPy views of the global model's tensors) the mean is written there
+        directly; otherwise accumulation buffers are reused in place where dtypes allow.
+        """
+        if not self.buffers or self.total_weight <= 0:
+            return None
+        results = []
+        for i, (buf, dtype) in enumerate(zip(self.buffers, self.dtypes)):
+            buf /= self.total_weight
+            if not np.issubdtype(dtype, np.floating):
+                np.rint(buf, out=buf)
+            if out is not None:
+                np.copyto(out[i], buf.reshape(out[i].shape), casting="unsafe")
+                results.append(out[i])
+            elif buf.dtype == dtype:
+                results.append(buf)
+            else:
+                results.append(buf.astype(dtype))
+        self.buffers = None
+        return results
+
+
+def staleness_weight(staleness: int, exponent: float = 0.5) -> float:
+    """FedBuff's polynomial discount: an update trained on a model `staleness` versions old counts (1 + s)^-a."""
+    return float((1 + max(staleness, 0)) ** -exponent)
+
+
+class FedBuffBuffer:
+    """
+    Buffered asynchronous aggregation (FedBuff).
+    Client deltas (trained weights minus the global version they started from) are folded in as they
+    arrive, weighted by num_examples * staleness_weight; once `buffer_size` are in, their weighted mean,
+    scaled by `server_lr`, is added to the current global weights. Updates staler than `max_staleness`
+    versions are rejected.
+    """
+
+    def __init__(self, buffer_size: int, max_staleness: int, server_lr: float = 1.0,
+                 staleness_exponent: float = 0.5, dtype=np.float32):
+        if buffer_size < 1:
+            raise ValueError("buffer_size must be at least 1")
+        self.buffer_size = buffer_size
+        self.max_staleness = max_staleness
+        self.server_lr = server_lr
+        self.staleness_exponent = staleness_exponent
+        self.dtype = dtype
+        self.accumulator = WeightedAverageAccumulator(dtype=dtype)
+        self.staleness: List[int] = []
+
+    def add(self, deltas: Iterable[np.ndarray], num_examples: int, staleness: int) -> bool:
+        """Folds one delta in; False (and nothing consumed) when it is too stale to use."""
+        if staleness > self.max_staleness:
+            return False
+        weight = num_examples * staleness_weight(staleness, self.staleness_exponent)
+        self.accumulator.add(deltas, weight, consume=True)
+        self.staleness.append(staleness)
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return len(self.staleness) >= self.buffer_size
+
+    def apply(self, weights: List[np.ndarray]) -> List[np.ndarray]:
+        """Adds server_lr * mean delta to `weights` in place and empties the buffer."""
+        mean = self.accumulator.result()
+        if mean is not None:
+            for w, d in zip(weights, mean):
+                np.add(w, np.multiply(d, self.server_lr, dtype=np.float32), out=w, casting="unsafe")
+        self.accumulator = WeightedAverageAccumulator(dtype=self.dtype)
+        self.staleness = []
+        return weights
+
+
+class RoundTelemetry:
+    """
+    Wall-clock bookkeeping per client and per effective round (one global model update), so the
+    synchronous and buffered strategies can be compared on the same scale. Each closed round is
+    also appended as a JSON line to `path` when one is given.
+    """
+
+    def __init__(self, mode: str, path: Optional[str] = None):
+        self.mode = mode
+        self.path = path
+        self.started = time.perf_counter()
+        self.round_started = self.started
+        self.updates: List[Dict] = []
+        self.rounds: List[Dict] = []
+
+    def start_round(self):
+        self.round_started = time.perf_counter()
+
+    def record_update(self, cid: str, seconds: float, staleness: int = 0, train_seconds: Optional[float] = None,
+                      accepted: bool = True):
+        self.updates.append({"cid": cid, "seconds": round(seconds, 3), "staleness": staleness,
+                             "train_seconds": train_seconds, "accepted": accepted})
+
+    def close_round(self, server_round: int) -> Dict[str, float]:
+        now = time.perf_counter()
+        accepted = [u for u in self.updates if u["accepted"]]
+        summary = {
+            "round_seconds": now - self.round_started,
+            "elapsed_seconds": now - self.started,
+            "updates": len(accepted),
+            "dropped_updates": len(self.updates) - len(accepted),
+            "mean_staleness": float(np.mean([u["staleness"] for u in accepted])) if accepted else 0.0,
+            "max_client_seconds": max((u["seconds"] for u in self.updates), default=0.0),
+        }
+        self.rounds.append(summary)
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"mode": self.mode, "round": server_round, **summary, "clients": self.updates}) + "\n")
+        self.updates = []
+        self.round_started = now
+        return summary
@@ -0,0 +1,199 @@
+"""
+Batch-level counterparts of the robust augmentations in transforms.py.
+
+Everything here works on collated (B, C, H, W) batches with vectorized torch ops on whatever device
+the batch is on, drawing parameters independently per sample. Batches are either uint8 in [0, 255]
+or float in [0, 1]; the output keeps the input's dtype and range.
+"""
+import math
+from typing import Optional
+
+import torch
+import torch.nn.functional as F
+
+IMAGENET_MEAN = (0.485, 0.456, 0.406)
+IMAGENET_STD = (0.229, 0.224, 0.225)
+
+# Standard JPEG quantization tables (ITU-T T.81, Annex K), row-major
+_LUMA_TABLE = [
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99,
+]
+_CHROMA_TABLE = [
+    17, 18, 24, 47, 99, 99, 99, 99,
+    18, 21, 26, 66, 99, 99, 99, 99,
+    24, 26, 56, 99, 99, 99, 99, 99,
+    47, 66, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+    99, 99, 99, 99, 99, 99, 99, 99,
+]
+
+
+def _to_pixels(images: torch.Tensor) -> torch.Tensor:
+    """float32 in [0, 255] regardless of the input's dtype."""
+    if images.dtype == torch.uint8:
+        return images.float()
+    return images.float() * 255.0
+
+
+def _from_pixels(pixels: torch.Tensor, like: torch.Tensor) -> torch.Tensor:
+    if like.dtype == torch.uint8:
+        return pixels.round().clamp_(0, 255).to(torch.uint8)
+    return (pixels / 255.0).to(like.dtype)
+
+
+def _sample_mask(batch: int, p: float, generator: Optional[torch.Generator]) -> torch.Tensor:
+    return torch.rand(batch, generator=generator) < p
+
+
+def _uniform(batch: int, low: float, high: float, generator: Optional[torch.Generator]) -> torch.Tensor:
+    return low + (high - low) * torch.rand(batch, generator=generator)
+
+
+def gaussian_blur(images: torch.Tensor, sigma: torch.Tensor) -> torch.Tensor:
+    """
+    Separable Gaussian blur with one standard deviation per sample (the `radius` of PIL's GaussianBlur).
+    All samples go through a single grouped convolution; edges are extended like PIL does.
+    """
+    b, c, h, w = images.shape
+    sigma = sigma.to(images.device, torch.float32).clamp_min(1e-3)
+    radius = max(1, int(math.ceil(3 * float(sigma.max()))))
+    offsets = torch.arange(-radius, radius + 1, device=images.device, dtype=torch.float32)
+    kernels = torch.exp(-offsets[None] ** 2 / (2 * sigma[:, None] ** 2))
+    kernels = (kernels / kernels.sum(dim=1, keepdim=True)).repeat_interleave(c, dim=0)  # (B*C, K)
+
+    x = _to_pixels(images).reshape(1, b * c, h, w)
+    x = F.pad(x, (radius, radius, 0, 0), mode="replicate")
+    x = F.conv2d(x, kernels[:, None, None, :], groups=b * c)
+    x = F.pad(x, (0, 0, radius, radius), mode="replicate")
+    x = F.conv2d(x, kernels[:, None, :, None], groups=b * c)
+    return _from_pixels(x.reshape(b, c, h, w), images)
+
+
+def gaussian_noise(images: torch.Tensor, std: torch.Tensor, mean: float = 0.0,
+                   generator: Optional[torch.Generator] = None) -> torch.Tensor:
+    """Additive noise with one std per sample, in the units of `images` (float batches only, no clamping)."""
+    if images.dtype == torch.uint8:
+        raise TypeError("gaussian_noise expects a float batch")
+    noise = torch.randn(images.shape, generator=generator).to(images.device, images.dtype)
+    return images + noise * std.to(images.device, images.dtype).view(-1, 1, 1, 1) + mean
+
+
+def quality_tables(quality: torch.Tensor):
+    """libjpeg's quality scaling of the standard tables: (B, 8, 8) luma and chroma quantizers."""
+    quality = quality.to(torch.float32).clamp(1, 100)
+    scale = torch.where(quality < 50, 5000 / quality, 200 - 2 * quality)[:, None, None]
+    tables = []
+    for base in (_LUMA_TABLE, _CHROMA_TABLE):
+        base = torch.tensor(base, dtype=torch.float32).view(1, 8, 8)
+        tables.append(torch.floor((base * scale + 50) / 100).clamp(1, 255))
+    return tables
+
+
+def _dct_matrix(device) -> torch.Tensor:
+    n = torch.arange(8, dtype=torch.float32, device=device)
+    matrix = torch.cos((2 * n[None, :] + 1) * n[:, None] * math.pi / 16) * math.sqrt(2 / 8)
+    matrix[0] /= math.sqrt(2)
+    return matrix
+
+
+def _quantize_blocks(planes: torch.Tensor, table: torch.Tensor, dct: torch.Tensor) -> torch.Tensor:
+    """8x8 block DCT -> quantize/dequantize with a per-sample table -> inverse DCT. planes: (B, H, W)."""
+    b, h, w = planes.shape
+    blocks = planes.reshape(b, h // 8, 8, w // 8, 8).transpose(2, 3)  # (B, h, w, 8, 8)
+    coefficients = dct @ (blocks - 128) @ dct.T
+    table = table.to(planes.device)[:, None, None]
+    coefficients = torch.round(coefficients / table) * table
+    blocks = dct.T @ coefficients @ dct + 128
+    return blocks.transpose(2, 3).reshape(b, h, w)
+
+
+def jpeg_compress(images: torch.Tensor, quality: torch.Tensor) -> torch.Tensor:
+    """
+    Approximate JPEG round trip at a per-sample quality, without any encoding: YCbCr conversion,
+    4:2:0 chroma subsampling, 8x8 DCT quantization with libjpeg's tables, and back. Entropy coding
+    is lossless, so this reproduces the artifacts; it differs from a real codec mainly in the
+    chroma upsampling filter and intermediate integer rounding.
+    """
+    b, c, h, w = images.shape
+    if c != 3:
+        raise ValueError("jpeg_compress expects RGB batches")
+    x = _to_pixels(images)
+    # Pad to whole 16x16 macroblocks so subsampled chroma is whole 8x8 blocks too
+    pad_h, pad_w = (-h) % 16, (-w) % 16
+    if pad_h or pad_w:
+        x = F.pad(x, (0, pad_w, 0, pad_h), mode="replicate")
+    r, g, bl = x[:, 0], x[:, 1], x[:, 2]
+    y = 0.299 * r + 0.587 * g + 0.114 * bl
+    cb = -0.168736 * r - 0.331264 * g + 0.5 * bl + 128
+    cr = 0.5 * r - 0.418688 * g - 0.081312 * bl + 128
+
+    luma_table, chroma_table = quality_tables(quality)
+    dct = _dct_matrix(x.device)
+    y = _quantize_blocks(y.round(), luma_table, dct)
+    chroma = F.avg_pool2d(torch.stack([cb, cr], dim=1), 2)
+    chroma = torch.stack([
+        _quantize_blocks(chroma[:, i].round(), chroma_table, dct) for i in range(2)
+    ], dim=1)
+    chroma = F.interpolate(chroma, scale_factor=2, mode="bilinear", align_corners=False)
+    cb, cr = chroma[:, 0] - 128, chroma[:, 1] - 128
+
+    rgb = torch.stack([
+        y + 1.402 * cr,
+        y - 0.344136 * cb - 0.714136 * cr,
+        y + 1.772 * cb,
+    ], dim=1)[:, :, :h, :w].clamp(0, 255)
+    return _from_pixels(rgb, images)
+
+
+def normalize(images: torch.Tensor, mean=IMAGENET_MEAN, std=IMAGENET_STD) -> torch.Tensor:
+    """uint8 or [0, 1] float batch -> normalized float32 batch (ToTensor + Normalize)."""
+    x = images.float() / 255.0 if images.dtype == torch.uint8 else images.float()
+    mean = torch.tensor(mean, device=x.device).view(1, -1, 1, 1)
+    std = torch.tensor(std, device=x.device).view(1, -1, 1, 1)
+    return (x - mean) / std
+
+
+class BatchRobustAugment:
+    """
+    Batch version of get_robust_transforms() after Resize: JPEG (p=0.5, quality 60-95), blur
+    (p=0.3, sigma 0.1-2.0), noise (p=0.3, std 0.01-0.05) and ImageNet normalization.
+    Each sample independently draws whether every augmentation applies and with which strength;
+    only the selected samples are processed. Expects uint8 batches (see get_base_transforms).
+    """
+
+    def __init__(self, jpeg_p=0.5, quality_min=60, quality_max=95, blur_p=0.3, radius_min=0.1, radius_max=2.0,
+                 noise_p=0.3, std_min=0.01, std_max=0.05, generator: Optional[torch.Generator] = None):
+        self.jpeg_p, self.quality_min, self.quality_max = jpeg_p, quality_min, quality_max
+        self.blur_p, self.radius_min, self.radius_max = blur_p, radius_min, radius_max
+        self.noise_p, self.std_min, self.std_max = noise_p, std_min, std_max
+        self.generator = generator
+
+    def __call__(self, images: torch.Tensor) -> torch.Tensor:
+        g, b = self.generator, images.shape[0]
+        images = images.clone()
+
+        selected = _sample_mask(b, self.jpeg_p, g).nonzero().flatten().to(images.device)
+        if len(selected):
+            quality = torch.randint(self.quality_min, self.quality_max + 1, (len(selected),), generator=g)
+            images[selected] = jpeg_compress(images[selected], quality)
+
+        selected = _sample_mask(b, self.blur_p, g).nonzero().flatten().to(images.device)
+        if len(selected):
+            sigma = _uniform(len(selected), self.radius_min, self.radius_max, g)
+            images[selected] = gaussian_blur(images[selected], sigma)
+
+        x = images.float() / 255.0 if images.dtype == torch.uint8 else images.float()
+        selected = _sample_mask(b, self.noise_p, g).nonzero().flatten().to(x.device)
+        if len(selected):
+            std = _uniform(len(selected), self.std_min, self.std_max, g)
+            x[selected] = gaussian_noise(x[selected], std, generator=g)
+        return normalize(x)
@@ -0,0 +1,183 @@
+import json
+from dataclasses import dataclass
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+DTYPES = ("float32", "float16", "bfloat16")
+
+
+@dataclass
+class CodecConfig:
+    """
+    How model updates are encoded on the wire.
+
+    delta:          send `weights - reference` (the round's global weights) instead of the weights
+    dtype:          float32 | float16 | bfloat16 for the transmitted values
+    topk_ratio:     keep only this fraction of the largest-magnitude delta entries per tensor (1.0 = dense)
+    quantize_bits:  0 (off) or 8 for affine uint8 quantization of the delta values
+    error_feedback: carry what sparsification/quantization dropped into the next round's delta
+    min_sparse_size: tensors smaller than this (biases, BN parameters) are always sent dense
+
+    Sparsification and quantization only apply to deltas; full weights are at most cast.
+    """
+    delta: bool = True
+    dtype: str = "float32"
+    topk_ratio: float = 1.0
+    quantize_bits: int = 0
+    error_feedback: bool = True
+    min_sparse_size: int = 4096
+
+    def __post_init__(self):
+        if self.dtype not in DTYPES:
+            raise ValueError(f"Unsupported update dtype: {self.dtype}")
+        if self.quantize_bits not in (0, 8):
+            raise ValueError("quantize_bits must be 0 or 8")
+        if not 0.0 < self.topk_ratio <= 1.0:
+            raise ValueError("topk_ratio must be in (0, 1]")
+
+    @classmethod
+    def from_config(cls, config) -> "CodecConfig":
+        return cls(
+            delta=config.UPDATE_DELTA,
+            dtype=config.UPDATE_DTYPE,
+            topk_ratio=config.UPDATE_TOPK_RATIO,
+            quantize_bits=config.UPDATE_QUANT_BITS,
+            error_feedback=config.UPDATE_ERROR_FEEDBACK,
+        )
+
+
+def to_bfloat16(values: np.ndarray) -> np.ndarray:
+    """float32 -> bfloat16 bit patterns (uint16), round to nearest even."""
+    bits = np.ascontiguousarray(values, dtype=np.float32).view(np.uint32)
+    rounding = ((bits >> 16) & 1) + np.uint32(0x7FFF)
+    return ((bits + rounding) >> 16).astype(np.uint16)
+
+
+def from_bfloat16(bits: np.ndarray) -> np.ndarray:
+    return (bits.astype(np.uint32) << 16).view(np.float32)
+
+
+def _cast(values: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "bfloat16":
+        return to_bfloat16(values)
+    return values.astype(dtype, copy=False)
+
+
+def _uncast(values: np.ndarray, dtype: str) -> np.ndarray:
+    if dtype == "bfloat16":
+        return from_bfloat16(values)
+    return values.astype(np.float32, copy=False)
+
+
+def _quantize(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    low, high = float(values.min()), float(values.max())
+    scale = (high - low) / 255 or 1.0
+    q = np.rint((values - low) / scale).astype(np.uint8)
+    return q, np.array([low, scale], dtype=np.float32)
+
+
+def _dequantize(q: np.ndarray, params: np.ndarray) -> np.ndarray:
+    low, scale = params
+    return q.astype(np.float32) * scale + low
+
+
+class UpdateCodec:
+    """
+    Encodes a list of model arrays into a (usually smaller) list of arrays plus a JSON header.
+    The header travels in the Flower metrics/config dict under "codec"; `decode_update` on the
+    other side restores full arrays. One codec instance per client keeps the error-feedback residuals.
+    """
+
+    def __init__(self, config: Optional[CodecConfig] = None):
+        self.config = config or CodecConfig()
+        self.residuals: Dict[int, np.ndarray] = {}
+
+    def encode(self, arrays: Sequence[np.ndarray], reference: Optional[Sequence[np.ndarray]] = None
+               ) -> Tuple[List[np.ndarray], str]:
+        cfg = self.config
+        use_delta = cfg.delta and reference is not None
+        out: List[np.ndarray] = []
+        specs = []
+        for i, arr in enumerate(arrays):
+            arr = np.asarray(arr)
+            if not np.issubdtype(arr.dtype, np.floating):
+                # Counters such as BatchNorm's num_batches_tracked go as they are
+                out.append(arr)
+                specs.append({"k": "raw"})
+                continue
+            spec = {"k": "dense", "s": list(arr.shape), "t": str(arr.dtype)}
+            flat = arr.astype(np.float32).ravel()
+            if use_delta:
+                flat -= np.asarray(reference[i], dtype=np.float32).ravel()
+                if cfg.error_feedback and i in self.residuals:
+                    flat += self.residuals[i]
+
+            sparse = use_delta and cfg.topk_ratio < 1.0 and flat.size >= cfg.min_sparse_size
+            quantize = use_delta and cfg.quantize_bits == 8 and flat.size >= cfg.min_sparse_size
+            if sparse:
+                k = max(1, int(flat.size * cfg.topk_ratio))
+                idx = np.argpartition(np.abs(flat), flat.size - k)[flat.size - k:]
+                idx.sort()
+                values = flat[idx]
+                out.append(idx.astype(np.uint32))
+                spec["k"] = "sparse"
+            else:
+                values = flat
+            if quantize:
+                q, params = _quantize(values)
+                out += [q, params]
+                spec["q"] = 1
+                sent = _dequantize(q, params)
+            else:
+                encoded = _cast(values, cfg.dtype)
+                out.append(encoded)
+                sent = _uncast(encoded, cfg.dtype)
+
+            if use_delta and cfg.error_feedback and (sparse or quantize or cfg.dtype != "float32"):
+                if sparse:
+                    flat[idx] -= sent
+                    self.residuals[i] = flat
+                else:
+                    self.residuals[i] = flat - sent
+            specs.append(spec)
+        header = {"v": 1, "delta": use_delta, "dtype": cfg.dtype, "tensors": specs}
+        return out, json.dumps(header, separators=(",", ":"))
+
+
+def iter_decoded(arrays: Sequence[np.ndarray], header, reference: Optional[Sequence[np.ndarray]] = None
+                 ) -> Iterator[np.ndarray]:
+    """Yields the decoded tensors one at a time, so callers never hold a whole decoded model."""
+    header = json.loads(header) if isinstance(header, (str, bytes)) else header
+    if header["delta"] and reference is None:
+        raise ValueError("Delta-encoded update needs the round's reference weights")
+    it = iter(arrays)
+    for i, spec in enumerate(header["tensors"]):
+        if spec["k"] == "raw":
+            yield next(it)
+            continue
+        shape = tuple(spec["s"])
+        idx = next(it) if spec["k"] == "sparse" else None
+        if spec.get("q"):
+            q = next(it)
+            values = _dequantize(q, next(it))
+        else:
+            values = _uncast(next(it), header["dtype"])
+        if idx is not None:
+            flat = np.zeros(int(np.prod(shape)), dtype=np.float32)
+            flat[idx] = values
+        else:
+            flat = np.array(values, dtype=np.float32)
+        tensor = flat.reshape(shape)
+        if header["delta"]:
+            tensor += np.asarray(reference[i], dtype=np.float32).reshape(shape)
+        yield tensor.astype(spec["t"], copy=False)
+
+
+def decode_update(arrays: Sequence[np.ndarray], header, reference: Optional[Sequence[np.ndarray]] = None
+                  ) -> List[np.ndarray]:
+    return list(iter_decoded(arrays, header, reference))
+
+
+def payload_nbytes(arrays: Sequence[np.ndarray]) -> int:
+    return int(sum(np.asarray(a).nbytes for a in arrays))
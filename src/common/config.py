@@ -1,4 +1,5 @@
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
 
 @dataclass
 class FederatedConfig:
@@ -33,3 +34,35 @@ class FederatedConfig:
     # Adversarial Training (FGSM)
     ADVERSARIAL_TRAINING: bool = True
     FGSM_EPSILON: float = 0.01
+    
+    # Update transport (src/common/compression.py); read at instantiation so .env is honoured.
+    # Defaults send full float32 weights, bit-identical to uncompressed training; set
+    # FL_UPDATE_DELTA=1 and e.g. FL_UPDATE_DTYPE=float16 to opt into compressed deltas.
+    UPDATE_DELTA: bool = field(default_factory=lambda: os.getenv("FL_UPDATE_DELTA", "0") == "1")
+    UPDATE_DTYPE: str = field(default_factory=lambda: os.getenv("FL_UPDATE_DTYPE", "float32"))  # float32 | float16 | bfloat16
+    UPDATE_TOPK_RATIO: float = field(default_factory=lambda: float(os.getenv("FL_UPDATE_TOPK_RATIO", "1.0")))
+    UPDATE_QUANT_BITS: int = field(default_factory=lambda: int(os.getenv("FL_UPDATE_QUANT_BITS", "0")))  # 0 | 8
+    UPDATE_ERROR_FEEDBACK: bool = field(default_factory=lambda: os.getenv("FL_UPDATE_ERROR_FEEDBACK", "1") == "1")
+    DOWNLINK_DTYPE: str = field(default_factory=lambda: os.getenv("FL_DOWNLINK_DTYPE", "float32"))  # global model sent to clients
+    AGGREGATION_DTYPE: str = field(default_factory=lambda: os.getenv("FL_AGGREGATION_DTYPE", "float32"))  # float32 | float64
+    
+    # Aggregation mode: "sync" (FedAvg, waits for min_fit_clients) or "fedbuff" (buffered asynchronous)
+    AGGREGATION_MODE: str = field(default_factory=lambda: os.getenv("FL_AGGREGATION_MODE", "sync"))
+    FEDBUFF_BUFFER_SIZE: int = field(default_factory=lambda: int(os.getenv("FL_FEDBUFF_BUFFER_SIZE", "2")))  # updates per global step
+    FEDBUFF_MAX_STALENESS: int = field(default_factory=lambda: int(os.getenv("FL_FEDBUFF_MAX_STALENESS", "4")))  # in global versions
+    FEDBUFF_SERVER_LR: float = field(default_factory=lambda: float(os.getenv("FL_FEDBUFF_SERVER_LR", "1.0")))
+    FEDBUFF_STALENESS_EXPONENT: float = field(default_factory=lambda: float(os.getenv("FL_FEDBUFF_STALENESS_EXPONENT", "0.5")))
+    FEDBUFF_EVAL_EVERY: int = field(default_factory=lambda: int(os.getenv("FL_FEDBUFF_EVAL_EVERY", "5")))  # versions between federated evaluations (0 = final only)
+    TELEMETRY_PATH: str = field(default_factory=lambda: os.getenv("FL_TELEMETRY_PATH", ""))  # JSON lines per effective round
+    
+    # Client data pipeline (client_machine/shard_cache.py)
+    # Opt-in: writes a decoded 380x380 uint8 copy of the dataset under SHARD_CACHE_DIR, and the robust
+    # augmentations (JPEG, blur) then run on the resized image instead of the original resolution
+    SHARD_CACHE: bool = field(default_factory=lambda: os.getenv("FL_SHARD_CACHE", "0") == "1")
+    SHARD_CACHE_DIR: str = field(default_factory=lambda: os.getenv("FL_SHARD_CACHE_DIR", ""))  # default: <data_root>/.shard_cache
+    LOADER_WORKERS: int = field(default_factory=lambda: int(os.getenv("FL_LOADER_WORKERS", "2")))
+    PREFETCH_FACTOR: int = field(default_factory=lambda: int(os.getenv("FL_PREFETCH_FACTOR", "4")))  # batches per worker
+    # Opt-in: loaders yield resized uint8 images and JPEG/blur/noise run on collated batches
+    # (src/common/batch_transforms.py, after the 380 resize). Off: the per-image PIL pipeline
+    # of get_robust_transforms(), as before.
+    BATCH_AUGMENT: bool = field(default_factory=lambda: os.getenv("FL_BATCH_AUGMENT", "0") == "1")
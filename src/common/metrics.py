@@ -0,0 +1,54 @@
+from typing import Dict, Mapping, Sequence
+
+import numpy as np
+
+# Per-client evaluation schema; every client reports all of these (plus "token")
+METRIC_KEYS = ("loss", "accuracy", "precision", "recall", "f1_score")
+COUNT_KEYS = ("tp", "fp", "fn", "tn")
+# ImageFolder sorts class folders alphabetically: 0 = fake, 1 = real
+POSITIVE_CLASS = 0
+
+
+def classification_metrics(loss_sum: float, tp: int, fp: int, fn: int, tn: int) -> Dict[str, float]:
+    """Client-side metrics from summed loss and confusion counts (the positive class is "fake")."""
+    tp, fp, fn, tn = int(tp), int(fp), int(fn), int(tn)
+    n = tp + fp + fn + tn
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        "num_samples": n,
+        "loss": loss_sum / n if n else 0.0,
+        "accuracy": (tp + tn) / n if n else 0.0,
+        "precision": precision,
+        "recall": recall,
+        "f1_score": 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+        "tp": tp, "fp": fp, "fn": fn, "tn": tn,
+    }
+
+
+def weighted_metrics(client_metrics: Sequence[Mapping[str, float]]) -> Dict[str, float]:
+    """
+    Global metrics over clients: a num_samples-weighted mean per key, reduced in one pass over a
+    (clients x keys) array; keys a client did not report are left out of that key's mean.
+    When every client sent confusion counts, precision/recall/F1 are recomputed from the summed
+    counts instead (exact micro averages rather than a mean of ratios).
+    """
+    if not client_metrics:
+        return {}
+    n = np.array([m.get("num_samples", 0) for m in client_metrics], dtype=np.float64)
+    values = np.array([[m.get(k, np.nan) for k in METRIC_KEYS] for m in client_metrics], dtype=np.float64)
+    weights = np.where(np.isnan(values), 0.0, n[:, None])
+    totals = weights.sum(axis=0)
+    if not totals.any():
+        return {}
+    means = np.nan_to_num(values) * weights
+    means = np.divide(means.sum(axis=0), totals, out=np.zeros_like(totals), where=totals > 0)
+    result = {k: float(v) for k, v, t in zip(METRIC_KEYS, means, totals) if t > 0}
+    result["num_samples"] = int(n.sum())
+
+    if all(k in m for m in client_metrics for k in COUNT_KEYS):
+        tp, fp, fn, tn = np.array([[m[k] for k in COUNT_KEYS] for m in client_metrics]).sum(axis=0)
+        exact = classification_metrics(0.0, tp, fp, fn, tn)
+        for key in ("accuracy", "precision", "recall", "f1_score"):
+            result[key] = exact[key]
+    return result
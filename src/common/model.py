@@ -34,6 +34,10 @@ class FederatedDeepfakeDetector(nn.Module):
         """Get model parameters as a list of NumPy arrays."""
         return [val.cpu().numpy() for _, val in self.state_dict().items()]
         
+    def parameter_views(self) -> List[np.ndarray]:
+        """NumPy views sharing memory with the state_dict tensors (CPU only); writing them updates the model."""
+        return [val.detach().numpy() for _, val in self.state_dict().items()]
+        
     def set_parameters(self, parameters: List[np.ndarray]) -> None:
         """Set model parameters from a list of NumPy arrays."""
         params_dict = zip(self.state_dict().keys(), parameters)
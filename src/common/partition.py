@@ -0,0 +1,36 @@
+from typing import List, Sequence
+
+import numpy as np
+
+
+def iid_partition(num_samples: int, num_clients: int, seed: int = 0) -> List[np.ndarray]:
+    """Shuffled indices split into `num_clients` near-equal shards."""
+    if num_samples < num_clients:
+        raise ValueError(f"{num_samples} samples cannot be split across {num_clients} clients")
+    order = np.random.default_rng(seed).permutation(num_samples)
+    return [np.sort(shard) for shard in np.array_split(order, num_clients)]
+
+
+def dirichlet_partition(targets: Sequence[int], num_clients: int, alpha: float, seed: int = 0,
+                        min_size: int = 1) -> List[np.ndarray]:
+    """
+    Label-skewed (non-IID) split: for every class, the share each client gets is drawn from
+    Dirichlet(alpha). Small alpha (0.1) gives clients mostly one class, large alpha approaches IID.
+    Clients left with fewer than `min_size` samples are topped up from the largest shard.
+    """
+    targets = np.asarray(targets)
+    if len(targets) < num_clients * min_size:
+        raise ValueError(f"{len(targets)} samples cannot give {num_clients} clients {min_size} each")
+    rng = np.random.default_rng(seed)
+    shards: List[List[int]] = [[] for _ in range(num_clients)]
+    for label in np.unique(targets):
+        indices = rng.permutation(np.flatnonzero(targets == label))
+        proportions = rng.dirichlet(np.full(num_clients, alpha))
+        cuts = (np.cumsum(proportions)[:-1] * len(indices)).astype(int)
+        for client, part in enumerate(np.split(indices, cuts)):
+            shards[client].extend(part.tolist())
+    for shard in shards:
+        while len(shard) < min_size:
+            largest = max(shards, key=len)
+            shard.append(largest.pop())
+    return [np.sort(np.array(shard, dtype=np.int64)) for shard in shards]
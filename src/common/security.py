@@ -1,5 +1,6 @@
 import jwt
 import time
+from collections import OrderedDict
 from typing import Dict, Optional
 from .config import FederatedConfig
 
@@ -30,3 +31,41 @@ class SecurityManager:
         """Check if token is valid and not expired."""
         payload = self.verify_token(token)
         return payload is not None
+
+
+class ClientSessionRegistry:
+    """
+    Verified client sessions for the FL server.
+    Each token is decoded once and its claims are cached until the token's own `exp`, so the
+    per-round check is a dict lookup; rejected tokens are remembered as well (a bad signature
+    never becomes valid). The cache is LRU-bounded by `max_tokens`.
+    """
+
+    def __init__(self, security_manager: SecurityManager, max_tokens: int = 4096):
+        self.security_manager = security_manager
+        self.max_tokens = max_tokens
+        self._claims: "OrderedDict[str, Optional[Dict]]" = OrderedDict()
+        # client_id -> {"cid": Flower proxy id, "exp": token expiry, "last_seen": unix time}
+        self.sessions: Dict[str, Dict] = {}
+
+    def verify(self, token: str, cid: Optional[str] = None) -> Optional[Dict]:
+        """Claims of a valid, unexpired token (None otherwise); records the client's session."""
+        if not token:
+            return None
+        now = time.time()
+        if token in self._claims:
+            self._claims.move_to_end(token)
+            claims = self._claims[token]
+            if claims is not None and claims.get('exp', now + 1) <= now:
+                claims = self._claims[token] = None
+        else:
+            claims = self.security_manager.verify_token(token)
+            self._claims[token] = claims
+            if len(self._claims) > self.max_tokens:
+                self._claims.popitem(last=False)
+        if claims is not None:
+            self.sessions[claims.get('client_id', cid)] = {'cid': cid, 'exp': claims.get('exp'), 'last_seen': now}
+        return claims
+
+    def is_valid(self, token: str, cid: Optional[str] = None) -> bool:
+        return self.verify(token, cid) is not None
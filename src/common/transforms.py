@@ -71,3 +71,13 @@ def get_robust_transforms(img_size=380):
         RandomGaussianNoise(p=0.3),
         transforms.Normalize([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])
     ])
+
+def get_base_transforms(img_size=380):
+    """
+    Per-sample part of the pipeline when augmentation runs on whole batches
+    (see batch_transforms.BatchRobustAugment): resize only, kept as a uint8 tensor.
+    """
+    return transforms.Compose([
+        transforms.Resize((img_size, img_size)),
+        transforms.PILToTensor(),
+    ])
@@ -0,0 +1,71 @@
+import json
+import os
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.aggregation import FedBuffBuffer, RoundTelemetry, WeightedAverageAccumulator, staleness_weight
+
+
+def test_streaming_average_matches_fedavg_and_writes_into_model_views():
+    rng = np.random.default_rng(0)
+    clients = [
+        ([rng.normal(size=(8, 4)).astype(np.float32), np.array(n, dtype=np.int64)], n)
+        for n in (10, 30, 60)
+    ]
+    expected = [
+        sum(w[0].astype(np.float64) * n for w, n in clients) / 100,
+        np.array(int(np.rint(sum(w[1] * n for w, n in clients) / 100)), dtype=np.int64),
+    ]
+
+    for dtype in (np.float32, np.float64):
+        accumulator = WeightedAverageAccumulator(dtype=dtype)
+        for weights, n in clients:
+            # Generator input: tensors arrive one at a time, copies are consumed in place
+            accumulator.add((w.copy() for w in weights), n, consume=True)
+        accumulator.add(iter([np.zeros((8, 4), np.float32), np.array(0)]), 0)  # empty client is ignored
+        model = [np.empty((8, 4), np.float32), np.zeros((), np.int64)]
+        result = accumulator.result(out=model)
+
+        assert result[0] is model[0] and result[1] is model[1]
+        np.testing.assert_allclose(model[0], expected[0], rtol=1e-5, atol=1e-7)
+        assert model[1] == expected[1]
+        assert accumulator.count == 3
+
+    # Inputs are left untouched unless consumed
+    weights = [w.copy() for w in clients[0][0]]
+    accumulator = WeightedAverageAccumulator()
+    accumulator.add(weights, 2)
+    accumulator.add(weights, 2)
+    np.testing.assert_array_equal(weights[0], clients[0][0][0])
+    assert accumulator.result()[0].dtype == np.float32
+
+
+def test_fedbuff_applies_staleness_weighted_mean_delta_once_buffer_is_full(tmp_path):
+    weights = [np.ones((3,), np.float32), np.array(5, dtype=np.int64)]
+    buffer = FedBuffBuffer(buffer_size=2, max_staleness=2, server_lr=0.5)
+
+    assert buffer.add(iter([np.full(3, 4.0, np.float32), np.array(2)]), num_examples=10, staleness=0)
+    assert not buffer.ready
+    assert not buffer.add(iter([np.full(3, 100.0, np.float32), np.array(0)]), num_examples=10, staleness=3)
+    assert buffer.add(iter([np.full(3, 1.0, np.float32), np.array(2)]), num_examples=10, staleness=2)
+    assert buffer.ready
+
+    w0, w2 = 10 * staleness_weight(0), 10 * staleness_weight(2)
+    mean = (4.0 * w0 + 1.0 * w2) / (w0 + w2)
+    buffer.apply(weights)
+    np.testing.assert_allclose(weights[0], 1 + 0.5 * mean, rtol=1e-6)
+    assert weights[1] == 6 and weights[1].dtype == np.int64
+    assert not buffer.ready and buffer.staleness == []
+
+    telemetry = RoundTelemetry("fedbuff", str(tmp_path / "rounds.jsonl"))
+    telemetry.record_update("a", 1.5, staleness=0, train_seconds=1.2)
+    telemetry.record_update("b", 9.0, staleness=3, accepted=False)
+    summary = telemetry.close_round(1)
+    assert summary["updates"] == 1 and summary["dropped_updates"] == 1
+    assert summary["max_client_seconds"] == 9.0 and summary["mean_staleness"] == 0.0
+    line = json.loads((tmp_path / "rounds.jsonl").read_text())
+    assert line["mode"] == "fedbuff" and line["round"] == 1 and len(line["clients"]) == 2
@@ -0,0 +1,122 @@
+import io
+import os
+import sys
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image, ImageFilter
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.batch_transforms import BatchRobustAugment, gaussian_blur, gaussian_noise, jpeg_compress, normalize
+from src.common.transforms import get_base_transforms
+
+
+def _images(count=2, seed=0):
+    # Smooth content with hard edges, closer to photos than white noise
+    generator = torch.Generator().manual_seed(seed)
+    coarse = torch.randint(0, 256, (count, 3, 12, 15), generator=generator).float()
+    images = F.interpolate(coarse, size=(96, 120), mode="bicubic", align_corners=False).clamp(0, 255).round()
+    images[:, :, 40:60, 30:80] = 200
+    return images.to(torch.uint8)
+
+
+def _pil(image):
+    return Image.fromarray(image.permute(1, 2, 0).numpy())
+
+
+def _psnr(a, b):
+    mse = np.mean((np.asarray(a, dtype=np.float64) - np.asarray(b, dtype=np.float64)) ** 2)
+    return 10 * np.log10(255 ** 2 / mse)
+
+
+def test_blur_matches_pil_per_sample_radius():
+    images = _images()
+    sigma = torch.tensor([1.0, 2.0])
+    blurred = gaussian_blur(images, sigma)
+    assert blurred.dtype == torch.uint8
+    for image, out, s in zip(images, blurred, sigma.tolist()):
+        reference = np.asarray(_pil(image).filter(ImageFilter.GaussianBlur(s)), dtype=np.float64)
+        ours = out.permute(1, 2, 0).numpy().astype(np.float64)
+        effect = np.abs(reference - image.permute(1, 2, 0).numpy()).mean()
+        # PIL approximates the Gaussian with box blurs; differences are mostly +-1 rounding
+        assert np.abs(ours - reference).mean() < min(0.75, 0.25 * effect)
+    # Float batches in [0, 1] give the same result
+    as_float = gaussian_blur(images.float() / 255, sigma)
+    assert (as_float * 255 - blurred.float()).abs().max() <= 0.5 + 1e-4
+
+
+def test_jpeg_approximation_matches_pil_codec():
+    images = _images()
+    quality = torch.tensor([60, 95])
+    compressed = jpeg_compress(images, quality)
+    for image, out, q in zip(images, compressed, quality.tolist()):
+        buffer = io.BytesIO()
+        _pil(image).save(buffer, "JPEG", quality=q)
+        buffer.seek(0)
+        reference = Image.open(buffer).convert("RGB")
+        ours = out.permute(1, 2, 0).numpy()
+        original = image.permute(1, 2, 0).numpy()
+        assert _psnr(ours, reference) > 38
+        # Same amount of distortion as the real codec
+        assert abs(_psnr(ours, original) - _psnr(reference, original)) < 1.0
+    # Odd sizes are padded to whole macroblocks internally
+    assert jpeg_compress(images[:, :, :37, :50], quality).shape == (2, 3, 37, 50)
+
+
+def test_noise_and_augment_draw_parameters_per_sample():
+    x = torch.zeros(4, 3, 64, 64)
+    noisy = gaussian_noise(x, torch.tensor([0.0, 0.01, 0.03, 0.05]), generator=torch.Generator().manual_seed(0))
+    np.testing.assert_allclose(noisy.std(dim=(1, 2, 3)).numpy(), [0.0, 0.01, 0.03, 0.05], rtol=0.05)
+
+    images = _images(count=64, seed=1)
+    clean = normalize(images)
+    augment = BatchRobustAugment(jpeg_p=0.5, blur_p=0.0, noise_p=0.0, generator=torch.Generator().manual_seed(0))
+    out = augment(images)
+    assert out.dtype == torch.float32 and out.shape == images.shape
+    changed = (out - clean).abs().flatten(1).amax(dim=1) > 1e-6
+    assert 16 < int(changed.sum()) < 48  # about half, chosen per sample
+    assert torch.equal(images, _images(count=64, seed=1))  # input untouched
+
+    everything = BatchRobustAugment(jpeg_p=1.0, blur_p=1.0, noise_p=1.0, generator=torch.Generator().manual_seed(0))
+    distortion = (everything(images) - clean).abs().flatten(1).mean(dim=1)
+    assert len(torch.unique(distortion)) == 64  # independent strengths
+
+
+def test_base_transforms_yield_uint8_batches_that_normalize_like_to_tensor():
+    image = _pil(_images(count=1)[0])
+    tensor = get_base_transforms(img_size=32)(image)
+    assert tensor.dtype == torch.uint8 and tensor.shape == (3, 32, 32)
+    expected = (tensor.float() / 255 - torch.tensor([0.485, 0.456, 0.406]).view(3, 1, 1)) / torch.tensor([0.229, 0.224, 0.225]).view(3, 1, 1)
+    torch.testing.assert_close(normalize(tensor[None])[0], expected)
+
+
+def test_client_prepare_batch_augments_training_batches_only():
+    from torch.utils.data import DataLoader, TensorDataset
+    from client_machine.client import DeepFakeClient
+    images = _images(count=4, seed=3)
+    loader = DataLoader(TensorDataset(images, torch.zeros(4, dtype=torch.long)), batch_size=4)
+    client = DeepFakeClient("client_test", "secret", model=torch.nn.Linear(1, 1), loaders=(loader, loader))
+    client.device = torch.device("cpu")
+    client.augment = BatchRobustAugment(jpeg_p=1.0, blur_p=1.0, noise_p=0.0,
+                                        generator=torch.Generator().manual_seed(0))
+    low = min((0 - m) / s for m, s in zip((0.485, 0.456, 0.406), (0.229, 0.224, 0.225)))
+    high = max((1 - m) / s for m, s in zip((0.485, 0.456, 0.406), (0.229, 0.224, 0.225)))
+
+    batch, _ = next(iter(client.train_loader))
+    assert batch.dtype == torch.uint8
+    train = client.prepare_batch(batch, train=True)
+    assert train.dtype == torch.float32 and train.shape == batch.shape
+    assert low - 1e-5 <= train.min() and train.max() <= high + 1e-5
+    assert not torch.allclose(train, normalize(batch))
+
+    # Validation batches are only normalized, identically on every pass
+    for _ in range(2):
+        val, _ = next(iter(client.val_loader))
+        assert torch.equal(client.prepare_batch(val, train=False), normalize(val))
+
+    # Float batches were preprocessed by the dataset transform and pass through untouched
+    preprocessed = normalize(batch)
+    assert client.prepare_batch(preprocessed, train=True) is preprocessed
@@ -0,0 +1,70 @@
+import os
+import sys
+
+import numpy as np
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.compression import CodecConfig, UpdateCodec, decode_update, payload_nbytes
+
+
+def _model(rng, scale=1.0):
+    return [
+        rng.normal(size=(64, 32, 3, 3)).astype(np.float32) * scale,
+        rng.normal(size=(64,)).astype(np.float32) * scale,
+        np.array(7, dtype=np.int64),  # BatchNorm num_batches_tracked
+    ]
+
+
+def test_fp16_and_bf16_deltas_round_trip_within_cast_precision():
+    rng = np.random.default_rng(0)
+    reference = _model(rng)
+    weights = [w + 0.01 * rng.normal(size=w.shape).astype(w.dtype) if w.dtype.kind == "f" else w + 1 for w in reference]
+    for dtype, tol in (("float16", 5e-5), ("bfloat16", 5e-4)):
+        encoded, header = UpdateCodec(CodecConfig(dtype=dtype)).encode(weights, reference=reference)
+        decoded = decode_update(encoded, header, reference)
+        assert payload_nbytes(encoded) < 0.55 * payload_nbytes(weights)
+        for w, d in zip(weights, decoded):
+            assert d.dtype == w.dtype and d.shape == w.shape
+            np.testing.assert_allclose(d, w, atol=tol)
+
+
+def test_topk_with_error_feedback_keeps_dropped_mass_for_later_rounds():
+    rng = np.random.default_rng(1)
+    reference = _model(rng)
+    updates = [[0.01 * rng.normal(size=w.shape).astype(np.float32) for w in reference[:2]] for _ in range(10)]
+
+    def run(error_feedback):
+        codec = UpdateCodec(CodecConfig(dtype="float32", topk_ratio=0.1, quantize_bits=8,
+                                        error_feedback=error_feedback, min_sparse_size=1000))
+        applied = np.zeros_like(reference[0])
+        for update in updates:
+            weights = [reference[0] + update[0], reference[1] + update[1], reference[2]]
+            encoded, header = codec.encode(weights, reference=reference)
+            decoded = decode_update(encoded, header, reference)
+            applied += decoded[0] - reference[0]
+            # Small tensors are sent dense, counters untouched
+            np.testing.assert_allclose(decoded[1], weights[1], atol=1e-6)
+            assert decoded[2] == 7
+        assert payload_nbytes(encoded) < 0.25 * payload_nbytes(weights)
+        return codec, applied
+
+    total = sum(update[0] for update in updates)
+    codec, applied = run(error_feedback=True)
+    # Everything not yet transmitted is exactly what the residual carries
+    np.testing.assert_allclose(applied + codec.residuals[0].reshape(total.shape), total, atol=1e-5)
+    _, applied_without = run(error_feedback=False)
+    assert np.abs(applied - total).mean() < 0.7 * np.abs(applied_without - total).mean()
+
+
+def test_default_config_sends_weights_bit_identically(monkeypatch):
+    from src.common.config import FederatedConfig
+    for name in ("FL_UPDATE_DELTA", "FL_UPDATE_DTYPE", "FL_UPDATE_TOPK_RATIO", "FL_UPDATE_QUANT_BITS"):
+        monkeypatch.delenv(name, raising=False)
+    rng = np.random.default_rng(2)
+    reference = _model(rng)
+    weights = [w + 0.01 * rng.normal(size=w.shape).astype(w.dtype) if w.dtype.kind == "f" else w + 1 for w in reference]
+    encoded, header = UpdateCodec(CodecConfig.from_config(FederatedConfig())).encode(weights, reference=reference)
+    for w, d in zip(weights, decode_update(encoded, header, reference)):
+        assert d.dtype == w.dtype and np.array_equal(d, w)
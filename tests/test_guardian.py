@@ -0,0 +1,76 @@
+import json
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+pytest.importorskip("tkinter")
+pytest.importorskip("mss")
+
+from guardian import agent
+from guardian.agent import FaceTracker, GuardPipeline
+
+
+def test_failed_upload_is_requeued_a_bounded_number_of_times():
+    pipeline = GuardPipeline(app=None, url="http://localhost:8000/analyze", in_flight=2, retries=1,
+                            face_tracker=FaceTracker(cascade=object()))
+    pipeline.running = True
+    track = agent.FaceTrack(0, (0, 0, 10, 10))
+    track.gate.should_send(np.zeros((32, 32), np.uint8), now=0.0)
+    batch = [(track, b"jpeg")]
+
+    assert pipeline.retry(batch, 0)
+    assert pipeline.upload_queue.get_nowait() == (batch, 1)
+    assert track.gate.last_thumb is not None
+
+    # Out of retries: the face is captured again on the next tick instead
+    assert not pipeline.retry(batch, 1)
+    assert pipeline.upload_queue.empty() and track.gate.last_thumb is None
+
+
+def test_stream_transport_sends_framed_crops_and_forwards_verdicts():
+    import threading
+    pytest.importorskip("websockets.sync.server")
+    from websockets.sync.server import serve
+    from backend.app.utils.live_guard import parse_frame
+    received = []
+
+    def handler(ws):
+        for message in ws:
+            seq, track, payload = parse_frame(message)
+            received.append((seq, track, payload))
+            ws.send(json.dumps({"type": "verdict", "track": track, "seq": seq, "state": "alarm", "score": 0.9}))
+
+    class App:
+        def __init__(self):
+            self.verdicts = []
+            self.done = threading.Event()
+
+        def process_verdict(self, event):
+            self.verdicts.append(event)
+            if len(self.verdicts) == 2:
+                self.done.set()
+
+    with serve(handler, "127.0.0.1", 0) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        port = server.socket.getsockname()[1]
+        app = App()
+        pipeline = GuardPipeline(app, f"http://127.0.0.1:{port}/analyze", transport="websocket",
+                                 face_tracker=FaceTracker(cascade=object()))
+        assert pipeline.stream_url == f"ws://127.0.0.1:{port}/ws/guardian"
+        pipeline.running = True
+        worker = threading.Thread(target=pipeline.stream_loop, daemon=True)
+        worker.start()
+        pipeline.upload_queue.put(([(agent.FaceTrack(3, (0, 0, 1, 1)), b"a"), (agent.FaceTrack(7, (0, 0, 1, 1)), b"bc")], 0))
+        assert app.done.wait(5)
+        pipeline.upload_queue.put(None)
+        worker.join(5)
+        server.shutdown()
+
+    assert received == [(1, 3, b"a"), (2, 7, b"bc")]
+    assert [(v["track"], v["state"]) for v in app.verdicts] == [(3, "alarm"), (7, "alarm")]
+    assert not worker.is_alive() and pipeline.failures == 0
@@ -0,0 +1,53 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+pytest.importorskip("tkinter")
+pytest.importorskip("mss")
+
+from guardian.agent import FrameGate
+
+
+def _screenshot(bgra):
+    # Same shape as an mss grab: .size is (width, height), .raw the BGRA bytes
+    h, w = bgra.shape[:2]
+    return SimpleNamespace(size=(w, h), raw=bgra.tobytes())
+
+
+def test_thumbnail_is_area_downsampled_grayscale():
+    gate = FrameGate(thumb_size=(8, 4))
+    frame = np.zeros((40, 80, 4), np.uint8)
+    frame[:, 40:, :3] = 255
+    thumb = gate.thumbnail(_screenshot(frame))
+    assert thumb.shape == (4, 8) and thumb.dtype == np.uint8
+    assert (thumb[:, :4] == 0).all() and (thumb[:, 4:] == 255).all()
+
+
+def test_gate_compares_with_last_sent_frame_and_resends_after_idle():
+    gate = FrameGate(thumb_size=(10, 10), pixel_delta=12, changed_ratio=0.1, max_idle=10.0)
+    base = np.full((10, 10), 100, np.uint8)
+    assert gate.should_send(base, now=0.0)
+    assert not gate.should_send(base.copy(), now=1.0)
+
+    # A change on too few pixels is ignored
+    spot = base.copy()
+    spot[0, :5] = 200
+    assert not gate.should_send(spot, now=2.0)
+
+    # Slow drift below pixel_delta per frame still accumulates against the last sent frame
+    sent = [gate.should_send(np.full((10, 10), 100 + 5 * i, np.uint8), now=2.0 + i) for i in range(1, 5)]
+    assert sent == [False, False, True, False]
+
+    # An unchanged screen is re-sent once max_idle has passed since the last upload
+    drifted = np.full((10, 10), 115, np.uint8)
+    assert not gate.should_send(drifted, now=14.9)
+    assert gate.should_send(drifted, now=15.0)
+
+    gate.reset()
+    assert gate.should_send(drifted, now=15.1)
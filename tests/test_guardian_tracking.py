@@ -0,0 +1,100 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+pytest.importorskip("tkinter")
+pytest.importorskip("mss")
+
+from guardian.agent import FaceTrack, FaceTracker, GuardPipeline, box_iou, detect_faces, encode_crop, padded_box
+
+
+class BoxCascade:
+    """Detector double: returns fixed boxes and remembers the image it was given."""
+    def __init__(self, boxes):
+        self.boxes = boxes
+        self.images = []
+
+    def detectMultiScale(self, gray, *args, **kwargs):
+        self.images.append(gray)
+        return self.boxes
+
+
+class Screen:
+    """mss stand-in over one BGRA frame; grab() returns the requested region like sct.grab."""
+    def __init__(self, frame):
+        self.frame = frame
+        self.grabs = []
+
+    def grab(self, region):
+        self.grabs.append(region)
+        crop = self.frame[region["top"]:region["top"] + region["height"],
+                          region["left"]:region["left"] + region["width"]]
+        return SimpleNamespace(size=(crop.shape[1], crop.shape[0]), raw=np.ascontiguousarray(crop).tobytes())
+
+
+def test_box_iou():
+    assert box_iou((0, 0, 10, 10), (0, 0, 10, 10)) == 1.0
+    assert box_iou((0, 0, 10, 10), (20, 20, 10, 10)) == 0.0
+    assert box_iou((0, 0, 10, 10), (5, 0, 10, 10)) == pytest.approx(50 / 150)
+    assert box_iou((0, 0, 0, 0), (0, 0, 0, 0)) == 0.0
+
+
+def test_tracker_keeps_ids_for_overlapping_boxes_and_drops_missing_faces():
+    tracker = FaceTracker(max_misses=1, cascade=object())
+    tracker.update([(100, 100, 50, 50), (400, 100, 80, 80)], now=0.0)
+    ids = {t.box: t.id for t in tracker.tracks}
+    assert sorted(ids.values()) == [0, 1]
+
+    # Slightly moved faces continue their tracks; the box is smoothed towards the detection
+    tracker.update([(104, 100, 50, 50), (410, 100, 80, 80)], now=1.0)
+    assert sorted(t.id for t in tracker.tracks) == [0, 1]
+    small = next(t for t in tracker.tracks if t.id == ids[(100, 100, 50, 50)])
+    assert small.box == pytest.approx((102, 100, 50, 50))
+
+    # A far away box is a new face; an unmatched track survives max_misses detections
+    tracker.update([(410, 100, 80, 80), (800, 500, 40, 40)], now=2.0)
+    assert sorted(t.id for t in tracker.tracks) == [0, 1, 2]
+    tracker.update([(410, 100, 80, 80), (800, 500, 40, 40)], now=3.0)
+    assert sorted(t.id for t in tracker.tracks) == [ids[(400, 100, 80, 80)], 2]
+    assert tracker.last_detect == 3.0 and not tracker.due(3.5) and tracker.due(4.0)
+
+
+def test_padded_box_grows_and_clamps():
+    assert padded_box((100, 50, 40, 20), 1000, 1000, padding=0.5) == (80, 40, 160, 80)
+    assert padded_box((0, 0, 40, 20), 50, 25, padding=0.5) == (0, 0, 50, 25)
+
+
+def test_detect_faces_runs_downscaled_and_returns_full_size_boxes():
+    cascade = BoxCascade([(10, 20, 30, 30)])
+    frame = np.zeros((720, 1280, 4), np.uint8)
+    assert detect_faces(cascade, frame, detect_width=640) == [(20, 40, 60, 60)]
+    assert cascade.images[0].shape == (360, 640)
+
+
+def test_capture_tick_grabs_only_tracked_face_regions():
+    frame = np.random.default_rng(0).integers(0, 256, size=(200, 400, 4), dtype=np.uint8)
+    screen = Screen(frame)
+    monitor = {"left": 0, "top": 0, "width": 400, "height": 200}
+    tracker = FaceTracker(detect_width=400, cascade=BoxCascade([(100, 50, 40, 40), (300, 100, 20, 20)]))
+    pipeline = GuardPipeline(app=None, url="http://localhost:8000/analyze", face_tracker=tracker)
+
+    shots = pipeline.capture_tick(screen, monitor, now=10.0)
+    assert sorted(track.id for track, _ in shots) == [0, 1]
+    # One full-screen grab for detection, then one padded region per face
+    assert screen.grabs[0] == monitor
+    assert screen.grabs[1:] == [FaceTrack(0, (100, 50, 40, 40)).region(monitor),
+                                FaceTrack(1, (300, 100, 20, 20)).region(monitor)]
+    jpeg = encode_crop(shots[0][1])
+    assert cv2.imdecode(np.frombuffer(jpeg, np.uint8), cv2.IMREAD_COLOR).shape == (64, 64, 3)
+
+    # Detection is not due and the faces did not change: regions are grabbed but nothing is sent
+    screen.grabs.clear()
+    assert pipeline.capture_tick(screen, monitor, now=10.5) == []
+    assert len(screen.grabs) == 2
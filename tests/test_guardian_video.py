@@ -0,0 +1,71 @@
+import os
+import sys
+
+import cv2
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+pytest.importorskip("tkinter")
+pytest.importorskip("mss")
+
+from guardian import agent
+from guardian.agent import VideoScanner
+
+
+def _write_video(path, frames, fps=10.0, size=(64, 48)):
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, size)
+    if not writer.isOpened():
+        pytest.skip("No MJPG video writer in this OpenCV build")
+    # Every frame is a flat gray level that identifies its index
+    for i in range(frames):
+        writer.write(np.full((size[1], size[0], 3), i * 8, np.uint8))
+    writer.release()
+
+
+def _frame_indices(frames):
+    return [int(round(frame.mean() / 8)) for frame in frames]
+
+
+@pytest.mark.parametrize("seek_gap", [90, 2])
+def test_video_sampling_reads_every_step_by_grab_or_seek(tmp_path, monkeypatch, seek_gap):
+    path = str(tmp_path / "clip.avi")
+    _write_video(path, 30)
+    monkeypatch.setattr(agent, "VIDEO_SEEK_GAP", seek_gap)
+    assert VideoScanner.probe(path) == (10.0, 30)
+
+    assert _frame_indices(VideoScanner.sample_frames(path, 0, None, 4)) == list(range(0, 30, 4))
+    assert _frame_indices(VideoScanner.sample_frames(path, 10, 20, 3)) == [10, 13, 16, 19]
+
+
+def test_video_segments_split_long_recordings_only(monkeypatch):
+    scanner = VideoScanner("http://localhost:8000/analyze", workers=3)
+    monkeypatch.setattr(agent, "VIDEO_MIN_SEGMENT", 1.0)
+    assert scanner.segments(10.0, 0) == [(0, None)]
+    assert scanner.segments(10.0, 15) == [(0, 15)]
+    assert scanner.segments(10.0, 100) == [(0, 33), (33, 67), (67, 100)]
+
+
+def test_probe_rejects_unreadable_files(tmp_path):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(b"not a video")
+    with pytest.raises(ValueError):
+        VideoScanner.probe(str(path))
+
+
+def test_scan_samples_once_per_interval_and_sums_segments(tmp_path, monkeypatch):
+    path = str(tmp_path / "clip.avi")
+    _write_video(path, 30)
+    monkeypatch.setattr(agent, "VIDEO_MIN_SEGMENT", 1.0)
+    scanner = VideoScanner("http://localhost:8000/analyze", workers=2, sample_interval=0.5)
+    calls = []
+
+    def scan_segment(path, start, stop, step):
+        calls.append((start, stop, step))
+        return {"analyzed": len(range(start, stop, step)), "fake": 1}
+
+    monkeypatch.setattr(scanner, "scan_segment", scan_segment)
+    assert scanner.scan(path) == {"analyzed": 6, "fake": 2}
+    assert sorted(calls) == [(0, 15, 5), (15, 30, 5)]
@@ -0,0 +1,37 @@
+import os
+import sys
+
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.metrics import METRIC_KEYS, classification_metrics, weighted_metrics
+
+
+def test_client_schema_and_exact_global_reduction():
+    a = classification_metrics(loss_sum=8.0, tp=6, fp=2, fn=1, tn=11)
+    b = classification_metrics(loss_sum=3.0, tp=1, fp=0, fn=3, tn=6)
+    assert set(METRIC_KEYS) <= set(a) and a["num_samples"] == 20
+    assert a["precision"] == pytest.approx(0.75) and a["recall"] == pytest.approx(6 / 7)
+
+    result = weighted_metrics([a, b])
+    assert result["num_samples"] == 30
+    assert result["loss"] == pytest.approx(11.0 / 30)
+    assert result["accuracy"] == pytest.approx(24 / 30)
+    # Micro-averaged from summed counts, not a mean of per-client ratios
+    assert result["precision"] == pytest.approx(7 / 9)
+    assert result["recall"] == pytest.approx(7 / 11)
+    assert result["f1_score"] == pytest.approx(2 * (7 / 9) * (7 / 11) / (7 / 9 + 7 / 11))
+
+
+def test_weighted_mean_skips_missing_keys_per_client():
+    result = weighted_metrics([
+        {"num_samples": 10, "accuracy": 0.5, "loss": 1.0},
+        {"num_samples": 30, "accuracy": 0.9},
+        {"num_samples": 0, "accuracy": 0.0, "loss": 9.0},
+    ])
+    assert result["accuracy"] == pytest.approx(0.8)
+    assert result["loss"] == pytest.approx(1.0)
+    assert "precision" not in result
+    assert weighted_metrics([]) == {} and weighted_metrics([{"num_samples": 0}]) == {}
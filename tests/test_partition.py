@@ -0,0 +1,38 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.partition import dirichlet_partition, iid_partition
+
+
+def _check_disjoint_cover(partition, num_samples):
+    merged = np.concatenate(partition)
+    assert len(merged) == num_samples and len(np.unique(merged)) == num_samples
+
+
+def test_iid_partition_is_balanced_and_disjoint():
+    partition = iid_partition(103, 10, seed=3)
+    _check_disjoint_cover(partition, 103)
+    assert {len(p) for p in partition} == {10, 11}
+    assert all(np.array_equal(a, b) for a, b in zip(partition, iid_partition(103, 10, seed=3)))
+    with pytest.raises(ValueError):
+        iid_partition(5, 10)
+
+
+def test_dirichlet_partition_skews_labels_with_small_alpha():
+    targets = np.random.default_rng(0).integers(0, 2, size=2000)
+
+    def mean_skew(alpha):
+        partition = dirichlet_partition(targets, 20, alpha, seed=1, min_size=5)
+        _check_disjoint_cover(partition, len(targets))
+        assert min(len(p) for p in partition) >= 5
+        return np.mean([abs(targets[p].mean() - 0.5) for p in partition])
+
+    assert mean_skew(0.1) > 0.3 > 0.1 > mean_skew(100.0)
+    # Tiny sets still give every client a sample
+    assert min(len(p) for p in dirichlet_partition(targets[:40], 20, 0.1)) >= 1
@@ -0,0 +1,35 @@
+import os
+import sys
+import time
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from src.common.security import ClientSessionRegistry, SecurityManager
+
+
+def test_session_registry_decodes_each_token_once_and_honours_expiry():
+    manager = SecurityManager("test-secret-key-with-at-least-32-bytes")
+    decodes = []
+    verify_token = manager.verify_token
+    manager.verify_token = lambda token: decodes.append(token) or verify_token(token)
+    registry = ClientSessionRegistry(manager, max_tokens=2)
+
+    token = manager.generate_token("client_1")
+    for _ in range(5):
+        assert registry.verify(token, cid="proxy-1")["client_id"] == "client_1"
+    assert len(decodes) == 1
+    assert registry.sessions["client_1"]["cid"] == "proxy-1"
+
+    forged = SecurityManager("another-secret-key-with-32-bytes!!").generate_token("client_1")
+    assert not registry.is_valid(forged) and not registry.is_valid(forged)
+    assert not registry.is_valid("")
+    assert len(decodes) == 2
+
+    # Cached claims stop being accepted once the token's own exp has passed
+    registry._claims[token] = {**registry._claims[token], "exp": int(time.time()) - 1}
+    assert registry.verify(token) is None
+
+    # LRU bound: a third distinct token evicts the least recently used one
+    registry.verify(manager.generate_token("client_2"))
+    assert len(registry._claims) == 2
@@ -0,0 +1,61 @@
+import os
+import sys
+
+import numpy as np
+from PIL import Image
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.abspath(os.path.join(SCRIPT_DIR, '..')))
+
+from client_machine.shard_cache import ShardDataset, build_shard
+from torch.utils.data import DataLoader
+from torchvision import transforms
+
+
+def _image_folder(root, count=3):
+    rng = np.random.default_rng(0)
+    for name in ("fake", "real"):
+        os.makedirs(os.path.join(root, name))
+        for i in range(count):
+            pixels = rng.integers(0, 256, size=(50 + i, 70, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(os.path.join(root, name, f"{i}.png"))
+
+
+def test_shard_matches_resized_images_and_rebuilds_only_on_change(tmp_path):
+    root, cache = str(tmp_path / "train"), str(tmp_path / "cache")
+    _image_folder(root)
+    build_shard(root, cache, img_size=32, workers=2)
+    mtime = os.path.getmtime(os.path.join(cache, "images.npy"))
+
+    dataset = ShardDataset(cache)
+    assert len(dataset) == 6 and dataset.classes == ["fake", "real"] and dataset.targets == [0, 0, 0, 1, 1, 1]
+    image, label = dataset[4]
+    expected = transforms.Resize((32, 32))(Image.open(os.path.join(root, "real", "1.png")).convert("RGB"))
+    assert label == 1 and np.array_equal(np.asarray(image), np.asarray(expected))
+
+    build_shard(root, cache, img_size=32)
+    assert os.path.getmtime(os.path.join(cache, "images.npy")) == mtime
+    Image.new("RGB", (40, 40)).save(os.path.join(root, "fake", "new.png"))
+    build_shard(root, cache, img_size=32)
+    assert len(ShardDataset(cache)) == 7
+
+    # Worker processes map the shard themselves
+    loader = DataLoader(ShardDataset(cache, transform=transforms.ToTensor()), batch_size=4, num_workers=2)
+    batches = list(loader)
+    assert batches[0][0].shape == (4, 3, 32, 32) and sum(len(b[1]) for b in batches) == 7
+
+
+def test_data_manager_uses_shard_cache_only_when_enabled(tmp_path, monkeypatch):
+    from client_machine.data_manager import DataManager
+    from torchvision import datasets
+    _image_folder(str(tmp_path / "data" / "train"))
+    _image_folder(str(tmp_path / "data" / "val"))
+    monkeypatch.delenv("FL_SHARD_CACHE", raising=False)
+    train_ds, _ = DataManager(data_root=str(tmp_path / "data")).load_datasets(img_size=32)
+    assert isinstance(train_ds, datasets.ImageFolder)
+    assert not os.path.exists(tmp_path / "data" / ".shard_cache")
+
+    monkeypatch.setenv("FL_SHARD_CACHE", "1")
+    train_ds, _ = DataManager(data_root=str(tmp_path / "data")).load_datasets(img_size=32)
+    assert isinstance(train_ds, ShardDataset) and len(train_ds) == 6
+    assert os.path.exists(tmp_path / "data" / ".shard_cache" / "train_32" / "images.npy")